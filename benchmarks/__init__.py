@@ -0,0 +1,2 @@
+"""The benchmarks module contains the scripts used to measure the performance of Project Twilight.
+    Run each one from the project root with `python -m benchmarks.<name>`."""
@@ -0,0 +1,103 @@
+#
+# Collector Binning Benchmark
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""Measure the CPU cost per commit of turning pages of commits into a weekday histogram.
+
+Run with `python -m benchmarks.collector_binning` from the project root. The benchmark compares
+    building PyGithub Commit objects and counting them one at a time with reading the raw page JSON
+    into NumPy arrays, as the collector does. The fixture is written to `--fixture` the first time
+    and read back on later runs, so every run measures the same pages.
+"""
+import json
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from gh_twilight.data import _commit_columns, _utc
+from gh_twilight.features import bin_timestamps
+from gh_twilight.replay import synthetic_commits
+
+def synthetic_pages(count: int, seed: int = 0) -> list:
+    """Split the commits of a synthetic repository into pages of 100, newest first.
+
+    Args:
+        count (int): The number of commits to create.
+        seed (int): The seed for the commit times and committers.
+
+    Returns:
+        pages (list): A list of pages, each a list of commit dictionaries.
+    """
+    commits = synthetic_commits(count, seed)
+    return [commits[x:x + 100] for x in range(0, count, 100)]
+
+def bin_objects(pages: list) -> list:
+    """Count the weekdays of every page by building PyGithub Commit objects, one at a time."""
+    #pylint:disable=import-outside-toplevel
+    from github import Github
+    from github.Commit import Commit
+    requester = Github(per_page=100)._Github__requester #pylint:disable=protected-access
+    week = [0, 0, 0, 0, 0, 0, 0]
+    for page in pages:
+        for commit in [Commit(requester, {}, x, completed=True) for x in page]:
+            date = _utc(commit.commit.committer.date)
+            week[(date.weekday() + 1) % 7] += 1
+    return week
+
+def bin_columns(pages: list) -> list:
+    """Count the weekdays of every page from its raw JSON with NumPy."""
+    week = None
+    for page in pages:
+        _, _, stamps = _commit_columns(page)
+        days = bin_timestamps(stamps)[0]
+        week = days if week is None else week + days
+    return week.tolist()
+
+def best_time(function, pages: list, repeat: int) -> tuple:
+    """Get the result of a function and the best time it took to run over the pages."""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.process_time()
+        result = function(pages)
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+def main(args: list):
+    """Run the benchmark and print the CPU time per commit of both approaches."""
+    parser = ArgumentParser("Measure the CPU cost per commit of binning pages of commits.")
+    parser.add_argument("--commits", type=int, default=100000,
+                        help="The number of commits in the fixture.")
+    parser.add_argument("--fixture", default="",
+                        help="The JSON file to read the fixture from, or to write it to.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="The number of runs to take the best time from.")
+    options = parser.parse_args(args)
+
+    if options.fixture and os.path.exists(options.fixture):
+        with open(options.fixture) as fixture:
+            pages = json.load(fixture)
+    else:
+        pages = synthetic_pages(options.commits)
+        if options.fixture:
+            with open(options.fixture, "w+") as fixture:
+                json.dump(pages, fixture)
+    count = sum(len(x) for x in pages)
+
+    objects, object_time = best_time(bin_objects, pages, options.repeat)
+    columns, column_time = best_time(bin_columns, pages, options.repeat)
+    if objects != columns:
+        print("Weekday histograms differ: %s != %s" % (objects, columns))
+        sys.exit(1)
+    print("%12s %12s %18s" % ("method", "seconds", "microseconds/commit"))
+    print("%12s %12.4f %18.3f" % ("objects", object_time, object_time / count * 1000000))
+    print("%12s %12.4f %18.3f" % ("columns", column_time, column_time / count * 1000000))
+    print("Binning %s commits from raw JSON is %.1fx faster." % (count, object_time / column_time))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
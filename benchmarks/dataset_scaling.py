@@ -0,0 +1,63 @@
+#
+# Dataset Scaling Benchmark
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""Measure how the time to build a dataset grows with the number of repositories.
+
+Run with `python -m benchmarks.dataset_scaling` from the project root. The time per repository
+    should stay flat as the number of synthetic repositories grows to a million.
+"""
+import sys
+import time
+from argparse import ArgumentParser
+from random import Random
+from gh_twilight.analysis import create_dataset
+from gh_twilight.repo import GHRepositoryWeeksum
+
+def synthetic_weeksums(count: int, seed: int = 0) -> list:
+    """Create a list of synthetic repository weeksums.
+
+    Args:
+        count (int): The number of repositories to create.
+        seed (int): The seed for the random commit counts.
+
+    Returns:
+        raw (list): The list of GHRepositoryWeeksum objects.
+    """
+    rng = Random(seed)
+    raw = []
+    for index in range(count):
+        week = [rng.randrange(200) for _ in range(7)]
+        raw.append(GHRepositoryWeeksum("synthetic/repo-%s" % (index), "all", sum(week),
+                                       sum(week) + rng.randrange(1000), week))
+    return raw
+
+def main(args: list):
+    """Run the benchmark and print the time taken for every dataset size."""
+    parser = ArgumentParser("Measure how dataset creation scales with the number of repositories.")
+    parser.add_argument("--max-size", type=int, default=1000000,
+                        help="The largest number of repositories to benchmark.")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="The number of runs to take the best time from.")
+    options = parser.parse_args(args)
+
+    print("%12s %12s %16s" % ("repositories", "seconds", "microseconds/row"))
+    size = 1000
+    while size <= options.max_size:
+        raw = synthetic_weeksums(size)
+        best = None
+        for _ in range(options.repeat):
+            started = time.perf_counter()
+            create_dataset(raw)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        print("%12s %12.4f %16.3f" % (size, best, best / size * 1000000))
+        size *= 10
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
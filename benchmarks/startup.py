@@ -0,0 +1,73 @@
+#
+# Startup Benchmark
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""Measure how long it takes to import the command line tool with `python -X importtime`.
+
+Run with `python -m benchmarks.startup` from the project root. The benchmark prints the slowest
+    imports and exits with a non-zero status if a heavy dependency is imported at startup or if the
+    import takes longer than `--max-ms`.
+"""
+import subprocess
+import sys
+from argparse import ArgumentParser
+
+HEAVY_MODULES = ["sklearn", "matplotlib", "scipy", "joblib", "github"]
+"""The top-level modules that must not be imported when the command line tool starts."""
+
+def import_times(module: str) -> list:
+    """Import a module in a fresh interpreter and collect its import times.
+
+    Args:
+        module (str): The name of the module to import.
+
+    Returns:
+        times (list): A list of (cumulative microseconds, module name) tuples for every module
+            that was imported.
+    """
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", "import %s" % (module)],
+                             stderr=subprocess.PIPE,
+                             check=True,
+                             universal_newlines=True)
+    times = []
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times.append((int(cumulative), name.strip()))
+    return times
+
+def main(args: list) -> int:
+    """Run the benchmark and report the slowest imports."""
+    parser = ArgumentParser("Measure the import time of the command line tool.")
+    parser.add_argument("--module", default="gh_twilight.cli",
+                        help="The module to import.")
+    parser.add_argument("--max-ms", type=float, default=0,
+                        help="Fail if importing the module takes longer than this.")
+    parser.add_argument("--top", type=int, default=10,
+                        help="The number of slowest imports to show.")
+    options = parser.parse_args(args)
+
+    times = import_times(options.module)
+    total = max((x for x in times if x[1] == options.module), default=(0, options.module))[0]
+    for cumulative, name in sorted(times, reverse=True)[:options.top]:
+        print("%10.1f ms  %s" % (cumulative / 1000, name))
+    print("Imported %s in %.1f ms." % (options.module, total / 1000))
+
+    status = 0
+    heavy = sorted({x[1] for x in times if x[1].split(".")[0] in HEAVY_MODULES})
+    if heavy:
+        print("Heavy modules imported at startup: %s" % (", ".join(heavy)))
+        status = 1
+    if options.max_ms and total / 1000 > options.max_ms:
+        print("Import time exceeds the %.1f ms budget." % (options.max_ms))
+        status = 1
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
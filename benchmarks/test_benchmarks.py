@@ -0,0 +1,71 @@
+#
+# Benchmark Suite
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""Measure collection, dataset creation, analysis, and prediction without network access.
+
+Run with `pytest benchmarks` from the project root. pytest-benchmark is a development dependency,
+    and the suite is skipped in environments without it. Collection runs against a local stub
+    server with synthetic repositories, so every run measures the same requests. To gate a change
+    on performance, save a baseline with `pytest benchmarks --benchmark-autosave` and compare later
+    runs against it with `pytest benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%`,
+    which fails when any benchmark is more than 10% slower on average.
+"""
+import numpy as np
+import pytest
+from gh_twilight.analysis import TSDataModel, analyze_dataset, create_dataset
+from gh_twilight.data import GHCollectorBackend, GithubMLDataCollector
+from gh_twilight.replay import GHStubServer, synthetic_commits
+from benchmarks.dataset_scaling import synthetic_weeksums
+
+pytest.importorskip("pytest_benchmark")
+
+COMMITS = 5000
+
+@pytest.fixture(scope="module")
+def stub():
+    """Serve a synthetic repository with `COMMITS` commits on a local stub server."""
+    server = GHStubServer(repositories={"pony/benchmark": synthetic_commits(COMMITS)})
+    server.start()
+    yield server
+    server.stop()
+
+@pytest.fixture(scope="module")
+def dataset():
+    """Create a dataset of 2,000 synthetic repositories."""
+    return create_dataset(synthetic_weeksums(2000))
+
+@pytest.mark.parametrize("backend", [GHCollectorBackend.COMMITS, GHCollectorBackend.STATS,
+                                     GHCollectorBackend.GRAPHQL],
+                         ids=lambda x: x.name.lower())
+def test_get_weeksum(benchmark, stub, backend):
+    """Collect the synthetic repository with every remote backend."""
+    collector = GithubMLDataCollector("", backend=backend, base_url=stub.base_url,
+                                      graphql_url=stub.graphql_url)
+    data = benchmark(collector.get_weeksum, "pony/benchmark", hourly=True)
+    assert data.abstotal == COMMITS
+
+def test_create_dataset(benchmark):
+    """Create a dataset from 100,000 synthetic repositories."""
+    raw = synthetic_weeksums(100000)
+    data = benchmark(create_dataset, raw)
+    assert data["data"][0].shape == (100000, 7)
+
+@pytest.mark.parametrize("model", list(TSDataModel), ids=lambda x: x.name.lower())
+def test_analyze_dataset(benchmark, dataset, model):
+    """Fit and score every model on the synthetic dataset."""
+    result = benchmark.pedantic(analyze_dataset, args=(dataset, model), rounds=3)
+    assert result.model is not None
+
+@pytest.mark.parametrize("model", list(TSDataModel), ids=lambda x: x.name.lower())
+def test_predict_many(benchmark, dataset, model):
+    """Predict the totals of 100,000 weeksums with every fitted model."""
+    result = analyze_dataset(dataset, model)
+    commits = np.random.default_rng(0).integers(0, 200, (100000, 7))
+    predictions = benchmark(result.predict_many, commits)
+    assert predictions.shape == (100000,)
@@ -39,15 +39,92 @@ To create the config file that Project Twilight uses, run `gh-twilight --generat
 - `--config CONFIG`: The path to the configuration file to use.
 `--generate`: Runs the interactive configuration utility.
 
+### Collection arguments
+- `--from-dataset FROM_DATASET`: Read the repository data from a dataset exported by a previous run
+    (`--csv`, `--json`, `--npz`, or `--parquet`, or a JSON Lines file with one exported repository
+    per line) instead of collecting it from GitHub. CSV, JSON, and JSON Lines files are parsed one
+    repository at a time. With `--update`, the models are updated with the repositories in the file
+    that they were not trained on.
+- `--workers WORKERS`: The number of repositories to collect from GitHub at the same time.
+    Overrides `workers` in the configuration file.
+- `--backend {commits,stats,local,graphql}`: The source to build repository data from. Overrides
+    `backend` in the configuration file.
+- `--mirror-root MIRROR_ROOT`: The directory that contains local clones for the `local` backend.
+    Overrides `mirror_root` in the configuration file.
+- `--page-budget PAGE_BUDGET`: The maximum number of pages of commits to read per repository.
+    Overrides `page_budget` in the configuration file.
+- `--since SINCE`, `--until UNTIL`: Only count commits made in this window of dates (YYYY-MM-DD).
+    Overrides `since` and `until` in the configuration file.
+- `--cache-dir CACHE_DIR`: The directory used to cache repository data between runs. Overrides
+    `cache_dir` in the configuration file.
+- `--http-cache HTTP_CACHE`: The SQLite file used to cache GitHub responses between runs. Overrides
+    `http_cache` in the configuration file.
+- `--no-cache`: Collect all repository data from GitHub without reading or updating the caches.
+- `--record RECORD`: Record every GitHub response of the collection to this JSON fixture file.
+- `--replay REPLAY`: Collect the repository data from the responses in a fixture recorded with
+    `--record` instead of GitHub, without network access. Requests that were not recorded fail as if
+    the repository did not exist.
+
 ### Analysis and prediction arguments
+- `--jobs JOBS`: The number of worker processes to fit models in. Overrides `n_jobs` in the
+    configuration file.
+- `--folds FOLDS`: The number of cross-validation folds to score the models with, or `0` to score
+    them on a single split. Overrides `folds` in the configuration file.
+- `--search`: Search the hyperparameters of the models in the `config.search` section before fitting
+    them, save the best ones to the hyperparameter profile, and fit the models with them.
 - `--plot`: Creates plot graphs of predicted and testing data from training the network.
 - `--predict`: Run predictions on the data provided in the configuration file.
+- `--predict-file PREDICT_FILE`: Predict values for every weeksum in a CSV, JSON Lines (`.jsonl`),
+    or NumPy (`.npy`) file. Inputs hold the feature set the models were trained with (`features` and
+    `weeks` in the configuration). CSV files can be the `--csv` export, have a header that names
+    every feature column, or hold rows of a name and the feature values. JSON Lines files hold one
+    configuration input, `--json` repository, or list of feature values per line. NumPy files hold
+    an array with one column per feature. The file is read in chunks, so large files are scored in
+    bounded memory.
+- `--predict-output PREDICT_OUTPUT`: The CSV file to write the predictions for `--predict-file` to.
+    Defaults to `predictions.csv`.
+- `--artifacts ARTIFACTS`: The directory that stores fitted models between runs. Overrides
+    `artifacts` in the configuration file.
+- `--predict-only`: Run predictions with the latest saved models in the artifact directory without
+    collecting data or training.
+- `--update`: Update the latest saved models in the artifact directory with the repositories in
+    `repos` that they were not trained on, instead of collecting every repository and fitting the
+    models again. Only the new repositories are collected and fitted: the linear model adds them to
+    the least squares statistics it keeps, the neural network continues training from its current
+    weights, and the random forest grows new trees for them. The updated models are saved as the
+    latest artifacts. Combine with `--predict` or `--predict-file` to predict with the updated
+    models.
+
+### Prediction server arguments
+- `--serve`: Serve predictions over HTTP with the latest saved models in the artifact directory.
+    `POST /predict` accepts one input in the format of the configuration inputs (such as
+    `{"commits": [...]}`) or `{"inputs": [[...], ...]}` with the feature values of many, and answers
+    `{"model": ..., "predictions": [...]}`. Concurrent requests are grouped into a single call to
+    the model, and the models are reloaded when new artifacts are saved.
+- `--host HOST`: The host the prediction server listens on. Defaults to `127.0.0.1`.
+- `--port PORT`: The port the prediction server listens on. Defaults to `8642`.
 
 ### Extra arguments
 - `--log-file LOG_FILE`: The path to where you want the logs to be store. Omitting this argument
     will disable logging.
+- `--report REPORT`: Write a JSON report of the run to this file. The report lists every stage of
+    the run (reading the configuration, collecting or reading the dataset, exporting it, building
+    the dataset, searching, fitting the models, predicting, and plotting) with when it started and
+    how many seconds it took. The collection stage also lists the time, number of GitHub requests,
+    bytes of response bodies, and number of requests answered as not modified by the HTTP cache of
+    every repository, and the analysis stage lists how long each model took to fit and to predict
+    its testing data.
+- `--profile PROFILE`: Profile every stage of the run with cProfile and write the statistics of each
+    stage to a `.pstats` file in this directory. The files can be read with Python's `pstats` module
+    or tools such as `snakeviz`. Only the main thread is profiled, so work done by collection
+    threads or model worker processes shows up as waiting time.
 - `--csv`: Exports the raw dataset to a CSV file before analysis.
 - `--json`: Exports the raw dataset to a JSON file before analysis.
+- `--npz`: Exports the raw dataset to a NumPy `dataset.npz` file before analysis. The weekday
+    commits, totals, and names are stored as contiguous arrays, so the file loads much faster than
+    the CSV or JSON exports.
+- `--parquet`: Exports the raw dataset to a Parquet `dataset.parquet` file before analysis. Requires
+    `pyarrow`.
 
 ## Sparkle configuration file
 The configuration file (in TOML syntax) contains important information on how to collect data, what
@@ -62,14 +139,69 @@ The configuration file (in TOML syntax) contains important information on how to
 The `config.account` section includes the following keys:
 
 - `git_name`: The Git username that made the commits to the repository
+- `aliases`: (Optional) A list of GitHub logins and email addresses that belong to `git_name`.
+    When set, GitHub filters the commits by these aliases so that only the author's commits are
+    downloaded, and the total commit count of the repository is fetched with a single request.
+    Without aliases, every commit is downloaded and matched against `git_name`.
 - `token`: The GitHub personal token with the `repo` permission.
+- `tokens`: (Optional) A list of additional GitHub personal tokens. Requests are spread across all
+    of the tokens by how many requests each one has left, and collection waits until the earliest
+    rate limit reset when every token is exhausted.
 
 ### Activity configuration
 The `config.activities` section includes the following keys:
 
 - `models`: A list of strings containing what models to use. Valid options are `forest`, `neural`,
     and `linear`.
+- `n_jobs`: (Optional) The number of worker processes to fit the models in at the same time. Use
+    `-1` for one process per CPU core. Defaults to `1`, which fits the models one after another.
+- `profile`: (Optional) The path to a hyperparameter profile written by `--search`. The models are
+    fitted with the hyperparameters in the profile instead of their defaults, and `--search` writes
+    its results here (or to `sparkle_profile.toml` when this is not set).
 - `repos`: A list of strings containing the repositories on GitHub to use as training data.
+- `workers`: (Optional) The number of repositories to collect at the same time. Defaults to `1`.
+    The dataset keeps the order of `repos` regardless of this value, and a repository that fails
+    to load is skipped instead of stopping the collection.
+- `backend`: (Optional) The source to build repository data from. Valid options are `commits`,
+    `stats`, `local`, and `graphql`. Defaults to `commits`.
+    - `commits` pages through every commit in the repository.
+    - `stats` reads GitHub's aggregated punch card statistics, which takes a couple of requests per
+        repository. Statistics cannot be filtered by author, so this falls back to `commits` when
+        `git_name` is set or when GitHub cannot provide the statistics.
+    - `local` reads the default branch of bare or mirror clones on disk with `git log`, without a
+        token or network access.
+    - `graphql` reads the history of `batch_size` repositories in every query to the GraphQL API,
+        and each repository continues from its own cursor in the next query. A study costs about one
+        request per batch for every 100 commits of the longest history in the batch. Commits are
+        matched to `git_name` by committer name, or to `aliases` by the login and email of the
+        commit author.
+- `mirror_root`: (Optional) The directory that contains local clones for the `local` backend. The
+    clone of `owner/name` is read from `owner/name.git` or `owner/name` in this directory.
+- `batch_size`: (Optional) The number of repositories to ask for in every query of the `graphql`
+    backend. Defaults to `25`.
+- `graphql_url`: (Optional) The GraphQL endpoint of the `graphql` backend. Defaults to
+    `https://api.github.com/graphql`.
+- `page_budget`: (Optional) The maximum number of pages (of 100 commits) to read per repository.
+    Defaults to `0`, which reads every page. Repositories with more pages are sampled from their
+    newest commits instead of read in full.
+- `features`: (Optional) The feature set to train the models with. Valid options are `weekday` and
+    `hour_of_week`. Defaults to `weekday`.
+    - `weekday` uses the seven weekday commit totals.
+    - `hour_of_week` uses the 168 commit totals of every hour of the week (in UTC), starting from
+        Sunday at midnight. The `stats` backend builds them from GitHub's punch card.
+- `weeks`: (Optional) The number of latest ISO weeks of commits to add after the feature set, oldest
+    first. Defaults to `0`. The `stats` backend falls back to `commits` when this is set.
+- `since`, `until`: (Optional) TOML dates that limit the commits counted to a window of time.
+    Repositories collected with a page budget or a date window are marked as sampled (`"exact":
+    false` in the JSON export); their absolute total still counts the whole repository.
+- `cache_dir`: (Optional) The directory used to cache repository data between runs. When set,
+    later runs only request the commits made since the newest cached commit of each repository.
+- `http_cache`: (Optional) The SQLite file used to cache GitHub responses between runs. Every
+    request is sent with the `ETag` or `Last-Modified` of its cached response, and GitHub answers
+    `304 Not Modified` without using the rate limit when nothing changed, so a warm rerun of a study
+    costs almost none of the rate limit.
+- `http_cache_size`: (Optional) The number of megabytes of responses to keep in the HTTP cache
+    before the least recently used ones are evicted. Defaults to `256`.
 
 ### Prediction configuration
 The `config.predictions` section includes the following keys:
@@ -77,7 +209,8 @@ The `config.predictions` section includes the following keys:
 - `method`: The model to use to make predictions. Valid options are `forest`, `neural`, `linear`,
     and `best`.
     - Using `best` will automatically determine the best model to use by using the model with the
-        highest R2 accuracy score.
+        highest R2 accuracy score. When the models are cross-validated, this is the highest mean R2
+        score across the folds.
 - `inputs`: A list of dictionaries that contain the input values to predict. The dictionary should
     have the following keys:
     - `name`: The name of the repository. This does _not_ need to point to a real repository on
@@ -85,6 +218,53 @@ The `config.predictions` section includes the following keys:
     - `commits`: A list containing seven integers that represent how many commits are made on the
         weekdays if all weeks are combined. For example, if a user make two commits to a repository
         every day for two weeks, the commits list should be `[4, 4, 4, 4, 4, 4, 4]`.
+    - `hours`: A list of 168 integers with the commits made in every hour of the week, starting from
+        Sunday at midnight, when `features` is `hour_of_week`.
+    - `weeks`: A list with the commits made in each of the latest `weeks` ISO weeks, oldest first,
+        when `weeks` is set.
+- `artifacts`: (Optional) The directory that stores fitted models. Every fitted model is saved
+    there with a key made from the dataset and the model's hyperparameters, and a model that was
+    already fitted to the same dataset is loaded instead of being trained again.
+- `folds`: (Optional) The number of folds to cross-validate every model with. Every model is scored
+    on the same folds, the folds are fitted in parallel with `n_jobs` processes, and the mean and
+    variance of each model's R2 score and MSE are logged. Defaults to `0`, which scores the models
+    on a single 80/20 split instead.
+- `repeats`: (Optional) The number of times to draw the cross-validation folds with a different
+    shuffle. Defaults to `1`.
+
+### Search configuration
+The optional `config.search` section configures `--search` with the following keys:
+
+- `method`: (Optional) The search method. Valid options are `grid`, `random`, and `halving`.
+    Defaults to `grid`.
+    - `grid` scores every combination of the values to try.
+    - `random` scores `budget` combinations drawn at random.
+    - `halving` scores `budget` combinations (or all of them) on a small sample of the repositories,
+        and keeps the best third of them for the next round on three times as many repositories
+        until one is left.
+- `budget`: (Optional) The number of combinations to draw for `random` and `halving`. Defaults to
+    `0`, which uses every combination.
+- `factor`: (Optional) How many times fewer combinations and more repositories each `halving` round
+    uses. Defaults to `3`.
+- `cache_dir`: (Optional) The directory that stores the score of every combination, so that an
+    interrupted search resumes where it stopped. Defaults to `sparkle_search`.
+- `neural`, `forest`, `linear`: (Optional) Tables of scikit-learn hyperparameter names and the list
+    of values to try for each. Only models listed in `config.activities.models` are searched. Every
+    combination is cross-validated with `folds` folds on the same splits, and the combinations are
+    scored in parallel with `n_jobs` processes.
+
+```toml
+[config.search]
+method = "halving"
+
+[config.search.neural]
+alpha = [0.0001, 0.001, 0.01]
+hidden_layer_sizes = [[10, 2], [20, 5], [50]]
+
+[config.search.forest]
+n_estimators = [50, 100, 200]
+min_samples_leaf = [1, 2, 4]
+```
 
 ---
 
@@ -103,14 +283,33 @@ method = "best"
 inputs = [{ name = "equestria/journal", commits = [1, 13, 9, 8, 7, 12, 8] }]
 ```
 
+## Benchmarks
+The `benchmarks` directory contains a pytest-benchmark suite that measures collection with every
+    remote backend, dataset creation, fitting every model, and prediction. Collection runs against
+    `GHStubServer`, a local stand-in for the GitHub API that serves synthetic repositories and
+    recorded fixtures, so the suite needs no network access. pytest-benchmark is installed with the
+    development dependencies. Run the suite with `pytest benchmarks` and save a baseline with
+    `--benchmark-autosave`. Later runs with `--benchmark-compare` and
+    `--benchmark-compare-fail=mean:10%` fail when a benchmark is more than 10% slower on average.
+
 ## License
 Project Twilight is free and open-source software licensed under the Mozilla Public License, v2.0.
 """
 from .analysis import *
+from .batch import *
+from .cache import *
 from .cli import *
 from .commit import *
 from .data import *
+from .features import *
+from .graphql import *
+from .ratelimit import *
+from .replay import *
 from .repo import *
+from .report import *
+from .search import *
+from .server import *
 from .sparkle import *
+from .store import *
 
 __version__ = '0.1.0'
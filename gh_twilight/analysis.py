@@ -9,18 +9,29 @@
 #
 
 """The analysis submodule contains the utilities and functions necessary for analyzing repository
-    data."""
+    data.
+
+scikit-learn, joblib, and matplotlib are imported by the functions that use them rather than when
+    this module loads, and each estimator is only imported when its model is selected, so that
+    commands that do not train or plot do not pay for loading them.
+"""
+from __future__ import annotations
 from enum import IntEnum
-from typing import Union
+from typing import Union, TYPE_CHECKING
+import glob
+import hashlib
 import logging
+import os
+import time
 import numpy as np
-from sklearn.linear_model import LinearRegression
-from sklearn.neural_network import MLPRegressor
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score
-from matplotlib import pyplot as plt
+from gh_twilight.features import TSFeatureError, feature_names, week_window
 from gh_twilight.repo import GHRepositoryWeeksum
+from gh_twilight.store import GHWeeksumStore
+
+if TYPE_CHECKING:
+    from sklearn.linear_model import LinearRegression
+    from sklearn.neural_network import MLPRegressor
+    from sklearn.ensemble import RandomForestRegressor
 
 class TSDataModel(IntEnum):
     """An enumeration for the type of data model to analyze with.
@@ -35,12 +46,90 @@ class TSDataModel(IntEnum):
     NEURAL = 1
     FOREST = 2
 
+ARTIFACT_VERSION = 1
+"""The version of the model artifact format written by `TSDataAnalysisResult.save`."""
+
 class TSDatasetGenerateError(Exception):
     """Could not create the analysis dataset."""
 
 class TSDataAnalysisError(Exception):
     """Could not analyze the dataset."""
 
+class TSCrossValidationResult():
+    """A data structure that holds the cross-validated scores of a model.
+
+    Attributes:
+        model_type (TSDataModel): The type of model that was scored.
+        folds (int): The number of folds the dataset was split into.
+        repeats (int): The number of times the folds were drawn.
+        r2_scores (np.ndarray): The R2 score of every fold.
+        mse_scores (np.ndarray): The mean squared error of every fold.
+    """
+
+    def __init__(self, model_type: TSDataModel, folds: int, repeats: int, r2_scores, mse_scores):
+        """Initialize a cross-validation result.
+
+        Args:
+            model_type (TSDataModel): The type of model that was scored.
+            folds (int): The number of folds the dataset was split into.
+            repeats (int): The number of times the folds were drawn.
+            r2_scores (Iterable): The R2 score of every fold.
+            mse_scores (Iterable): The mean squared error of every fold.
+        """
+        self.model_type = model_type
+        self.folds = folds
+        self.repeats = repeats
+        self.r2_scores = np.asarray(r2_scores, dtype=np.float64)
+        self.mse_scores = np.asarray(mse_scores, dtype=np.float64)
+
+    @property
+    def r2_mean(self) -> float:
+        """The mean R2 score across every fold."""
+        return float(self.r2_scores.mean())
+
+    @property
+    def r2_variance(self) -> float:
+        """The variance of the R2 score across every fold."""
+        return float(self.r2_scores.var())
+
+    @property
+    def mse_mean(self) -> float:
+        """The mean squared error averaged across every fold."""
+        return float(self.mse_scores.mean())
+
+    @property
+    def mse_variance(self) -> float:
+        """The variance of the mean squared error across every fold."""
+        return float(self.mse_scores.var())
+
+    def to_dict(self) -> dict:
+        """Get a dictionary representation of the cross-validation result.
+
+        Returns:
+            cv_dict (dict): A dictionary containing the fold settings and the score of every fold.
+        """
+        return {"model_type": int(self.model_type),
+                "folds": self.folds,
+                "repeats": self.repeats,
+                "r2_scores": self.r2_scores.tolist(),
+                "mse_scores": self.mse_scores.tolist()}
+
+    @classmethod
+    def from_dict(cls, cv_dict: dict):
+        """Create a cross-validation result from a dictionary written by `to_dict`.
+
+        Args:
+            cv_dict (dict): The dictionary representation of the result.
+
+        Returns:
+            result (TSCrossValidationResult): The cross-validation result.
+        """
+        return cls(TSDataModel(cv_dict["model_type"]),
+                   cv_dict["folds"],
+                   cv_dict["repeats"],
+                   cv_dict["r2_scores"],
+                   cv_dict["mse_scores"])
+
 class TSDataAnalysisResult():
     """A data structure that holds the results of a given analysis."""
 
@@ -62,9 +151,17 @@ class TSDataAnalysisResult():
             labels (list): A list containing the names of the repositories.
             training_data (tuple): A tuple containing the training data for X and y.
             testing_data (tuple): A tuple containing the testing data for X and y.
+            cross_validation (TSCrossValidationResult): The cross-validated scores of this model.
+            sufficient_stats (tuple): The X^T X and X^T y matrices of the training data of a linear
+                model, with a column of ones for the intercept.
+            timings (dict): The number of seconds it took to fit the model and to predict the
+                testing data, by the names "fit" and "predict".
         """
         self.model_type = model_type
         self.model = model
+        self.cross_validation = kwargs.get("cross_validation")
+        self.sufficient_stats = kwargs.get("sufficient_stats")
+        self.timings = kwargs.get("timings", {})
 
         if "accuracy" in kwargs:
             self.accuracy = kwargs["accuracy"]
@@ -79,8 +176,9 @@ class TSDataAnalysisResult():
         if "data" in kwargs:
             self.labels = kwargs["data"]["targets"]
 
+            from sklearn.model_selection import train_test_split #pylint:disable=import-outside-toplevel
             X, y = kwargs["data"]["data"]   #pylint:disable=invalid-name
-            self.x_train, self.y_train, self.x_test, self.y_test = train_test_split(X, y,
+            self.x_train, self.x_test, self.y_train, self.y_test = train_test_split(X, y,
                                                                                     test_size=0.2)
 
         if "training_data" in kwargs:
@@ -102,6 +200,7 @@ class TSDataAnalysisResult():
             accuracy (float): The R2 accuracy score of this model.
         """
         if not self.accuracy:
+            from sklearn.metrics import r2_score #pylint:disable=import-outside-toplevel
             pred = self.model.predict(self.x_test)
             return r2_score(self.y_test, pred)
         return self.accuracy
@@ -116,6 +215,7 @@ class TSDataAnalysisResult():
             error (float): The mean squared error of this model.
         """
         if not self.error:
+            from sklearn.metrics import mean_squared_error #pylint:disable=import-outside-toplevel
             pred = self.model.predict(self.x_test)
             return mean_squared_error(self.y_test, pred)
         return self.error
@@ -130,6 +230,7 @@ class TSDataAnalysisResult():
         """
         if "labels" not in self.__dict__:
             raise TSDataAnalysisError("Missing labels for data plot.")
+        from matplotlib import pyplot as plt #pylint:disable=import-outside-toplevel
 
         x_axis = self.x_test.shape[0]
         p_labels = [x.split("/")[1] for x in self.labels[(-1 * x_axis):]]
@@ -158,84 +259,543 @@ class TSDataAnalysisResult():
         commit_array = np.array(commits).reshape(1, -1)
         return round(self.model.predict(commit_array)[0])
 
-def create_raw_matrix(raw_dataset: list) -> np.ndarray:
-    """Convert a list of GHRepositoryWeeksum objects to a proper numpy array for analysis.
+    def predict_many(self, commits: np.ndarray) -> np.ndarray:
+        """Predict the total commit counts of many rows of features at once.
+
+        The predictions are made with a single call to the model and rounded to the nearest
+            integer value.
+
+        Args:
+            commits (ndarray): An array of shape (n, m) where every row holds the values of the m
+                features the model was trained with, in the order of `feature_names`.
+
+        Returns:
+            predictions (ndarray): An int64 array of shape (n,) with the predicted number of total
+                project commits for every row.
+        """
+        commit_array = np.asarray(commits)
+        if commit_array.ndim == 1:
+            commit_array = commit_array.reshape(1, -1)
+        if not commit_array.shape[0]:
+            return np.empty(0, dtype=np.int64)
+        return np.rint(self.model.predict(commit_array)).astype(np.int64)
+
+    def update(self, dataset: dict):
+        """Update the fitted model with repositories it was not trained on.
+
+        The linear model and the random forest fit only the new repositories, so their update
+            takes time proportional to the new data instead of the whole dataset:
+
+        - The linear model keeps the sufficient statistics of its training data and solves the
+            least squares problem again after adding those of the new repositories, which gives
+            the same coefficients as fitting all of the data at once.
+        - The neural network is trained again from its current weights on its previous training
+            data together with the new repositories. The lbfgs solver has no incremental step, and
+            fitting the new repositories alone would overwrite what it learned from the old ones.
+        - The random forest keeps its trees and grows new ones on the new repositories, in
+            proportion to how much data they add.
+
+        The new repositories are split into training and testing data with an 80/20 split, and
+            the accuracy and error are scored again on the combined testing data. Cross-validated
+            scores no longer apply to the updated model and are cleared.
+
+        Args:
+            dataset (dict): A dictionary that represents the new repositories.
+        """
+        #pylint:disable=import-outside-toplevel,invalid-name
+        from sklearn.metrics import mean_squared_error, r2_score
+        from sklearn.model_selection import train_test_split
+        X, y = dataset["data"]
+        if len(y) >= 5:
+            X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=0)
+        else:
+            X_train, X_test, y_train, y_test = X, X[:0], y, y[:0]
+        seen = len(self.y_train) + len(self.y_test)
+
+        if self.model_type == TSDataModel.LINEAR:
+            if self.sufficient_stats is None:
+                self.sufficient_stats = _least_squares_stats(self.x_train, self.y_train)
+            xtx, xty = _least_squares_stats(X_train, y_train)
+            self.sufficient_stats = (self.sufficient_stats[0] + xtx, self.sufficient_stats[1] + xty)
+            self.model.coef_, self.model.intercept_ = _solve_least_squares(*self.sufficient_stats)
+        elif self.model_type == TSDataModel.NEURAL:
+            self.model.set_params(warm_start=True)
+            self.model.fit(np.concatenate([self.x_train, X_train]),
+                           np.concatenate([self.y_train, y_train]))
+        elif self.model_type == TSDataModel.FOREST:
+            trees = max(1, round(len(self.model.estimators_) * len(y_train) / max(seen, 1)))
+            self.model.set_params(warm_start=True, n_estimators=len(self.model.estimators_) + trees)
+            self.model.fit(X_train, y_train)
+        logging.info("Updated %s model with %s new repositories.",
+                     self.model_type.name.lower(),
+                     len(y))
+
+        self.x_train = np.concatenate([self.x_train, X_train])
+        self.y_train = np.concatenate([self.y_train, y_train])
+        self.x_test = np.concatenate([self.x_test, X_test])
+        self.y_test = np.concatenate([self.y_test, y_test])
+        self.labels = list(self.__dict__.get("labels", [])) + list(dataset["targets"])
+        predictions = self.model.predict(self.x_test)
+        self.accuracy = r2_score(self.y_test, predictions)
+        self.error = mean_squared_error(self.y_test, predictions)
+        self.cross_validation = None
+
+    def save(self, path: str, key: str = ""):
+        """Save the fitted model and its metrics to an artifact file.
+
+        The artifact is written to a temporary file first and then moved into place, so readers
+            never see a partially written artifact.
+
+        Args:
+            path (str): The path of the artifact file to write.
+            key (str): The dataset and hyperparameter key the model was fitted for.
+        """
+        import joblib #pylint:disable=import-outside-toplevel
+        import sklearn #pylint:disable=import-outside-toplevel
+        artifact = {
+            "version": ARTIFACT_VERSION,
+            "sklearn_version": sklearn.__version__,
+            "key": key,
+            "model_type": int(self.model_type),
+            "model": self.model,
+            "accuracy": self.__dict__.get("accuracy"),
+            "error": self.__dict__.get("error"),
+            "training_data": (self.x_train, self.y_train),
+            "testing_data": (self.x_test, self.y_test),
+            "labels": list(self.__dict__.get("labels", [])),
+            "cross_validation": self.cross_validation.to_dict() if self.cross_validation
+                                else None,
+            "sufficient_stats": self.sufficient_stats
+        }
+        joblib.dump(artifact, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str):
+        """Load an analysis result from an artifact file written by `save`.
+
+        Args:
+            path (str): The path of the artifact file to read.
+
+        Returns:
+            result (TSDataAnalysisResult): The analysis result with the fitted model.
+        """
+        import joblib #pylint:disable=import-outside-toplevel
+        import sklearn #pylint:disable=import-outside-toplevel
+        artifact = joblib.load(path)
+        if not isinstance(artifact, dict) or artifact.get("version") != ARTIFACT_VERSION:
+            raise TSDataAnalysisError("Unsupported model artifact: %s." % (path))
+        if artifact["sklearn_version"] != sklearn.__version__:
+            logging.warning("Model artifact %s was created with scikit-learn %s (running %s).",
+                            path,
+                            artifact["sklearn_version"],
+                            sklearn.__version__)
+        cross_validation = artifact.get("cross_validation")
+        return cls(model_type=TSDataModel(artifact["model_type"]),
+                   model=artifact["model"],
+                   accuracy=artifact["accuracy"],
+                   error=artifact["error"],
+                   training_data=artifact["training_data"],
+                   testing_data=artifact["testing_data"],
+                   labels=artifact["labels"],
+                   cross_validation=TSCrossValidationResult.from_dict(cross_validation)
+                   if cross_validation else None,
+                   sufficient_stats=artifact.get("sufficient_stats"))
+
+def _least_squares_stats(X, y) -> tuple: #pylint:disable=invalid-name
+    """Get the X^T X and X^T y matrices of linear model data, with a column for the intercept."""
+    design = np.hstack([np.asarray(X, dtype=np.float64), np.ones((len(y), 1))])
+    return design.T @ design, design.T @ np.asarray(y, dtype=np.float64)
+
+def _solve_least_squares(xtx, xty) -> tuple:
+    """Get the coefficients and intercept of a linear model from its sufficient statistics.
+
+    The statistics are centered before solving, like scikit-learn does, so that the minimum norm
+        solution of a rank deficient dataset matches the one `LinearRegression.fit` finds.
+    """
+    count, sum_x, sum_y = xtx[-1, -1], xtx[:-1, -1], xty[-1]
+    centered_xx = xtx[:-1, :-1] - np.outer(sum_x, sum_x) / count
+    centered_xy = xty[:-1] - sum_x * sum_y / count
+    coef = np.linalg.lstsq(centered_xx, centered_xy, rcond=None)[0]
+    return coef, (sum_y - sum_x @ coef) / count
+
+def create_raw_arrays(raw_dataset: list) -> tuple:
+    """Convert a list of GHRepositoryWeeksum objects to the feature and target arrays for analysis.
+
+    Both arrays are filled in a single pass over the list, with the weekday commit numbers
+        gathered into one flat buffer that is converted to a contiguous matrix in one call.
 
     Args:
         raw_dataset (list): The list of GHRepositoryWeeksum objects to convert
 
     Returns:
-        matr (ndarray): A NumPy array that contains all of the weekday commit numbers for
-            every repository in the list.
+        arrays (tuple): A tuple containing an int32 array of shape (n, 7) with the weekday commit
+            numbers of every repository (X) and an int64 array of shape (n,) with the total number
+            of commits of every repository (y).
     """
+    days, totals = [], []
+    add_days, add_total = days.extend, totals.append
     repository: GHRepositoryWeeksum
-    matr = None
     for repository in raw_dataset:
-        repo_array = np.array(repository.weeksum.to_list())
-        matr = np.vstack([matr, repo_array]) if matr is not None else repo_array
+        add_days(repository.weeksum.to_list())
+        add_total(repository.abstotal)
+    return (np.array(days, dtype=np.int32).reshape(len(totals), 7),
+            np.array(totals, dtype=np.int64))
+
+def create_raw_matrix(raw_dataset: list) -> np.ndarray:
+    """Convert a list of GHRepositoryWeeksum objects to a proper numpy array for analysis.
 
-    if matr is None:
-        matr = np.empty((1, 1))
-    return matr
+    Args:
+        raw_dataset (list): The list of GHRepositoryWeeksum objects to convert
 
-def create_dataset(raw: list) -> dict:
+    Returns:
+        matr (ndarray): An int32 NumPy array of shape (n, 7) that contains all of the weekday
+            commit numbers for every repository in the list.
+    """
+    return create_raw_arrays(raw_dataset)[0]
+
+def create_dataset(raw: Union[list, GHWeeksumStore], features: str = "weekday",
+                   weeks: int = 0) -> dict:
     """Create a dataset used for numpy analysis from a repository dataset list.
 
+    When given a GHWeeksumStore with the weekday feature set and no weeks, the dataset uses views
+        of the store's columns instead of copying them.
+
     Args:
-        raw (list): The list of GHRepositoryWeeksum objects to create a dataset for
+        raw (Union[list, GHWeeksumStore]): The list of GHRepositoryWeeksum objects (or the store)
+            to create a dataset for
+        features (str): The feature set to use, which is one of `FEATURE_SETS`. Defaults to
+            "weekday".
+        weeks (int): The number of latest ISO weeks of commits to add after the feature set.
+            Defaults to 0.
 
     Returns:
         data (dict): A dictionary containing the dataset, as well as targets and features.
             The dictionary contains three keys: `targets`, for the name of the repositories,
-            `features`, for the weekday names on each commit in the list, and `data, a tuple
-            containing the commit weeksums (X) and the total number of commits for the project (Y).
+            `features`, for the name of each column of the feature set, and `data, a tuple
+            containing the feature arrays (X) and the total number of commits for the project (Y).
     """
-    dataset = {
-        "targets": [x.name for x in raw],
-        "features": ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"],
-        "data": (create_raw_matrix(raw), np.array([x.abstotal for x in raw]))
+    try:
+        names = feature_names(features, weeks)
+    except TSFeatureError as error:
+        raise TSDatasetGenerateError(str(error)) from error
+    if isinstance(raw, GHWeeksumStore):
+        targets, totals = raw.names, raw.abstotals
+        hours, series = raw.hours, raw.weeks
+        if hours is not None and not raw.has_hours.all():
+            hours = None
+        days = raw.days
+    else:
+        targets = [x.name for x in raw]
+        days, totals = create_raw_arrays(raw)
+        hours = [x.hours for x in raw] if features == "hour_of_week" else None
+        series = [x.weeks for x in raw] if weeks else None
+
+    if features == "weekday":
+        matrix = days
+    elif hours is None or any(x is None for x in hours):
+        raise TSDatasetGenerateError("Dataset does not have hour of week commit numbers. "
+                                     + "Collect it again with the hour_of_week feature set.")
+    else:
+        matrix = np.asarray(hours, dtype=np.int32).reshape(len(targets), 168)
+    if weeks:
+        if series is None or any(x is None for x in series):
+            raise TSDatasetGenerateError("Dataset does not have weekly commit numbers. "
+                                         + "Collect it again with the weeks setting.")
+        matrix = np.hstack([matrix, np.array([week_window(x, weeks) for x in series],
+                                             dtype=np.int32).reshape(len(targets), weeks)])
+    return {
+        "targets": targets,
+        "features": names,
+        "data": (matrix, totals)
     }
-    return dataset
 
-def analyze_dataset(dataset: dict, model: TSDataModel):
-    """Analyze a given dataset using a model.
-
-    The analysis utility will split the data to training and testing data with an 80/20 split and
-        selects an appropriate model to predict the total project commit values.
+def create_model(model: TSDataModel, params: dict = None) -> Union[MLPRegressor,
+                                                                   LinearRegression,
+                                                                   RandomForestRegressor]:
+    """Create an unfitted regression model of a given type.
 
     Args:
-        dataset (tuple): A dictionary that represents the repository dataset to use for analysis.
-        model (TSDataModel): The data model type to use.
+        model (TSDataModel): The data model type to create.
+        params (dict): The hyperparameters that replace the defaults of the model, if any.
 
     Returns:
-        result (TSDataAnalysisResult): The results of this data analysis.
+        a_model (Union[MLPRegressor, LinearRegression, RandomForestRegressor]): The regression
+            model.
     """
-    X, y = dataset["data"] #pylint:disable=invalid-name
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=0) #pylint:disable=invalid-name
-    logging.info("Dataset split to training and test sets. Sizes: %s (train), %s (test)",
-                 X_train.shape[0],
-                 X_test.shape[0])
-
+    #pylint:disable=import-outside-toplevel
     if model == TSDataModel.LINEAR:
-        logging.info("Linear model selected. Creating a regression model...")
+        from sklearn.linear_model import LinearRegression
         a_model = LinearRegression()
     elif model == TSDataModel.NEURAL:
-        logging.info("Neural network model selected. Creating a regression model...")
+        from sklearn.neural_network import MLPRegressor
         a_model = MLPRegressor(solver="lbfgs",
                                alpha=0.001,
                                hidden_layer_sizes=(10, 2),
                                max_iter=5000,
                                random_state=None)
     elif model == TSDataModel.FOREST:
-        logging.info("Random forest model selected. Creating a regression model...")
+        from sklearn.ensemble import RandomForestRegressor
         a_model = RandomForestRegressor(random_state=None)
     else:
         raise TSDataAnalysisError("Invalid model selected: %s." % (model))
+    if params:
+        try:
+            a_model.set_params(**params)
+        except ValueError as error:
+            raise TSDataAnalysisError("Invalid %s hyperparameters: %s."
+                                      % (model.name.lower(), error)) from error
+    return a_model
+
+def dataset_key(dataset: dict, model: TSDataModel, params: dict = None) -> str:
+    """Get the key that identifies a model fitted to a dataset.
+
+    The key is a hash of the dataset contents, the model type, and its hyperparameters, so it
+        changes whenever any of them would change the fitted model. The rows are hashed in the
+        order of their repository names, so the same repositories collected in a different order
+        get the same key.
+
+    Args:
+        dataset (dict): A dictionary that represents the repository dataset.
+        model (TSDataModel): The data model type.
+        params (dict): The hyperparameters that replace the defaults of the model, if any.
+
+    Returns:
+        key (str): The hexadecimal SHA-256 key.
+    """
+    X, y = dataset["data"] #pylint:disable=invalid-name
+    targets = list(dataset["targets"])
+    order = sorted(range(len(targets)), key=targets.__getitem__)
+    digest = hashlib.sha256()
+    for array in [np.ascontiguousarray(np.asarray(X)[order]),
+                  np.ascontiguousarray(np.asarray(y)[order])]:
+        digest.update(("%s%s" % (array.dtype.str, array.shape)).encode("utf-8"))
+        digest.update(array.tobytes())
+    digest.update("\0".join(targets[x] for x in order).encode("utf-8"))
+    params = sorted(create_model(model, params).get_params().items())
+    digest.update(("%s %s %s" % (ARTIFACT_VERSION, model.name, params)).encode("utf-8"))
+    return digest.hexdigest()
+
+def artifact_path(directory: str, model: TSDataModel, key: str) -> str:
+    """Get the path of the artifact for a model fitted to a dataset.
+
+    Args:
+        directory (str): The directory that stores model artifacts.
+        model (TSDataModel): The data model type.
+        key (str): The key returned by `dataset_key`.
+
+    Returns:
+        path (str): The path of the artifact file.
+    """
+    return os.path.join(directory, "sparkle_%s_%s.joblib" % (model.name.lower(), key[:16]))
+
+def load_latest_result(directory: str, model: TSDataModel) -> TSDataAnalysisResult:
+    """Load the most recently saved artifact for a model type.
+
+    Args:
+        directory (str): The directory that stores model artifacts.
+        model (TSDataModel): The data model type.
+
+    Returns:
+        result (TSDataAnalysisResult): The analysis result with the fitted model.
+    """
+    paths = glob.glob(os.path.join(directory, "sparkle_%s_*.joblib" % (model.name.lower())))
+    if not paths:
+        raise TSDataAnalysisError("No saved %s model in %s." % (model.name.lower(), directory))
+    return TSDataAnalysisResult.load(max(paths, key=os.path.getmtime))
+
+def select_result(analyses: list, method: str) -> TSDataAnalysisResult:
+    """Select the analysis result to make predictions with.
+
+    Args:
+        analyses (list): The TSDataAnalysisResult of every model to choose from.
+        method (str): The prediction method: the name of a model, or "best" to use the model with
+            the highest R2 accuracy score. When every model was cross-validated, "best" uses the
+            highest mean R2 score across the folds, preferring the lower variance on a tie.
+
+    Returns:
+        result (TSDataAnalysisResult): The analysis result to predict with.
+    """
+    if method == "best":
+        if all(x.cross_validation for x in analyses):
+            result = max(analyses, key=lambda a: (a.cross_validation.r2_mean,
+                                                   -a.cross_validation.r2_variance))
+        else:
+            result = max(analyses, key=lambda a: a.get_accuracy())
+        logging.info("Determined that %s is best model.", result.model_type.name.lower())
+        return result
+    matches = [x for x in analyses if x.model_type.name.lower() == method]
+    if not matches:
+        raise TSDataAnalysisError("No %s model to predict with." % (method))
+    return matches[0]
+
+def create_folds(count: int, folds: int = 5, repeats: int = 1) -> list:
+    """Create the train and test indices of every cross-validation fold.
+
+    The folds are drawn with a fixed seed, so every model is scored on exactly the same splits.
+
+    Args:
+        count (int): The number of samples in the dataset.
+        folds (int): The number of folds to split the dataset into.
+        repeats (int): The number of times to draw the folds with a different shuffle.
+
+    Returns:
+        splits (list): A list of (train, test) index arrays, one per fold.
+    """
+    #pylint:disable=import-outside-toplevel
+    from sklearn.model_selection import KFold, RepeatedKFold
+    if folds < 2 or folds > count:
+        raise TSDataAnalysisError("Cannot split %s samples into %s folds." % (count, folds))
+    if repeats > 1:
+        splitter = RepeatedKFold(n_splits=folds, n_repeats=repeats, random_state=0)
+    else:
+        splitter = KFold(n_splits=folds, shuffle=True, random_state=0)
+    return [(train.astype(np.intp), test.astype(np.intp))
+            for train, test in splitter.split(np.empty((count, 1)))]
+
+def score_fold(X, y, model: TSDataModel, train, test, #pylint:disable=invalid-name
+               params: dict = None) -> tuple:
+    """Fit a model on the training indices of a fold and score it on the test indices.
+
+    Args:
+        X (np.ndarray): The weeksum matrix.
+        y (np.ndarray): The total commit counts.
+        model (TSDataModel): The data model type to fit.
+        train (np.ndarray): The indices of the training samples.
+        test (np.ndarray): The indices of the testing samples.
+        params (dict): The hyperparameters that replace the defaults of the model, if any.
+
+    Returns:
+        scores (tuple): The R2 score and mean squared error of the fold.
+    """
+    from sklearn.metrics import mean_squared_error, r2_score #pylint:disable=import-outside-toplevel
+    a_model = create_model(model, params)
+    a_model.fit(X[train], y[train])
+    predictions = a_model.predict(X[test])
+    return r2_score(y[test], predictions), mean_squared_error(y[test], predictions)
+
+def cross_validate_models(dataset: dict, models: list, folds: int = 5, repeats: int = 1,
+                          n_jobs: int = 1, profile: dict = None) -> list:
+    """Score several models with k-fold cross-validation.
+
+    The fold indices are computed once and shared by every model, and every (model, fold) pair is
+        fitted as its own task, so the folds of all models run in parallel.
+
+    Args:
+        dataset (dict): A dictionary that represents the repository dataset to score with.
+        models (list): The list of TSDataModel types to score.
+        folds (int): The number of folds to split the dataset into.
+        repeats (int): The number of times to draw the folds with a different shuffle.
+        n_jobs (int): The number of worker processes to fit folds in. Use -1 for one process per
+            CPU core, or 1 to fit the folds one after another in this process.
+        profile (dict): The hyperparameters of each TSDataModel type that replace its defaults, if
+            any.
+
+    Returns:
+        results (list): The TSCrossValidationResult of every model, in the same order as `models`.
+    """
+    X, y = dataset["data"] #pylint:disable=invalid-name
+    profile = profile or {}
+    splits = create_folds(len(y), folds, repeats)
+    tasks = [(model, train, test) for model in models for train, test in splits]
+    logging.info("Cross-validating %s models over %s folds...", len(models), len(splits))
+    if n_jobs == 1:
+        scores = [score_fold(X, y, model, train, test, profile.get(model))
+                  for model, train, test in tasks]
+    else:
+        from joblib import Parallel, delayed #pylint:disable=import-outside-toplevel
+        scores = Parallel(n_jobs=min(len(tasks), n_jobs) if n_jobs > 0 else n_jobs)(
+            delayed(score_fold)(X, y, model, train, test, profile.get(model))
+            for model, train, test in tasks)
+
+    results = []
+    for index, model in enumerate(models):
+        fold_scores = np.array(scores[index * len(splits):(index + 1) * len(splits)])
+        result = TSCrossValidationResult(model,
+                                         folds,
+                                         repeats,
+                                         fold_scores[:, 0],
+                                         fold_scores[:, 1])
+        logging.info("%s model cross-validated with a mean R2 score of %s (variance %s) and a "
+                     "mean MSE of %s (variance %s).",
+                     model.name.capitalize(),
+                     round(result.r2_mean, 4),
+                     round(result.r2_variance, 4),
+                     round(result.mse_mean, 4),
+                     round(result.mse_variance, 4))
+        results.append(result)
+    return results
+
+def update_models(dataset: dict, results: list, artifacts: str = None) -> int:
+    """Update fitted models with the repositories in a dataset that they were not trained on.
+
+    Every updated model is saved to a new artifact, which becomes the latest artifact of its model.
+
+    Args:
+        dataset (dict): A dictionary that represents the newly collected repositories.
+        results (list): The TSDataAnalysisResult of every model to update.
+        artifacts (str): The directory that stores model artifacts, if any.
+
+    Returns:
+        updated (int): The number of models that were updated.
+    """
+    X, y = dataset["data"] #pylint:disable=invalid-name
+    updated = 0
+    for result in results:
+        seen = set(result.__dict__.get("labels", []))
+        rows = np.array([x not in seen for x in dataset["targets"]], dtype=bool)
+        if not rows.any():
+            logging.info("The %s model has already seen every repository.",
+                         result.model_type.name.lower())
+            continue
+        new_data = {"data": (X[rows], y[rows]),
+                    "targets": [x for x, new in zip(dataset["targets"], rows) if new]}
+        digest = hashlib.sha256("\0".join(result.labels).encode("utf-8"))
+        digest.update(dataset_key(new_data, result.model_type).encode("utf-8"))
+        result.update(new_data)
+        updated += 1
+        if artifacts:
+            os.makedirs(artifacts, exist_ok=True)
+            result.save(artifact_path(artifacts, result.model_type, digest.hexdigest()),
+                        digest.hexdigest())
+    return updated
+
+def analyze_dataset(dataset: dict, model: TSDataModel, params: dict = None):
+    """Analyze a given dataset using a model.
+
+    The analysis utility will split the data to training and testing data with an 80/20 split and
+        selects an appropriate model to predict the total project commit values.
+
+    Args:
+        dataset (tuple): A dictionary that represents the repository dataset to use for analysis.
+        model (TSDataModel): The data model type to use.
+        params (dict): The hyperparameters that replace the defaults of the model, if any.
+
+    Returns:
+        result (TSDataAnalysisResult): The results of this data analysis.
+    """
+    #pylint:disable=import-outside-toplevel
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import mean_squared_error, r2_score
+    X, y = dataset["data"] #pylint:disable=invalid-name
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=0) #pylint:disable=invalid-name
+    logging.info("Dataset split to training and test sets. Sizes: %s (train), %s (test)",
+                 X_train.shape[0],
+                 X_test.shape[0])
 
+    a_model = create_model(model, params)
+    logging.info("%s model selected. Creating a regression model...",
+                 {TSDataModel.LINEAR: "Linear",
+                  TSDataModel.NEURAL: "Neural network",
+                  TSDataModel.FOREST: "Random forest"}[model])
+    started = time.perf_counter()
     a_model.fit(X_train, y_train)
+    timings = {"fit": round(time.perf_counter() - started, 6)}
     logging.info("Model fitted to training data.")
     logging.info("Applying testing data...")
+    started = time.perf_counter()
     predictions = a_model.predict(X_test)
+    timings["predict"] = round(time.perf_counter() - started, 6)
     logging.info("Predicted total commits from testing data: %s.", predictions)
 
     data_mse = mean_squared_error(y_test, predictions)
@@ -255,4 +815,90 @@ def analyze_dataset(dataset: dict, model: TSDataModel):
                                 error=data_mse,
                                 training_data=(X_train, y_train),
                                 testing_data=(X_test, y_test),
-                                labels=dataset["targets"])
+                                labels=dataset["targets"],
+                                sufficient_stats=_least_squares_stats(X_train, y_train)
+                                if model == TSDataModel.LINEAR else None,
+                                timings=timings)
+
+def analyze_models(dataset: dict, models: list, n_jobs: int = 1, artifacts: str = None,
+                   folds: int = 0, repeats: int = 1, profile: dict = None) -> list:
+    """Analyze a given dataset with several models at the same time.
+
+    Every model is fitted in its own worker process, so the analysis takes about as long as the
+        slowest model instead of the sum of all of them.
+
+    When an artifact directory is given, a model that was already fitted to the same dataset with
+        the same hyperparameters is loaded from its artifact instead of being fitted again, and
+        every newly fitted model is saved there.
+
+    When a fold count is given, every model is also cross-validated, unless its artifact already
+        holds scores for the same folds, and the scores are saved with the artifact.
+
+    Args:
+        dataset (dict): A dictionary that represents the repository dataset to use for analysis.
+        models (list): The list of TSDataModel types to use.
+        n_jobs (int): The number of worker processes to fit models in. Use -1 for one process per
+            CPU core, or 1 to fit the models one after another in this process.
+        artifacts (str): The directory that stores model artifacts, if any.
+        folds (int): The number of cross-validation folds, or 0 to skip cross-validation.
+        repeats (int): The number of times to draw the cross-validation folds.
+        profile (dict): The hyperparameters of each TSDataModel type that replace its defaults, if
+            any.
+
+    Returns:
+        results (list): The TSDataAnalysisResult of every model, in the same order as `models`.
+    """
+    profile = profile or {}
+    results = [None] * len(models)
+    keys = [dataset_key(dataset, x, profile.get(x)) for x in models] if artifacts else []
+    for index, key in enumerate(keys):
+        path = artifact_path(artifacts, models[index], key)
+        if os.path.exists(path):
+            logging.info("Loading saved %s model from %s...", models[index].name.lower(), path)
+            results[index] = TSDataAnalysisResult.load(path)
+
+    missing = [index for index, result in enumerate(results) if result is None]
+    if n_jobs == 1 or len(missing) < 2:
+        fitted = [analyze_dataset(dataset=dataset,
+                                  model=models[index],
+                                  params=profile.get(models[index]))
+                  for index in missing]
+    else:
+        from joblib import Parallel, delayed #pylint:disable=import-outside-toplevel
+        logging.info("Fitting %s models in parallel...", len(missing))
+        fitted = Parallel(n_jobs=min(len(missing), n_jobs) if n_jobs > 0 else n_jobs)(
+            delayed(analyze_dataset)(dataset=dataset,
+                                     model=models[index],
+                                     params=profile.get(models[index]))
+            for index in missing)
+
+    if artifacts and missing:
+        os.makedirs(artifacts, exist_ok=True)
+    for index, result in zip(missing, fitted):
+        results[index] = result
+
+    changed = set(missing)
+    if folds > len(dataset["targets"]):
+        logging.warning("Only %s repositories to cross-validate; using that many folds, not %s.",
+                        len(dataset["targets"]),
+                        folds)
+        folds = len(dataset["targets"])
+    if folds >= 2:
+        unscored = [index for index, result in enumerate(results)
+                    if not result.cross_validation
+                    or (result.cross_validation.folds, result.cross_validation.repeats)
+                    != (folds, repeats)]
+        if unscored:
+            scores = cross_validate_models(dataset,
+                                           [models[index] for index in unscored],
+                                           folds,
+                                           repeats,
+                                           n_jobs,
+                                           profile)
+            for index, score in zip(unscored, scores):
+                results[index].cross_validation = score
+            changed.update(unscored)
+
+    for index in sorted(changed) if artifacts else []:
+        results[index].save(artifact_path(artifacts, models[index], keys[index]), keys[index])
+    return results
@@ -0,0 +1,164 @@
+#
+# Batch Predictions
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""The batch submodule contains the utilities necessary for scoring large files of inputs in
+    bounded memory."""
+import csv
+import itertools
+import json
+import os
+import numpy as np
+from gh_twilight.analysis import TSDataAnalysisResult
+from gh_twilight.features import feature_names, input_features, week_window, TSFeatureError
+
+class TSBatchInputError(Exception):
+    """Could not read the batch input file."""
+
+def _chunks_from_rows(rows, chunk_size: int, width: int):
+    """Group (name, values) pairs into chunks of names and (n, width) arrays."""
+    names, commits = [], []
+    for name, week in rows:
+        if len(week) != width:
+            raise TSBatchInputError("Input %s requires %s values. Got %s instead."
+                                    % (name, width, len(week)))
+        names.append(name)
+        commits.append(week)
+        if len(names) == chunk_size:
+            yield names, np.array(commits, dtype=np.int64)
+            names, commits = [], []
+    if names:
+        yield names, np.array(commits, dtype=np.int64)
+
+def _csv_rows(path: str, names: list):
+    """Read (name, values) pairs from a CSV file.
+
+    Files with a header row that names the feature columns (such as the weekdays of the `--csv`
+        export) are read by column name. Otherwise, every row holds a name followed by one value
+        for every feature, or just the values.
+    """
+    with open(path, "r", newline="") as csv_file:
+        quotechar = "|" if "|" in csv_file.readline() else '"'
+        csv_file.seek(0)
+        reader = csv.reader(csv_file, delimiter=",", quotechar=quotechar)
+        header = next(reader, None)
+        if header is None:
+            return
+        if names[0] in header:
+            missing = [x for x in names if x not in header]
+            if missing:
+                raise TSBatchInputError("Input file has no %s column." % (missing[0]))
+            name_column = header.index("Repository") if "Repository" in header else None
+            columns = [header.index(x) for x in names]
+        else:
+            name_column, columns = None, None
+            reader = itertools.chain([header], reader)
+
+        for index, row in enumerate(reader):
+            if not row:
+                continue
+            if columns:
+                name = row[name_column] if name_column is not None else str(index)
+                yield name, [int(row[x]) for x in columns]
+            elif len(row) == len(names):
+                yield str(index), [int(x) for x in row]
+            else:
+                yield row[0], [int(x) for x in row[1:]]
+
+def _jsonl_rows(path: str, features: str, weeks: int):
+    """Read (name, values) pairs from a JSON Lines file.
+
+    Every line holds either a list of feature values, a configuration input
+        (`{"name": ..., "commits": [...]}`), or a repository exported with `--json`
+        (`{"name": ..., "weeksum": {"week": [...]}}`).
+    """
+    with open(path, "r") as jsonl_file:
+        for index, line in enumerate(jsonl_file):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if isinstance(item, list):
+                yield str(index), item
+                continue
+            if "weeksum" in item:
+                weeksum = item["weeksum"]
+                item = {"name": item.get("name", str(index)),
+                        "commits": weeksum["week"],
+                        "hours": weeksum.get("hours") or [],
+                        "weeks": week_window(weeksum["weeks"], weeks).tolist()
+                                 if weeksum.get("weeks") is not None else []}
+            try:
+                yield item.get("name", str(index)), input_features(item, features, weeks)
+            except TSFeatureError as error:
+                raise TSBatchInputError(str(error)) from error
+
+def iter_input_chunks(path: str, chunk_size: int = 65536, features: str = "weekday",
+                      weeks: int = 0):
+    """Read the inputs of a batch file in chunks.
+
+    CSV (`.csv`), JSON Lines (`.jsonl`), and NumPy (`.npy`) files are supported. NumPy files are
+        memory-mapped, so only one chunk of rows is in memory at a time for every format.
+
+    Args:
+        path (str): The path of the input file.
+        chunk_size (int): The maximum number of rows per chunk.
+        features (str): The feature set the models were trained with, which is one of
+            `FEATURE_SETS`. Defaults to "weekday".
+        weeks (int): The number of latest ISO weeks added after the feature set. Defaults to 0.
+
+    Yields:
+        chunk (tuple): A tuple containing the list of input names and an array of shape (n, m)
+            with the values of their m features.
+    """
+    try:
+        names = feature_names(features, weeks)
+    except TSFeatureError as error:
+        raise TSBatchInputError(str(error)) from error
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        matrix = np.load(path, mmap_mode="r")
+        if matrix.ndim != 2 or matrix.shape[1] != len(names):
+            raise TSBatchInputError("Input array requires shape (n, %s). Got %s instead."
+                                    % (len(names), matrix.shape))
+        for start in range(0, matrix.shape[0], chunk_size):
+            stop = min(start + chunk_size, matrix.shape[0])
+            yield [str(x) for x in range(start, stop)], np.asarray(matrix[start:stop])
+    elif extension == ".csv":
+        yield from _chunks_from_rows(_csv_rows(path, names), chunk_size, len(names))
+    elif extension in [".jsonl", ".ndjson"]:
+        yield from _chunks_from_rows(_jsonl_rows(path, features, weeks), chunk_size, len(names))
+    else:
+        raise TSBatchInputError("Unsupported input file type: %s." % (extension))
+
+def predict_file(result: TSDataAnalysisResult, path: str, output: str,
+                 chunk_size: int = 65536, **kwargs) -> int:
+    """Predict the total commit counts of every input in a file and stream them to a CSV file.
+
+    Args:
+        result (TSDataAnalysisResult): The analysis result whose model makes the predictions.
+        path (str): The path of the input file.
+        output (str): The path of the CSV file to write the predictions to.
+        chunk_size (int): The maximum number of rows to predict with one call to the model.
+        **kwargs: Arbitrary keyword arguments.
+
+    Kwargs:
+        features (str): The feature set the models were trained with. Defaults to "weekday".
+        weeks (int): The number of latest ISO weeks added after the feature set. Defaults to 0.
+
+    Returns:
+        count (int): The number of inputs that were predicted.
+    """
+    count = 0
+    with open(output, "w+", newline="") as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(["Repository", "Predicted Total Commits"])
+        for names, commits in iter_input_chunks(path, chunk_size, kwargs.get("features", "weekday"),
+                                                kwargs.get("weeks", 0)):
+            writer.writerows(zip(names, result.predict_many(commits).tolist()))
+            count += len(names)
+    return count
@@ -0,0 +1,269 @@
+#
+# Weeksum Cache
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""The cache submodule contains the on-disk caches used to refresh repository data incrementally
+    and to revalidate GitHub responses instead of downloading them again."""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from gh_twilight.repo import GHRepositoryWeeksum
+
+class GHWeeksumCacheEntry:
+    """A cached repository weeksum and the newest commit it has counted.
+
+    Attributes:
+        weeksum (GHRepositoryWeeksum): The cached repository data.
+        sha (str): The SHA of the newest commit counted in the weeksum.
+        timestamp (datetime.datetime): The commit date (in UTC) of the newest commit counted.
+        seen (list): The SHAs of every counted commit that shares the newest commit date.
+    """
+
+    def __init__(self, weeksum: GHRepositoryWeeksum, sha: str, timestamp: datetime.datetime,
+                 seen: list = None):
+        """Create a cache entry.
+
+        Args:
+            weeksum (GHRepositoryWeeksum): The repository data to cache.
+            sha (str): The SHA of the newest commit counted in the weeksum.
+            timestamp (datetime.datetime): The commit date (in UTC) of the newest commit counted.
+            seen (list): The SHAs of every counted commit that shares the newest commit date.
+        """
+        self.weeksum = weeksum
+        self.sha = sha
+        self.timestamp = timestamp
+        self.seen = seen if seen is not None else [sha]
+
+class GHWeeksumCache:
+    """An on-disk cache of repository weeksums keyed by repository and author filter.
+
+    Every entry is stored as its own JSON file in the cache directory, so repositories collected
+        on different threads never write to the same file.
+
+    Attributes:
+        path (str): The directory that stores the cache entries.
+    """
+
+    def __init__(self, path: str):
+        """Open (and create, if needed) a weeksum cache.
+
+        Args:
+            path (str): The directory that stores the cache entries.
+        """
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _entry_path(self, repository: str, author: str) -> str:
+        key = hashlib.sha1(json.dumps([repository, author]).encode("utf-8")).hexdigest()
+        return os.path.join(self.path, "%s.json" % (key))
+
+    def get(self, repository: str, author: str) -> Optional[GHWeeksumCacheEntry]:
+        """Get the cached data for a repository.
+
+        Args:
+            repository (str): The name of the repository.
+            author (str): The author filter the data was collected with.
+
+        Returns:
+            entry (GHWeeksumCacheEntry): The cached data, or None if nothing usable is cached.
+        """
+        try:
+            with open(self._entry_path(repository, author), "r") as cache_reader:
+                entry = json.load(cache_reader)
+            return GHWeeksumCacheEntry(GHRepositoryWeeksum.from_dict(entry["data"]),
+                                       entry["sha"],
+                                       datetime.datetime.strptime(entry["timestamp"],
+                                                                  "%Y-%m-%dT%H:%M:%S"),
+                                       entry["seen"])
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError) as err:
+            logging.warning("Ignoring corrupted cache entry for %s: %s", repository, err)
+            return None
+
+    def put(self, repository: str, author: str, entry: GHWeeksumCacheEntry):
+        """Store the data for a repository in the cache.
+
+        Args:
+            repository (str): The name of the repository.
+            author (str): The author filter the data was collected with.
+            entry (GHWeeksumCacheEntry): The data to store.
+        """
+        path = self._entry_path(repository, author)
+        with open(path + ".tmp", "w+") as cache_writer:
+            json.dump({
+                "repository": repository,
+                "author": author,
+                "sha": entry.sha,
+                "timestamp": entry.timestamp.strftime("%Y-%m-%dT%H:%M:%S"),
+                "seen": entry.seen,
+                "data": entry.weeksum.to_dict()
+            }, cache_writer)
+        os.replace(path + ".tmp", path)
+
+class GHResponseCache:
+    """A persistent cache of GitHub API responses that are revalidated with conditional requests.
+
+    Every GET request made by an installed client is sent with the `ETag` (as `If-None-Match`) or
+        `Last-Modified` (as `If-Modified-Since`) of its cached response, if any. GitHub answers
+        with `304 Not Modified` when nothing changed, which does not count against the rate limit,
+        and the cached response is served instead. Responses are stored in a single SQLite file,
+        and the least recently used ones are evicted once the cache grows past its size limit.
+
+    Attributes:
+        path (str): The path to the SQLite file that stores the responses.
+        max_size (int): The number of bytes of response bodies to keep before evicting.
+        hits (int): The number of responses served from the cache after a 304.
+        misses (int): The number of responses downloaded and stored in the cache.
+    """
+
+    def __init__(self, path: str, max_size: int = 256 * 1024 * 1024):
+        """Open (and create, if needed) a response cache.
+
+        Args:
+            path (str): The path to the SQLite file that stores the responses.
+            max_size (int): The number of bytes of response bodies to keep before evicting the
+                least recently used responses. Defaults to 256 MiB.
+        """
+        self.path = path
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._database = sqlite3.connect(path, check_same_thread=False)
+        with self._database:
+            self._database.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, "
+                                   "url TEXT, headers TEXT, body TEXT, size INTEGER, used REAL)")
+            self._database.execute("CREATE INDEX IF NOT EXISTS responses_used "
+                                   "ON responses (used)")
+
+    @staticmethod
+    def _key(url: str, parameters: dict, headers: dict) -> str:
+        return hashlib.sha256(json.dumps([url, parameters or {}, headers or {}], sort_keys=True,
+                                         default=str).encode("utf-8")).hexdigest()
+
+    def get(self, url: str, parameters: dict = None, headers: dict = None) -> Optional[tuple]:
+        """Get the cached response of a GET request.
+
+        Args:
+            url (str): The URL of the request.
+            parameters (dict): The query parameters of the request, if any.
+            headers (dict): The request headers, if any.
+
+        Returns:
+            response (tuple): The response headers and parsed JSON body, or None if the request is
+                not cached.
+        """
+        with self._lock:
+            row = self._database.execute("SELECT headers, body FROM responses WHERE key = ?",
+                                         (self._key(url, parameters, headers),)).fetchone()
+        return (json.loads(row[0]), json.loads(row[1])) if row else None
+
+    def put(self, url: str, parameters: dict, headers: dict, response: tuple):
+        """Store the response of a GET request, evicting the least recently used responses if the
+            cache grows past its size limit.
+
+        Args:
+            url (str): The URL of the request.
+            parameters (dict): The query parameters of the request, if any.
+            headers (dict): The request headers, if any.
+            response (tuple): The response headers and parsed JSON body.
+        """
+        body = json.dumps(response[1])
+        with self._lock, self._database:
+            self._database.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                                   (self._key(url, parameters, headers),
+                                    url,
+                                    json.dumps(dict(response[0])),
+                                    body,
+                                    len(body),
+                                    time.time()))
+            self.misses += 1
+            total = self._database.execute("SELECT SUM(size) FROM responses").fetchone()[0]
+            if total > self.max_size:
+                evicted = []
+                for key, size in self._database.execute("SELECT key, size FROM responses "
+                                                        "ORDER BY used"):
+                    if total <= self.max_size:
+                        break
+                    evicted.append((key,))
+                    total -= size
+                self._database.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def _touch(self, url: str, parameters: dict, headers: dict):
+        """Mark a cached response as the most recently used one after it was served."""
+        with self._lock, self._database:
+            self._database.execute("UPDATE responses SET used = ? WHERE key = ?",
+                                   (time.time(), self._key(url, parameters, headers)))
+            self.hits += 1
+
+    def size(self) -> int:
+        """Get the number of bytes of response bodies in the cache.
+
+        Returns:
+            size (int): The total size of every cached response body.
+        """
+        with self._lock:
+            return self._database.execute("SELECT COALESCE(SUM(size), 0) FROM responses") \
+                .fetchone()[0]
+
+    def install(self, client):
+        """Send the GET requests of a PyGithub client through the cache.
+
+        Args:
+            client (Github): The client to install the cache on. Every object it creates shares
+                its requester, so their requests go through the cache as well.
+        """
+        requester = getattr(client, "requester", None) \
+            or client._Github__requester #pylint:disable=protected-access
+        request, request_json = requester.requestJsonAndCheck, requester.requestJson
+        # requestJsonAndCheck drops the status, so the last one of each thread is kept here.
+        status = threading.local()
+
+        def status_request(*args, **kwargs):
+            response = request_json(*args, **kwargs)
+            status.code = response[0]
+            return response
+
+        def cached_request(verb, url, parameters=None, headers=None, input=None, **kwargs):
+            #pylint:disable=redefined-builtin
+            if verb != "GET" or input is not None:
+                return request(verb, url, parameters, headers, input, **kwargs)
+            cached = self.get(url, parameters, headers)
+            conditions = dict(headers or {})
+            if cached:
+                cached_headers = {x.lower(): y for x, y in cached[0].items()}
+                if "etag" in cached_headers:
+                    conditions["If-None-Match"] = cached_headers["etag"]
+                if "last-modified" in cached_headers:
+                    conditions["If-Modified-Since"] = cached_headers["last-modified"]
+            status.code = None
+            response = request(verb, url, parameters, conditions or headers, input, **kwargs)
+            if cached and status.code == 304:
+                self._touch(url, parameters, headers)
+                return dict(cached[0], **response[0]), cached[1]
+            if response[1] is not None and {x.lower() for x in response[0]} \
+                    & {"etag", "last-modified"}:
+                self.put(url, parameters, headers, response)
+            return response
+
+        requester.requestJson = status_request
+        requester.requestJsonAndCheck = cached_request
+
+    def close(self):
+        """Close the SQLite file of the cache."""
+        with self._lock:
+            self._database.close()
@@ -11,15 +11,31 @@
 """The main module contains the utilities necessary to handle the command-line logic for the
     tool."""
 import csv
+import datetime
 import sys
 import logging
 import json
+import textwrap
 from argparse import ArgumentParser
-from random import shuffle
-from gh_twilight.data import GithubMLDataCollector
-from gh_twilight.repo import GHRepositoryWeeksum
+from typing import Union
+import numpy as np
+from gh_twilight.batch import predict_file, TSBatchInputError
+from gh_twilight.cache import GHResponseCache, GHWeeksumCache
+from gh_twilight.data import GithubMLDataCollector, GHCollectorBackend
+from gh_twilight.features import input_features, TSFeatureError
+from gh_twilight.replay import GHReplayError, GHResponseRecorder, GHStubServer, load_fixture
+from gh_twilight.report import TSRunReport
+from gh_twilight.search import search_model, save_profile, TSSearchError
+from gh_twilight.server import serve, TSModelRegistry
+from gh_twilight.store import GHWeeksumStore, GHWeeksumStoreError
 from gh_twilight.sparkle import TSConfiguration, TSConfigurationError, create_sparkle_data
-from gh_twilight.analysis import create_dataset, analyze_dataset, TSDataAnalysisResult
+from gh_twilight.analysis import create_dataset, analyze_models, load_latest_result, \
+    select_result, update_models, TSDataAnalysisError, TSDataAnalysisResult, \
+    TSDatasetGenerateError
+
+def _date_argument(value: str) -> datetime.datetime:
+    """Parse a YYYY-MM-DD command line argument as a datetime in UTC."""
+    return datetime.datetime.strptime(value, "%Y-%m-%d")
 
 def sparkle_args() -> ArgumentParser:
     """Create the argument parser for Twilight."""
@@ -27,6 +43,47 @@ def sparkle_args() -> ArgumentParser:
     sarg.add_argument("--config",
                       nargs=1,
                       help="The path to the configuration file to read from.")
+    sarg.add_argument("--from-dataset",
+                      nargs=1,
+                      help="Train on a previously exported dataset file instead of collecting one.")
+    sarg.add_argument("--workers",
+                      nargs=1,
+                      type=int,
+                      help="The number of repositories to collect from GitHub at the same time.")
+    sarg.add_argument("--backend",
+                      nargs=1,
+                      choices=[x.name.lower() for x in GHCollectorBackend],
+                      help="The source to build repository data from.")
+    sarg.add_argument("--mirror-root",
+                      nargs=1,
+                      help="The directory that contains local clones for the local backend.")
+    sarg.add_argument("--cache-dir",
+                      nargs=1,
+                      help="The directory used to cache repository data between runs.")
+    sarg.add_argument("--http-cache",
+                      nargs=1,
+                      help="The SQLite file used to cache and revalidate GitHub responses.")
+    sarg.add_argument("--no-cache",
+                      action="store_true",
+                      help="Collect all repository data from GitHub without using the caches.")
+    sarg.add_argument("--record",
+                      nargs=1,
+                      help="The JSON fixture file to record every GitHub response to.")
+    sarg.add_argument("--replay",
+                      nargs=1,
+                      help="Collect from a recorded fixture file instead of GitHub.")
+    sarg.add_argument("--page-budget",
+                      nargs=1,
+                      type=int,
+                      help="The maximum number of pages of commits to read per repository.")
+    sarg.add_argument("--since",
+                      nargs=1,
+                      type=_date_argument,
+                      help="Only count commits made on or after this date (YYYY-MM-DD).")
+    sarg.add_argument("--until",
+                      nargs=1,
+                      type=_date_argument,
+                      help="Only count commits made before this date (YYYY-MM-DD).")
     sarg.add_argument("--log-file",
                       nargs=1,
                       help="The path to where a log file should be created.")
@@ -36,22 +93,70 @@ def sparkle_args() -> ArgumentParser:
     sarg.add_argument("--json",
                       action="store_true",
                       help="Create a JSON file that contains the dataset.")
+    sarg.add_argument("--npz",
+                      action="store_true",
+                      help="Create a NumPy .npz file that contains the dataset.")
+    sarg.add_argument("--parquet",
+                      action="store_true",
+                      help="Create a Parquet file that contains the dataset (requires pyarrow).")
+    sarg.add_argument("--jobs",
+                      nargs=1,
+                      type=int,
+                      help="The number of worker processes to fit models in (-1 for every core).")
+    sarg.add_argument("--folds",
+                      nargs=1,
+                      type=int,
+                      help="The number of cross-validation folds to score models with (0 to skip).")
+    sarg.add_argument("--search",
+                      action="store_true",
+                      help="Search the model hyperparameters and save the best ones as a profile.")
     sarg.add_argument("--plot",
                       action="store_true",
                       help="Generate plot graphs from the analysis.")
     sarg.add_argument("--predict",
                       action="store_true",
                       help="Predict the project size for the given inputs in the config file.")
+    sarg.add_argument("--predict-file",
+                      nargs=1,
+                      help="A CSV, JSON Lines, or .npy file of weeksums to predict values for.")
+    sarg.add_argument("--predict-output",
+                      nargs=1,
+                      help="The CSV file to write the predictions for --predict-file to.")
+    sarg.add_argument("--predict-only",
+                      action="store_true",
+                      help="Predict with the latest saved models without collecting or training.")
+    sarg.add_argument("--update",
+                      action="store_true",
+                      help="Update the latest saved models with repositories they have not seen.")
+    sarg.add_argument("--serve",
+                      action="store_true",
+                      help="Serve predictions over HTTP with the latest saved models.")
+    sarg.add_argument("--host",
+                      nargs=1,
+                      help="The host the prediction server listens on.")
+    sarg.add_argument("--port",
+                      nargs=1,
+                      type=int,
+                      help="The port the prediction server listens on.")
+    sarg.add_argument("--artifacts",
+                      nargs=1,
+                      help="The directory that stores fitted models between runs.")
+    sarg.add_argument("--report",
+                      nargs=1,
+                      help="The JSON file to write the time taken by every stage of the run to.")
+    sarg.add_argument("--profile",
+                      nargs=1,
+                      help="The directory to write a cProfile profile of every run stage to.")
     sarg.add_argument("--generate",
                       action="store_true",
                       help="Generate a new Sparkle configuration.")
     return sarg
 
-def generate_csv(raw_dataset: list):
+def generate_csv(raw_dataset: Union[list, GHWeeksumStore]):
     """Write a CSV file containing the raw dataset information.
 
     Args:
-        raw_dataset (list): The list containing the repository information.
+        raw_dataset (Union[list, GHWeeksumStore]): The repository information.
     """
     with open("dataset.csv", "w+") as csv_file_writer:
         csv_data_writer = csv.writer(csv_file_writer,
@@ -72,21 +177,202 @@ def generate_csv(raw_dataset: list):
             "Saturday"
         ])
 
-        data: GHRepositoryWeeksum
+        if isinstance(raw_dataset, GHWeeksumStore):
+            rows = zip(raw_dataset.names,
+                       raw_dataset.authors,
+                       raw_dataset.abstotals.tolist(),
+                       raw_dataset.totals.tolist(),
+                       raw_dataset.days.tolist())
+        else:
+            rows = ((x.name, x.author, x.abstotal, x.total, x.weeksum.to_list())
+                    for x in raw_dataset)
+        csv_data_writer.writerows([name, author, abstotal, total] + days
+                                  for name, author, abstotal, total, days in rows)
+
+def generate_json(raw_dataset: Union[list, GHWeeksumStore]):
+    """Write a JSON file containing the raw dataset information.
+
+    The repositories are written one at a time instead of building the whole document in memory
+        first.
+
+    Args:
+        raw_dataset (Union[list, GHWeeksumStore]): The repository information.
+    """
+    with open("dataset.json", "w+") as json_file:
+        separator = "[\n"
         for data in raw_dataset:
-            csv_data_writer.writerow([
-                data.name,
-                data.author,
-                data.abstotal,
-                data.total,
-                data.weeksum.sunday(),
-                data.weeksum.monday(),
-                data.weeksum.tuesday(),
-                data.weeksum.wednesday(),
-                data.weeksum.thursday(),
-                data.weeksum.friday(),
-                data.weeksum.saturday()
-            ])
+            json_file.write(separator)
+            json_file.write(textwrap.indent(json.dumps(data.to_dict(), indent=4), "    "))
+            separator = ",\n"
+        json_file.write("\n]" if separator != "[\n" else "[]")
+
+def collect_dataset(options, config: TSConfiguration, stage: dict = None) -> GHWeeksumStore:
+    """Collect the repository data for every repository listed in the configuration.
+
+    Args:
+        options (Namespace): The parsed command line arguments.
+        config (TSConfiguration): The Sparkle configuration.
+        stage (dict): The run report stage to record the time and requests of every repository
+            fetch in, if any.
+
+    Returns:
+        raw_dataset (GHWeeksumStore): The collected repository data, or None if the fixture to
+            replay could not be read.
+    """
+    stub = None
+    if options.replay:
+        try:
+            stub = GHStubServer(responses=load_fixture(options.replay[0]))
+        except GHReplayError as err:
+            logging.error("Fixture failed to load: %s", err)
+            return None
+        stub.start()
+    recorder = GHResponseRecorder(options.record[0]) if options.record else None
+    cache_dir = options.cache_dir[0] if options.cache_dir else config.cache_dir
+    cache = GHWeeksumCache(cache_dir) if cache_dir and not options.no_cache else None
+    http_cache = options.http_cache[0] if options.http_cache else config.http_cache
+    http_cache = GHResponseCache(http_cache, config.http_cache_size * 1024 * 1024) \
+        if http_cache and not options.no_cache else None
+    backend = GHCollectorBackend[options.backend[0].upper()] if options.backend else config.backend
+    gh_collector = GithubMLDataCollector(config.get_tokens(),
+                                         cache=cache,
+                                         http_cache=http_cache,
+                                         recorder=recorder,
+                                         base_url=stub.base_url if stub else "",
+                                         backend=backend,
+                                         mirror_root=options.mirror_root[0] if options.mirror_root
+                                         else config.mirror_root,
+                                         graphql_url=stub.graphql_url if stub
+                                         else config.graphql_url,
+                                         batch_size=config.batch_size)
+    workers = options.workers[0] if options.workers else config.workers
+
+    if not config.study_repos:
+        logging.log(logging.WARN, "Repository list is empty.")
+
+    print("🌎 Collecting data from %s..." % ("the replayed fixture" if stub else "GitHub"))
+    try:
+        raw_dataset = GHWeeksumStore.from_weeksums(gh_collector.get_weeksums(
+            config.study_repos,
+            workers=workers,
+            by_author=config.git_name,
+            aliases=config.git_aliases,
+            page_budget=options.page_budget[0] if options.page_budget else config.page_budget,
+            since=options.since[0] if options.since else config.since,
+            until=options.until[0] if options.until else config.until,
+            hourly=config.features == "hour_of_week",
+            weekly=config.weeks > 0))
+    finally:
+        if stub:
+            stub.stop()
+        if recorder:
+            recorder.save()
+            logging.info("Recorded %s responses to %s.", len(recorder.responses), recorder.path)
+    if stage is not None:
+        stage["requests"] = round(sum(x["requests"] for x in gh_collector.fetches))
+        stage["bytes"] = round(sum(x["bytes"] for x in gh_collector.fetches))
+        stage["not_modified"] = sum(x["not_modified"] for x in gh_collector.fetches)
+        stage["repositories"] = gh_collector.fetches
+    if http_cache:
+        logging.info("Revalidated %s cached responses and stored %s new ones.",
+                     http_cache.hits,
+                     http_cache.misses)
+        if stage is not None:
+            stage["http_cache"] = {"hits": http_cache.hits, "misses": http_cache.misses}
+        http_cache.close()
+    print("Collected data for %s of %s repositories." % (len(raw_dataset),
+                                                         len(config.study_repos)))
+    if not raw_dataset.exact.all():
+        print("%s repositories were sampled instead of read in full."
+              % (len(raw_dataset) - raw_dataset.exact.sum()))
+    return raw_dataset
+
+def read_dataset(path: str) -> GHWeeksumStore:
+    """Read the repository data from a previously exported dataset file.
+
+    Args:
+        path (str): The path to a dataset file exported with `--csv`, `--json`, `--npz`, or
+            `--parquet`, or a JSON Lines file with one exported repository per line.
+
+    Returns:
+        raw_dataset (GHWeeksumStore): The repository data, or None if the file could not be read.
+    """
+    print("📂 Reading dataset from %s..." % (path))
+    try:
+        raw_dataset = GHWeeksumStore.load(path)
+    except (GHWeeksumStoreError, OSError, ValueError) as err:
+        logging.error("Dataset failed to load: %s", err)
+        return None
+    print("Read data for %s repositories." % (len(raw_dataset)))
+    return raw_dataset
+
+def search_profile(config: TSConfiguration, dataset: dict, n_jobs: int):
+    """Search the hyperparameters of every model with a search space and save the best ones.
+
+    The best hyperparameters replace those of the same models in the configuration's profile, and
+        the profile is written to the profile path of the configuration, or sparkle_profile.toml.
+
+    Args:
+        config (TSConfiguration): The Sparkle configuration.
+        dataset (dict): A dictionary that represents the repository dataset to search with.
+        n_jobs (int): The number of worker processes to score candidates in.
+    """
+    print("🎛  Searching hyperparameters...")
+    for model, space in config.search_spaces.items():
+        params, score = search_model(dataset,
+                                     model,
+                                     space,
+                                     method=config.search_method,
+                                     budget=config.search_budget,
+                                     factor=config.search_factor,
+                                     folds=config.folds if config.folds >= 2 else 5,
+                                     n_jobs=n_jobs,
+                                     cache_dir=config.search_cache_dir)
+        print("✨ Best %s hyperparameters: %s (mean R2 score of %s)."
+              % (model.name.lower(), params, round(score, 4)))
+        config.profile[model] = params
+    path = config.profile_path or "sparkle_profile.toml"
+    save_profile(path, config.profile)
+    logging.info("Hyperparameter profile saved to %s.", path)
+
+def make_predictions(config: TSConfiguration, analyses: list, options=None):
+    """Predict the total commit counts of the inputs in the configuration and the input file.
+
+    Args:
+        config (TSConfiguration): The Sparkle configuration.
+        analyses (list): The TSDataAnalysisResult of every model to choose from.
+        options (Namespace): The parsed command line arguments, if any.
+    """
+    print("📖 Making predictions...")
+    logging.info("Predicting values in config...")
+    model = select_result(analyses, config.prediction_method)
+
+    if config.inputs:
+        try:
+            values = [input_features(x, config.features, config.weeks) for x in config.inputs]
+        except TSFeatureError as err:
+            logging.error("Failed to predict values in config: %s", err)
+            return
+        counts = model.predict_many(np.array(values))
+        pred_input: dict
+        for pred_input, value, count in zip(config.inputs, values, counts):
+            logging.info("Predicted value of %s for %s with features %s.",
+                         count,
+                         pred_input["name"],
+                         value)
+            print("Predicted that %s will have %s commits in total."
+                  % (pred_input["name"], int(count)))
+
+    if options and options.predict_file:
+        output = options.predict_output[0] if options.predict_output else "predictions.csv"
+        logging.info("Predicting values in %s...", options.predict_file[0])
+        try:
+            count = predict_file(model, options.predict_file[0], output,
+                                 features=config.features, weeks=config.weeks)
+        except (TSBatchInputError, OSError, ValueError) as err:
+            logging.error("Failed to predict values in input file: %s", err)
+            return
+        print("Wrote predictions for %s inputs to %s." % (count, output))
 
 def main(**kwargs):
     """Run the main program.
@@ -122,10 +408,26 @@ def main(**kwargs):
         sparkle_args().print_help()
         return
 
+    report = TSRunReport(options.profile[0] if options.profile else "")
+    try:
+        run(options, report)
+    finally:
+        if options.report:
+            report.save(options.report[0])
+            logging.info("Run report saved to %s.", options.report[0])
+
+def run(options, report: TSRunReport):
+    """Run the stages of the program that were requested on the command line.
+
+    Args:
+        options (Namespace): The parsed command line arguments.
+        report (TSRunReport): The run report to record every stage in.
+    """
     # Load the configuration file and create the GitHub data collector.
     print("🛠  Reading configuration...")
     try:
-        config = TSConfiguration(options.config[0])
+        with report.stage("config"):
+            config = TSConfiguration(options.config[0])
     except TSConfigurationError as err:
         logging.error("Configuration failed to load: %s", err)
         return
@@ -133,62 +435,151 @@ def main(**kwargs):
     if "config" not in vars():
         return
 
-    gh_collector = GithubMLDataCollector(config.get_token())
-    raw_dataset = []
+    artifacts = options.artifacts[0] if options.artifacts else config.artifacts
 
-    if not config.study_repos:
-        logging.log(logging.WARN, "Repository list is empty.")
+    # If predictions are served or only predictions are requested, use the latest saved models
+    # instead of collecting data and training new models.
+    if (options.serve or options.predict_only or options.update) and not artifacts:
+        logging.error("Predicting without training requires an artifact directory.")
+        return
+
+    if options.serve:
+        try:
+            registry = TSModelRegistry(artifacts, config.models, config.prediction_method)
+        except (TSDataAnalysisError, OSError) as err:
+            logging.error("Saved models failed to load: %s", err)
+            return
+        serve(registry,
+              host=options.host[0] if options.host else "127.0.0.1",
+              port=options.port[0] if options.port else 8642,
+              features=config.features,
+              weeks=config.weeks)
+        return
+
+    if options.predict_only or options.update:
+        print("📦 Loading saved models...")
+        try:
+            with report.stage("load_models"):
+                analyses = [load_latest_result(artifacts, model) for model in config.models]
+        except (TSDataAnalysisError, OSError) as err:
+            logging.error("Saved models failed to load: %s", err)
+            return
+
+    if options.predict_only:
+        with report.stage("predict"):
+            make_predictions(config, analyses, options)
+        return
+
+    if options.update:
+        # Only collect the repositories that at least one of the models was not trained on.
+        if options.from_dataset:
+            with report.stage("read_dataset", path=options.from_dataset[0]):
+                raw_dataset = read_dataset(options.from_dataset[0])
+            if raw_dataset is None:
+                return
+        else:
+            seen = [set(x.__dict__.get("labels", [])) for x in analyses]
+            config.study_repos = [x for x in config.study_repos if not all(x in y for y in seen)]
+            with report.stage("collect") as stage:
+                raw_dataset = collect_dataset(options, config, stage) if config.study_repos \
+                    else GHWeeksumStore()
+            if raw_dataset is None:
+                return
+        if len(raw_dataset):
+            print("🔁 Updating models with new repositories...")
+        with report.stage("update", repositories=len(raw_dataset)):
+            try:
+                updated = update_models(create_dataset(raw_dataset, config.features, config.weeks),
+                                        analyses,
+                                        artifacts)
+            except TSDatasetGenerateError as err:
+                logging.error("Models failed to update: %s", err)
+                return
+        if not updated:
+            print("Every repository has already been used to train the saved models.")
+        if options.predict or options.predict_file:
+            with report.stage("predict"):
+                make_predictions(config, analyses, options)
+        return
 
-    # Collect the repository data for every repository listed in the config.
-    print("🌎 Collecting data from GitHub...")
-    shuffle(config.study_repos)
-    for repo in config.study_repos:
-        raw_dataset.append(gh_collector.get_weeksum(repo, by_author=config.git_name))
-    print("Collected data for %s repositories." % (len(config.study_repos)))
+    # Collect the repository data for every repository listed in the config, or read it from a
+    # previously exported dataset.
+    if options.from_dataset:
+        with report.stage("read_dataset", path=options.from_dataset[0]):
+            raw_dataset = read_dataset(options.from_dataset[0])
+        if raw_dataset is None:
+            return
+    else:
+        with report.stage("collect") as stage:
+            raw_dataset = collect_dataset(options, config, stage)
+        if raw_dataset is None:
+            return
 
-    if options.json or options.csv:
+    if options.json or options.csv or options.npz or options.parquet:
         print("📥 Exporting raw dataset...")
 
-    # Write a JSON file containing the raw data if requested.
-    if options.json:
-        logging.info("Writing JSON dataset to dataset.json...")
-        with open("dataset.json", "w+") as json_file:
-            json_file.write(json.dumps([x.to_dict() for x in raw_dataset], indent=4))
+    with report.stage("export") as stage:
+        stage["files"] = []
+
+        # Write a JSON file containing the raw data if requested.
+        if options.json:
+            logging.info("Writing JSON dataset to dataset.json...")
+            generate_json(raw_dataset)
+            stage["files"].append("dataset.json")
+
+        # Write a CSV file containing the raw data if requested.
+        if options.csv:
+            logging.info("Writing CSV dataset to results.csv...")
+            generate_csv(raw_dataset)
+            stage["files"].append("dataset.csv")
 
-    # Write a CSV file containing the raw data if requested.
-    if options.csv:
-        logging.info("Writing CSV dataset to results.csv...")
-        generate_csv(raw_dataset)
+        # Write columnar files containing the raw data if requested.
+        for export, path in [(options.npz, "dataset.npz"), (options.parquet, "dataset.parquet")]:
+            if export:
+                logging.info("Writing columnar dataset to %s...", path)
+                try:
+                    raw_dataset.save(path)
+                    stage["files"].append(path)
+                except (GHWeeksumStoreError, OSError) as err:
+                    logging.error("Dataset failed to export: %s", err)
 
     # Create the dataset from the raw repository data.
-    true_dataset = create_dataset(raw_dataset)
+    with report.stage("dataset", repositories=len(raw_dataset)):
+        try:
+            true_dataset = create_dataset(raw_dataset, config.features, config.weeks)
+        except TSDatasetGenerateError as err:
+            logging.error("Dataset failed to generate: %s", err)
+            return
+    n_jobs = options.jobs[0] if options.jobs else config.n_jobs
+
+    # Search the hyperparameters of the models if requested, and fit with the best ones found.
+    if options.search:
+        if not config.search_spaces:
+            logging.error("Searching hyperparameters requires a search section in the config.")
+            return
+        try:
+            with report.stage("search", method=config.search_method):
+                search_profile(config, true_dataset, n_jobs)
+        except (TSSearchError, TSDataAnalysisError, OSError) as err:
+            logging.error("Hyperparameter search failed: %s", err)
+            return
 
     print("🔍 Preparing network models...")
     logging.info("Running analysis on dataset...")
-    analyses = [analyze_dataset(dataset=true_dataset, model=model) for model in config.models]
+    with report.stage("analyze", jobs=n_jobs) as stage:
+        analyses = analyze_models(true_dataset,
+                                  config.models,
+                                  n_jobs=n_jobs,
+                                  artifacts=artifacts,
+                                  folds=options.folds[0] if options.folds else config.folds,
+                                  repeats=config.repeats,
+                                  profile=config.profile)
+        stage["models"] = [dict(model=x.model_type.name.lower(), **x.timings) for x in analyses]
 
     # If predictions are enabled, run the predictions on the inputs in the config.
-    if options.predict:
-        print("📖 Making predictions...")
-        logging.info("Predicting values in config...")
-        sort_by_accuracy = lambda a: a.get_accuracy()
-        matches_method = lambda x: x.model_type.name.lower() == config.prediction_method
-
-        if config.prediction_method == "best":
-            model = max(analyses, key=sort_by_accuracy)
-            logging.info("Determined that %s is best model.", model.model_type.name.lower())
-        else:
-            model = [x for x in analyses if matches_method(x)][0]
-
-        pred_input: dict
-        for pred_input in config.inputs:
-            logging.info("Predicting commit count for %s with weeksum %s...",
-                         pred_input["name"],
-                         pred_input["commits"])
-            count = model.predict(pred_input["commits"])
-            logging.info("Predicted value of %s.", count)
-            print("Predicted that %s will have %s commits in total."
-                  % (pred_input["name"], int(count)))
+    if options.predict or options.predict_file:
+        with report.stage("predict"):
+            make_predictions(config, analyses, options)
 
     # Create plot images if plot is passed as an argument.
     if options.plot:
@@ -197,7 +588,8 @@ def main(**kwargs):
             logging.info("Creating a plot for results using %s model.",
                          result.model_type.name.lower())
             try:
-                result.plot()
+                with report.stage("plot", model=result.model_type.name.lower()):
+                    result.plot()
                 logging.info("Plot saved to sparkle_analytics_%s.png.", result.model_type.name)
             except Exception as err:    #pylint:disable=broad-except
                 logging.error("Failed to plot data: %s", err)
@@ -11,6 +11,8 @@
 class GHCommitWeek:
     """The class representation of a week's worth commits in Github."""
 
+    __slots__ = ("_days",)
+
     def __init__(self, days):
         """Construct a commit week.
 
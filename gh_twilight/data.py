@@ -8,61 +8,680 @@
 # file, You can obtain one at https://mozilla.org/MPL/2.0/.
 #
 """The data submodule contains the utilities and classes needed to gather data from GitHub."""
+from __future__ import annotations
+import calendar
 import datetime
 import logging
-from github import Github, Repository, PaginatedList
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from enum import IntEnum
+from typing import Union, TYPE_CHECKING
+import numpy as np
+from gh_twilight.cache import GHWeeksumCacheEntry
+from gh_twilight.features import bin_timestamps, merge_weeks
+from gh_twilight.graphql import GRAPHQL_URL, history_columns, history_query, reset_time, \
+    run_query
+from gh_twilight.ratelimit import GHTokenPool
 from gh_twilight.repo import GHRepositoryWeeksum
 
+if TYPE_CHECKING:
+    from github.PaginatedList import PaginatedList
+    from github.Repository import Repository
+
+def _utc(date: datetime.datetime) -> datetime.datetime:
+    """Convert a commit date to a naive datetime in UTC."""
+    if date.tzinfo is not None:
+        date = date.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return date
+
+def _api_date(date: datetime.datetime) -> str:
+    """Format a datetime as a timestamp parameter of the GitHub API."""
+    return _utc(date).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def _commit_columns(page: list) -> tuple:
+    """Get the SHAs, committer names, and commit times of a page of commits.
+
+    The page is read as the JSON list returned by the GitHub API, so no PyGithub Commit objects are
+        built for it.
+
+    Args:
+        page (list): The commits of the page, as dictionaries parsed from the API response.
+
+    Returns:
+        columns (tuple): A list of commit SHAs, an array of committer names, and an int64 array of
+            commit times as Unix timestamps (in UTC).
+    """
+    shas = [x["sha"] for x in page]
+    committers = [x["commit"]["committer"] for x in page]
+    # The API formats every date as YYYY-MM-DDTHH:MM:SSZ, which NumPy parses once the Z is dropped.
+    stamps = np.array([x["date"][:19] for x in committers], dtype="datetime64[s]")
+    return shas, np.array([x["name"] for x in committers]), stamps.astype(np.int64)
+
+
+def _response_size(headers: dict, output: str) -> int:
+    """Get the number of bytes of a response body as it was received, before decompression."""
+    length = {x.lower(): y for x, y in (headers or {}).items()}.get("content-length")
+    if length is not None and str(length).isdigit():
+        return int(length)
+    return len(output.encode("utf-8")) if output else 0
+
+def _newest_entry(newest: GHWeeksumCacheEntry, shas: np.ndarray,
+                  stamps: np.ndarray) -> GHWeeksumCacheEntry:
+    """Get the cache entry of the newest commit seen so far after counting a page of commits."""
+    stamp = int(stamps.max())
+    latest = shas[stamps == stamp].tolist()
+    if newest is None or stamp > calendar.timegm(newest.timestamp.timetuple()):
+        return GHWeeksumCacheEntry(None, latest[0], datetime.datetime(1970, 1, 1)
+                                   + datetime.timedelta(seconds=stamp), latest)
+    if stamp == calendar.timegm(newest.timestamp.timetuple()):
+        newest.seen.extend(latest)
+    return newest
+
+
+class GHCollectorBackend(IntEnum):
+    """An enumeration for the source the collector builds repository data from.
+
+    Attributes:
+        COMMITS (int): Used to page through every commit in the repository.
+        STATS (int): Used to read GitHub's aggregated punch card statistics, falling back to
+            paging through commits when the statistics are unavailable.
+        LOCAL (int): Used to read the history of a local bare or mirror clone with `git log`.
+        GRAPHQL (int): Used to page through the history of many repositories at once with the
+            GraphQL API.
+    """
+    COMMITS = 0
+    STATS = 1
+    LOCAL = 2
+    GRAPHQL = 3
+
+
+class GHDataCollectionError(Exception):
+    """Could not collect the data for the requested repository."""
+
 
 class GithubMLDataCollector:
     """The base class that represents the data structure for the machine learning data.
 
      Attributes:
         client (Github): The GitHub client with the requested token login.
+        pool (GHTokenPool): The pool of tokens that requests to GitHub are spread across.
+        cache (GHWeeksumCache): The cache used to refresh repository data incrementally, if any.
+        http_cache (GHResponseCache): The cache that GitHub responses are revalidated with, if any.
+        recorder (GHResponseRecorder): The recorder that GitHub responses are captured with, if any.
+        backend (GHCollectorBackend): The source the repository data is built from.
+        stats_retries (int): The number of times to retry statistics that are still computing.
+        stats_delay (float): The number of seconds to wait before the first statistics retry.
+        mirror_root (str): The directory that contains the local clones for the local backend.
+        graphql_url (str): The URL of the GraphQL endpoint for the GraphQL backend.
+        batch_size (int): The number of repositories to ask for in every GraphQL query.
+        fetches (list): A dictionary for every repository fetched by `get_weeksums`, with how many
+            seconds, requests to GitHub, and bytes of response bodies it took, how many of its
+            requests were answered as not modified, and whether it succeeded.
     """
 
-    def __init__(self, token: str):
+    def __init__(self, token: Union[str, list], **kwargs):
         """Construct a GitHub machine learning structure.
 
         Arguments:
-            token (str): The access token to sign in to GitHub with.
+            token (Union[str, list]): The access token to sign in to GitHub with, or a list of
+                access tokens to spread requests across.
+            **kwargs: Arbitrary keyword arguments.
+
+        Kwargs:
+            cache (GHWeeksumCache): The cache used to refresh repository data incrementally.
+            http_cache (GHResponseCache): The cache that every GET request to GitHub is revalidated
+                with, so unchanged responses are served from disk without using the rate limit.
+            recorder (GHResponseRecorder): The recorder that captures every response from GitHub
+                into a fixture file.
+            base_url (str): The URL of the REST API to collect from. Defaults to GitHub's.
+            backend (GHCollectorBackend): The source the repository data is built from. Defaults
+                to `GHCollectorBackend.COMMITS`.
+            stats_retries (int): The number of times to retry statistics that are still computing.
+                Defaults to 5.
+            stats_delay (float): The number of seconds to wait before the first statistics retry.
+                The wait doubles on every retry. Defaults to 2.
+            mirror_root (str): The directory that contains the local clones for the local backend.
+                The clone of `owner/name` is read from `owner/name.git` or `owner/name` in this
+                directory. Defaults to the current directory.
+            graphql_url (str): The URL of the GraphQL endpoint for the GraphQL backend. Defaults
+                to GitHub's.
+            batch_size (int): The number of repositories to ask for in every GraphQL query.
+                Defaults to 25.
         """
-        self.client = Github(token)
+        self.pool = GHTokenPool([x for x in (token if isinstance(token, list) else [token]) if x],
+                                base_url=kwargs.get("base_url", ""))
+        self.client = self.pool.quotas[0].client
+        self.cache = kwargs.get("cache")
+        self.http_cache = kwargs.get("http_cache")
+        if self.http_cache:
+            for quota in self.pool.quotas:
+                self.http_cache.install(quota.client)
+        self.recorder = kwargs.get("recorder")
+        if self.recorder:
+            for quota in self.pool.quotas:
+                self.recorder.install(quota.client)
+        for quota in self.pool.quotas:
+            self._measure(quota.client)
+        self.backend = kwargs.get("backend", GHCollectorBackend.COMMITS)
+        self.stats_retries = kwargs.get("stats_retries", 5)
+        self.stats_delay = kwargs.get("stats_delay", 2)
+        self.mirror_root = kwargs.get("mirror_root", ".")
+        self.graphql_url = kwargs.get("graphql_url", GRAPHQL_URL)
+        self.batch_size = kwargs.get("batch_size", 25)
+        self.fetches = []
+        self._local = threading.local()
         logging.info("Authentcated with GitHub.")
 
     def get_weeksum(self, of_repository: str, **kwargs) -> GHRepositoryWeeksum:
         """Get the weekly commits of a given repository.
 
+        With the commits backend, if the collector has a cache with data for this repository, only
+            the commits made since the newest cached commit are requested and added to the cached
+            counts.
+
+        With the local backend, the weeksum is built from the history of the default branch of a
+            local clone in the mirror root, without any requests to GitHub.
+
+        With the statistics backend, the weeksum is built from the repository's punch card. The
+            punch card covers every author and the whole history, so author-filtered, sampled, or
+            weekly requests (and repositories whose statistics are unavailable) fall back to paging
+            through commits.
+
         Arguments:
             of_repository (str): The repository name to get the commit data for.
 
         Kwargs:
             by_author (str): The name of the Git commit author to filter by.
+            aliases (list): The GitHub logins and email addresses of the author. When set, GitHub
+                filters the commits by these aliases instead of the collector matching the
+                committer name against `by_author`.
+            page_budget (int): The maximum number of pages of commits to read.
+            since (datetime.datetime): Only count commits made at or after this time (in UTC).
+            until (datetime.datetime): Only count commits made at or before this time (in UTC).
+            hourly (bool): Whether to also count the commits of every hour of the week.
+            weekly (bool): Whether to also count the commits of every ISO week.
 
         Returns:
             data (GHRepositoryWeeksum): The data structure containing the name, total commit count,
                 and the sum of commits in all weeks in a given repository by a given Git commit
                 author (or by all authors).
         """
+        data = None
+        for data in self.iter_weeksum(of_repository, **kwargs):
+            pass
+        return data
+
+    def iter_weeksum(self, of_repository: str, **kwargs):
+        """Get the weekly commits of a given repository as they are collected.
+
+        When paging through commits, a snapshot of the running counts is yielded after every page,
+            and the last snapshot is the final result. Other backends only yield the final result.
+            Every snapshot before the last is marked as inexact. The last one is exact unless the
+            page budget or the date window kept the collector from reading the whole history, in
+            which case the absolute total still counts the whole repository.
+
+        If the rate limit is exceeded partway through, collection restarts with another token, so
+            the counts in later snapshots may start over.
+
+        Arguments:
+            of_repository (str): The repository name to get the commit data for.
+
+        Kwargs:
+            by_author (str): The name of the Git commit author to filter by.
+            aliases (list): The GitHub logins and email addresses of the author. When set, GitHub
+                filters the commits by these aliases instead of the collector matching the
+                committer name against `by_author`.
+            page_budget (int): The maximum number of pages of commits to read.
+            since (datetime.datetime): Only count commits made at or after this time (in UTC).
+            until (datetime.datetime): Only count commits made at or before this time (in UTC).
+            hourly (bool): Whether to also count the commits of every hour of the week.
+            weekly (bool): Whether to also count the commits of every ISO week.
+
+        Yields:
+            data (GHRepositoryWeeksum): A snapshot of the repository data collected so far.
+        """
         logging.info("Gathering repository data for %s...", of_repository)
-        name = of_repository
-        current_repo: Repository = self.client.get_repo(of_repository)
-        repo_commits: PaginatedList = current_repo.get_commits()
-        t_count = repo_commits.totalCount
-        abs_count = repo_commits.totalCount
-
-        week = [0, 0, 0, 0, 0, 0, 0]
-        for commit in repo_commits:
-            date: datetime.datetime = commit.commit.committer.date
-            if "by_author" in kwargs and commit.commit.committer.name != kwargs["by_author"]:
+        if self.backend == GHCollectorBackend.LOCAL:
+            yield self._get_local_weeksum(of_repository, **kwargs)
+            return
+        if self.backend == GHCollectorBackend.GRAPHQL:
+            data = self._get_graphql_batch([of_repository], **kwargs)[0]
+            if isinstance(data, Exception):
+                raise data
+            yield data
+            return
+
+        from github import RateLimitExceededException #pylint:disable=import-outside-toplevel
+
+        for _ in range(len(self.pool.quotas) + 1):
+            quota = self.pool.acquire()
+            try:
+                yield from self._iter_remote_weeksum(of_repository, quota.client, **kwargs)
+            except RateLimitExceededException:
+                logging.warning("Rate limit exceeded while gathering %s; retrying...",
+                                of_repository)
+                self.pool.exhaust(quota)
                 continue
-            week[date.weekday()] += 1
-
-        if "by_author" in kwargs and kwargs["by_author"]:
-            t_count = sum(week)
-        data = GHRepositoryWeeksum(name,
-                                   kwargs["by_author"] if "by_author" in kwargs else "all",
-                                   t_count,
-                                   abs_count,
-                                   week)
-        return data
+            self.pool.observe(quota)
+            return
+        raise GHDataCollectionError("Rate limit exceeded while gathering %s." % (of_repository))
+
+    def _count_request(self):
+        """Count a request to GitHub made by the current thread."""
+        self._local.requests = getattr(self._local, "requests", 0) + 1
+
+    def _count_bytes(self, size: int):
+        """Count the bytes of a response body received by the current thread."""
+        self._local.bytes = getattr(self._local, "bytes", 0) + size
+
+    def _measure(self, client):
+        """Count the bytes and unmodified answers of every response to a PyGithub client."""
+        requester = getattr(client, "requester", None) \
+            or client._Github__requester #pylint:disable=protected-access
+        request_json = requester.requestJson
+
+        def measured_request(*args, **kwargs):
+            response = request_json(*args, **kwargs)
+            if response[0] == 304:
+                self._local.not_modified = getattr(self._local, "not_modified", 0) + 1
+            self._count_bytes(_response_size(response[1], response[2]))
+            return response
+
+        requester.requestJson = measured_request
+
+    def _iter_remote_weeksum(self, of_repository: str, client, **kwargs):
+        """Collect the weeksum of a repository on GitHub with the configured backend."""
+        self._count_request()
+        current_repo: Repository = client.get_repo(of_repository)
+        if self.backend == GHCollectorBackend.STATS:
+            unsupported = ["by_author", "page_budget", "since", "until", "weekly"]
+            if [x for x in unsupported if kwargs.get(x)]:
+                logging.info("Statistics cannot be filtered, sampled, or split by week; paging "
+                             "commits for %s.", of_repository)
+            else:
+                data = self._get_stats_weeksum(of_repository, current_repo, kwargs.get("hourly"))
+                if data:
+                    yield data
+                    return
+                logging.warning("Statistics are unavailable for %s; paging commits instead.",
+                                of_repository)
+        yield from self._iter_commits_weeksum(of_repository, current_repo, **kwargs)
+
+    def _get_stats_weeksum(self, of_repository: str, current_repo: Repository,
+                           hourly: bool = False):
+        """Build a weeksum from the punch card of a repository, or None if it is unavailable."""
+        from github import GithubException #pylint:disable=import-outside-toplevel
+        for attempt in range(self.stats_retries + 1):
+            try:
+                self._count_request()
+                punch_card = current_repo.get_stats_punch_card()
+            except GithubException as err:
+                logging.warning("Could not get statistics for %s: %s", of_repository, err)
+                return None
+            if punch_card is not None:
+                break
+            if attempt < self.stats_retries:
+                logging.info("Statistics for %s are being computed; retrying...", of_repository)
+                time.sleep(self.stats_delay * (2 ** attempt))
+        else:
+            return None
+
+        hours = [punch_card.get(day, hour) for day in range(7) for hour in range(24)]
+        week = [sum(hours[day * 24:(day + 1) * 24]) for day in range(7)]
+        self._count_request()
+        abs_count = current_repo.get_commits().totalCount
+        return GHRepositoryWeeksum(of_repository, "all", abs_count, abs_count, week,
+                                   hours=hours if hourly else None)
+
+    def _get_local_weeksum(self, of_repository: str, **kwargs) -> GHRepositoryWeeksum:
+        """Build a weeksum by reading the history of a local clone of a repository."""
+        candidates = [os.path.join(self.mirror_root, of_repository + ".git"),
+                      os.path.join(self.mirror_root, of_repository)]
+        git_dir = next((x for x in candidates if os.path.isdir(x)), None)
+        if git_dir is None:
+            raise GHDataCollectionError("No local clone of %s in %s." % (of_repository,
+                                                                         self.mirror_root))
+
+        author = kwargs.get("by_author")
+        aliases = set(kwargs.get("aliases") or []) if author else set()
+        since, until = kwargs.get("since"), kwargs.get("until")
+        since = calendar.timegm(since.timetuple()) if since else None
+        until = calendar.timegm(until.timetuple()) if until else None
+
+        stamps = []
+        abs_count = 0
+        with subprocess.Popen(["git", "-C", git_dir, "log", "HEAD", "--format=%ct%x00%cn%x00%ce"],
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE) as git_log:
+            for line in git_log.stdout:
+                timestamp, name, email = line.rstrip(b"\n").split(b"\0", 2)
+                timestamp = int(timestamp)
+                abs_count += 1
+                if (since and timestamp < since) or (until and timestamp > until):
+                    continue
+                if author and name.decode("utf-8", "replace") != author \
+                        and email.decode("utf-8", "replace") not in aliases:
+                    continue
+                stamps.append(timestamp)
+            errors = git_log.stderr.read()
+        if git_log.returncode != 0:
+            raise GHDataCollectionError("Could not read the history of %s: %s"
+                                        % (git_dir, errors.decode("utf-8", "replace").strip()))
+
+        week, hours, weeks = bin_timestamps(stamps)
+        return GHRepositoryWeeksum(of_repository, author if author else "all",
+                                   len(stamps) if author else abs_count, abs_count,
+                                   week.tolist(), not (since or until),
+                                   hours.tolist() if kwargs.get("hourly") else None,
+                                   weeks if kwargs.get("weekly") else None)
+
+    def _iter_commits_weeksum(self, of_repository: str, current_repo: Repository, **kwargs):
+        """Collect the weeksum of a repository by paging through its commits."""
+        author = kwargs.get("by_author")
+        aliases = kwargs.get("aliases") if author else None
+        label = author if author else "all"
+        cache_key = "%s <%s>" % (label, ",".join(sorted(aliases))) if aliases else label
+        page_budget = kwargs.get("page_budget")
+        window = {x: kwargs[x] for x in ["since", "until"] if kwargs.get(x)}
+
+        hourly, weekly = kwargs.get("hourly"), kwargs.get("weekly")
+
+        cached = None
+        if self.cache and not page_budget and not window:
+            cached = self.cache.get(of_repository, cache_key)
+        # Entries cached without the requested series cannot be refreshed incrementally.
+        if cached and ((hourly and cached.weeksum.hours is None)
+                       or (weekly and cached.weeksum.weeks is None)):
+            cached = None
+        if cached:
+            logging.info("Refreshing cached data for %s since %s...",
+                         of_repository,
+                         cached.timestamp)
+            params = {"since": cached.timestamp}
+            cached_stamp = calendar.timegm(cached.timestamp.timetuple())
+            week = np.array(cached.weeksum.weeksum.to_list(), dtype=np.int64)
+            hours = np.array(cached.weeksum.hours or [0] * 168, dtype=np.int64)
+            weeks = dict(cached.weeksum.weeks or {})
+            t_count, abs_count = cached.weeksum.total, cached.weeksum.abstotal
+            newest = cached
+        else:
+            params = window
+            week = np.zeros(7, dtype=np.int64)
+            hours = np.zeros(168, dtype=np.int64)
+            weeks = {}
+            t_count, abs_count = 0, 0
+            newest = None
+
+        # GitHub can filter commits by login or email on the server, so only the author's commits
+        # are downloaded. Without aliases, every commit is downloaded and matched by name here.
+        params = {x: _api_date(y) for x, y in params.items()}
+        sources = [dict(params, author=x) for x in aliases] if aliases else [params]
+        counted = set()
+        requester = current_repo._requester #pylint:disable=protected-access
+
+        pages, truncated = 0, False
+        for source in sources:
+            page = 0
+            while not truncated:
+                if page_budget and pages >= page_budget:
+                    truncated = True
+                    break
+                self._count_request()
+                _, commits = requester.requestJsonAndCheck(
+                    "GET",
+                    current_repo.url + "/commits",
+                    parameters=dict(source, per_page=100, page=page + 1))
+                if not commits:
+                    break
+                page += 1
+                pages += 1
+
+                shas, names, stamps = _commit_columns(commits)
+                keep = np.ones(len(shas), dtype=bool)
+                if aliases:
+                    keep &= np.array([x not in counted for x in shas], dtype=bool)
+                    counted.update(shas)
+                if cached:
+                    keep &= ~((stamps <= cached_stamp) & np.isin(shas, cached.seen))
+                if keep.any():
+                    newest = _newest_entry(newest, np.array(shas)[keep], stamps[keep])
+                abs_count += int(keep.sum())
+                if author and not aliases:
+                    keep &= names == author
+                t_count += int(keep.sum())
+
+                page_week, page_hours, page_weeks = bin_timestamps(stamps[keep])
+                week += page_week
+                hours += page_hours
+                weeks = merge_weeks(weeks, page_weeks) if weekly else weeks
+                yield GHRepositoryWeeksum(of_repository, label, t_count if author else abs_count,
+                                          abs_count, week.tolist(), False,
+                                          hours.tolist() if hourly else None,
+                                          dict(weeks) if weekly else None)
+
+        exact = not (truncated or window)
+        if aliases or not exact:
+            self._count_request()
+            abs_count = current_repo.get_commits().totalCount
+        data = GHRepositoryWeeksum(of_repository, label, t_count if author else abs_count,
+                                   abs_count, week.tolist(), exact,
+                                   hours.tolist() if hourly else None,
+                                   weeks if weekly else None)
+        if self.cache and newest and exact:
+            newest.weeksum = data
+            self.cache.put(of_repository, cache_key, newest)
+        yield data
+
+    def get_weeksums(self, repositories: list, workers: int = 1, **kwargs) -> list:
+        """Get the weekly commits of several repositories concurrently.
+
+        Repositories are fetched by a pool of up to `workers` threads. The returned list follows
+            the order of `repositories`, regardless of which fetch finishes first. A repository that
+            fails to load is logged and left out of the results instead of aborting the collection.
+            How long each fetch took, how many requests it made, how many bytes of response bodies
+            it received (as sent, before decompression), and how many of its requests were
+            answered with 304 Not Modified are added to `fetches`.
+
+        Arguments:
+            repositories (list): The list of repository names to get the commit data for.
+            workers (int): The maximum number of repositories to fetch at the same time.
+
+        Kwargs:
+            by_author (str): The name of the Git commit author to filter by.
+            aliases (list): The GitHub logins and email addresses of the author.
+            page_budget (int): The maximum number of pages of commits to read per repository.
+            since (datetime.datetime): Only count commits made at or after this time (in UTC).
+            until (datetime.datetime): Only count commits made at or before this time (in UTC).
+            hourly (bool): Whether to also count the commits of every hour of the week.
+            weekly (bool): Whether to also count the commits of every ISO week.
+
+        Returns:
+            data (list): The list of GHRepositoryWeeksum objects that were collected.
+        """
+        started = time.time()
+        progress = {"done": 0}
+        progress_lock = threading.Lock()
+
+        def record(repository: str, seconds: float, requests: float, size: float,
+                   not_modified: int, ok: bool):
+            with progress_lock:
+                self.fetches.append({"repository": repository,
+                                     "seconds": round(seconds, 6),
+                                     "requests": requests,
+                                     "bytes": size,
+                                     "not_modified": not_modified,
+                                     "ok": ok})
+                progress["done"] += 1
+                self._report_progress(progress["done"], len(repositories), started)
+
+        def fetch_batch(batch: list):
+            self._local.requests, self._local.bytes = 0, 0
+            fetch_started = time.perf_counter()
+            try:
+                results = self._get_graphql_batch(batch, **kwargs)
+            except Exception as err:    #pylint:disable=broad-except
+                results = [err] * len(batch)
+            # Every query covers the whole batch, so each repository is counted a share of it.
+            share = round(self._local.requests / len(batch), 6)
+            size = round(self._local.bytes / len(batch), 6)
+            for repository, data in zip(batch, results):
+                if isinstance(data, Exception):
+                    logging.error("Failed to gather repository data for %s: %s", repository, data)
+                record(repository, time.perf_counter() - fetch_started, share, size, 0,
+                       not isinstance(data, Exception))
+            return [x for x in results if not isinstance(x, Exception)]
+
+        if self.backend == GHCollectorBackend.GRAPHQL:
+            batches = [repositories[x:x + max(1, self.batch_size)]
+                       for x in range(0, len(repositories), max(1, self.batch_size))]
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+                return [x for results in executor.map(fetch_batch, batches) for x in results]
+
+        def fetch(repository: str):
+            self._local.requests, self._local.bytes, self._local.not_modified = 0, 0, 0
+            fetch_started = time.perf_counter()
+            data = None
+            try:
+                for pages, data in enumerate(self.iter_weeksum(repository, **kwargs), start=1):
+                    if pages % 10 == 0 and not data.exact:
+                        logging.info("Gathered %s commits from %s so far...",
+                                     data.abstotal,
+                                     repository)
+                return data
+            except Exception as err:    #pylint:disable=broad-except
+                logging.error("Failed to gather repository data for %s: %s", repository, err)
+                data = None
+                return None
+            finally:
+                record(repository, time.perf_counter() - fetch_started, self._local.requests,
+                       self._local.bytes, self._local.not_modified, data is not None)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = list(executor.map(fetch, repositories))
+        return [x for x in results if x is not None]
+
+    def _run_graphql(self, query: str, variables: dict) -> dict:
+        """Send a GraphQL query with the token with the most requests left, retrying with another
+            token if the rate limit is exceeded."""
+        for _ in range(len(self.pool.quotas) + 1):
+            quota = self.pool.acquire()
+            self._count_request()
+            response = run_query(self.graphql_url, quota.token, query, variables,
+                                 measure=self._count_bytes)
+            if self.recorder:
+                self.recorder.record("POST", self.graphql_url, None, {}, response,
+                                     {"query": query, "variables": variables})
+            limit = (response.get("data") or {}).get("rateLimit")
+            if limit:
+                self.pool.record(quota, limit["remaining"], limit["limit"],
+                                 reset_time(limit["resetAt"]))
+            if any(x.get("type") == "RATE_LIMITED" for x in response.get("errors") or []):
+                logging.warning("GraphQL rate limit exceeded; retrying...")
+                self.pool.record(quota, 0, quota.limit or 0, quota.reset or time.time() + 60)
+                continue
+            return response
+        raise GHDataCollectionError("GraphQL rate limit exceeded.")
+
+    def _get_graphql_batch(self, repositories: list, **kwargs) -> list:
+        """Collect the weeksums of several repositories with the GraphQL API.
+
+        Every query asks for the next page of history of each repository that has more, so the
+            number of queries is the number of pages of the longest history rather than the total.
+            Commits are matched to the author by committer name, or by the login and email of the
+            commit author when there are aliases.
+
+        Returns:
+            results (list): The GHRepositoryWeeksum of each repository, or the
+                GHDataCollectionError that kept it from being collected.
+        """
+        author = kwargs.get("by_author")
+        aliases = set(kwargs.get("aliases") or []) if author else set()
+        label = author if author else "all"
+        page_budget = kwargs.get("page_budget")
+        hourly, weekly = kwargs.get("hourly"), kwargs.get("weekly")
+        window = {x: _api_date(kwargs[x]) if kwargs.get(x) else None for x in ["since", "until"]}
+
+        states = [{"name": x, "cursor": None, "pages": 0, "count": 0, "total": 0, "error": None,
+                   "done": False, "truncated": False, "week": np.zeros(7, dtype=np.int64),
+                   "hours": np.zeros(168, dtype=np.int64), "weeks": {}}
+                  for x in repositories]
+        for state in states:
+            if "/" not in state["name"]:
+                state["error"] = GHDataCollectionError("Invalid repository: %s." % (state["name"]))
+                state["done"] = True
+
+        active = [x for x in states if not x["done"]]
+        while active:
+            variables = dict(window)
+            for index, state in enumerate(active):
+                owner, name = state["name"].split("/", 1)
+                variables.update({"o%s" % (index): owner, "n%s" % (index): name,
+                                  "c%s" % (index): state["cursor"]})
+            response = self._run_graphql(history_query(len(active),
+                                                       [x["cursor"] is None for x in active]),
+                                         variables)
+            errors = {x["path"][0]: x.get("message", "") for x in response.get("errors") or []
+                      if x.get("path")}
+            data = response.get("data") or {}
+            for index, state in enumerate(active):
+                repository = data.get("r%s" % (index))
+                if repository is None:
+                    state["error"] = GHDataCollectionError(
+                        "Could not read the history of %s: %s"
+                        % (state["name"], errors.get("r%s" % (index), "no data returned")))
+                    state["done"] = True
+                    continue
+                target = (repository.get("defaultBranchRef") or {}).get("target") or {}
+                history = target.get("history") or {"nodes": [], "pageInfo": {}}
+                if "all" in target:
+                    state["total"] = target["all"]["totalCount"]
+                state["pages"] += 1
+
+                names, authors, stamps = history_columns(history["nodes"])
+                if aliases:
+                    keep = np.array([x in aliases or y in aliases for x, y in authors], dtype=bool)
+                elif author:
+                    keep = names == author
+                else:
+                    keep = np.ones(len(stamps), dtype=bool)
+                state["count"] += int(keep.sum())
+                week, hours, weeks = bin_timestamps(stamps[keep])
+                state["week"] += week
+                state["hours"] += hours
+                state["weeks"] = merge_weeks(state["weeks"], weeks) if weekly else state["weeks"]
+
+                if not history["pageInfo"].get("hasNextPage"):
+                    state["done"] = True
+                elif page_budget and state["pages"] >= page_budget:
+                    state["done"] = state["truncated"] = True
+                else:
+                    state["cursor"] = history["pageInfo"]["endCursor"]
+            active = [x for x in active if not x["done"]]
+
+        exact = not any(window.values())
+        return [x["error"] or GHRepositoryWeeksum(x["name"],
+                                                  label,
+                                                  x["count"] if author else x["total"],
+                                                  x["total"],
+                                                  x["week"].tolist(),
+                                                  exact and not x["truncated"],
+                                                  x["hours"].tolist() if hourly else None,
+                                                  x["weeks"] if weekly else None)
+                for x in states]
+
+    def _report_progress(self, done: int, total: int, started: float):
+        """Log how many repositories have been collected and when collection should finish."""
+        used = self.pool.used()
+        if not used:
+            logging.info("Collected %s of %s repositories.", done, total)
+            return
+        completion = self.pool.projected_completion(used / done * (total - done),
+                                                    used / max(time.time() - started, 0.001))
+        logging.info("Collected %s of %s repositories with %s requests. Projected completion: %s",
+                     done,
+                     total,
+                     used,
+                     completion.strftime("%Y-%m-%d %H:%M:%S"))
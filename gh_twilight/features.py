@@ -0,0 +1,135 @@
+#
+# Temporal Features
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""The features submodule contains the utilities necessary for binning commit times into the
+    features the models are trained on.
+
+Commit times are binned as arrays of Unix timestamps (in UTC) with NumPy, instead of one commit at a
+    time. Every feature starts its week on Sunday, like GHCommitWeek.
+"""
+import datetime
+import numpy as np
+
+FEATURE_SETS = ["weekday", "hour_of_week"]
+"""The feature sets a dataset can be created with: the seven weekday totals, or the 168 hour of
+    week totals."""
+
+WEEKDAYS = ["Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday"]
+
+_EPOCH_MONDAY = datetime.date(1969, 12, 29)
+
+class TSFeatureError(Exception):
+    """Could not build the requested features."""
+
+def _iso_week(number: int) -> str:
+    """Get the ISO week name (such as 2020-W19) of a week counted in Mondays since the epoch."""
+    year, week, _ = (_EPOCH_MONDAY + datetime.timedelta(weeks=int(number))).isocalendar()
+    return "%04d-W%02d" % (year, week)
+
+def _week_number(name: str) -> int:
+    """Get the number of Mondays since the epoch of an ISO week name made by `_iso_week`."""
+    monday = datetime.datetime.strptime(name + "-1", "%G-W%V-%u").date()
+    return (monday - _EPOCH_MONDAY).days // 7
+
+def bin_timestamps(timestamps) -> tuple:
+    """Count commits by weekday, by hour of the week, and by ISO week in a single pass.
+
+    Args:
+        timestamps (Iterable): The Unix timestamps (in UTC) of the commits.
+
+    Returns:
+        bins (tuple): An int64 array with the seven weekday counts, an int64 array with the 168
+            hour of week counts (Sunday at midnight first), and a dictionary of ISO week names
+            (such as `2020-W19`) and the number of commits made in each.
+    """
+    stamps = np.asarray(timestamps, dtype=np.int64)
+    # The epoch fell on a Thursday, which starts 96 hours into a Sunday-first week.
+    hours = np.bincount((stamps // 3600 + 96) % 168, minlength=168)
+    numbers, counts = np.unique((stamps // 86400 + 3) // 7, return_counts=True)
+    weeks = {_iso_week(x): int(y) for x, y in zip(numbers.tolist(), counts.tolist())}
+    return hours.reshape(7, 24).sum(axis=1), hours, weeks
+
+def merge_weeks(weeks: dict, other: dict) -> dict:
+    """Add the ISO week counts of two series together.
+
+    Args:
+        weeks (dict): A dictionary of ISO week names and commit counts.
+        other (dict): Another dictionary of ISO week names and commit counts.
+
+    Returns:
+        merged (dict): A dictionary with the sum of the counts of every week in either series.
+    """
+    merged = dict(weeks)
+    for week, count in other.items():
+        merged[week] = merged.get(week, 0) + count
+    return merged
+
+def week_window(weeks: dict, count: int) -> np.ndarray:
+    """Get the commit counts of the latest weeks of an ISO week series.
+
+    Args:
+        weeks (dict): A dictionary of ISO week names and commit counts.
+        count (int): The number of weeks to get, ending with the latest week in the series.
+
+    Returns:
+        window (np.ndarray): An int32 array with the counts of `count` consecutive weeks, oldest
+            first. Weeks without commits count as zero.
+    """
+    window = np.zeros(count, dtype=np.int32)
+    if not weeks or not count:
+        return window
+    numbers = np.array([_week_number(x) for x in weeks], dtype=np.int64)
+    offsets = numbers.max() - numbers
+    keep = offsets < count
+    window[count - 1 - offsets[keep]] = np.array(list(weeks.values()), dtype=np.int32)[keep]
+    return window
+
+def feature_names(features: str = "weekday", weeks: int = 0) -> list:
+    """Get the names of the columns of a feature set.
+
+    Args:
+        features (str): The feature set, which is one of `FEATURE_SETS`.
+        weeks (int): The number of latest ISO weeks added after the feature set.
+
+    Returns:
+        names (list): The name of every column.
+    """
+    if features not in FEATURE_SETS:
+        raise TSFeatureError("Invalid feature set: %s." % (features))
+    if features == "weekday":
+        names = list(WEEKDAYS)
+    else:
+        names = ["%s %02d:00" % (day, hour) for day in WEEKDAYS for hour in range(24)]
+    return names + ["Week %s" % (x - weeks + 1) for x in range(weeks)]
+
+def input_features(item: dict, features: str = "weekday", weeks: int = 0) -> list:
+    """Get the feature values of a prediction input from the configuration.
+
+    Args:
+        item (dict): The prediction input, with the seven weekday counts in `commits`, the 168
+            hour of week counts in `hours`, and the latest ISO week counts (oldest first) in
+            `weeks`, as the feature set requires.
+        features (str): The feature set, which is one of `FEATURE_SETS`.
+        weeks (int): The number of latest ISO weeks added after the feature set.
+
+    Returns:
+        values (list): The feature values of the input.
+    """
+    key, size = ("commits", 7) if features == "weekday" else ("hours", 168)
+    values = list(item.get(key, []))
+    if len(values) != size:
+        raise TSFeatureError("Input %s requires %s values in %s."
+                             % (item.get("name", ""), size, key))
+    if weeks:
+        series = list(item.get("weeks", []))
+        if len(series) != weeks:
+            raise TSFeatureError("Input %s requires %s values in weeks."
+                                 % (item.get("name", ""), weeks))
+        values += series
+    return values
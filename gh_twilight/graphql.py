@@ -0,0 +1,108 @@
+#
+# GraphQL Queries
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""The graphql submodule contains the utilities necessary for reading the commit history of many
+    repositories at once with the GitHub GraphQL API.
+
+Every query asks for a page of history of several repositories, each under its own alias (`r0`,
+    `r1`, and so on), and every repository continues from its own cursor in the next query.
+"""
+import datetime
+import json
+import urllib.error
+import urllib.request
+import numpy as np
+
+GRAPHQL_URL = "https://api.github.com/graphql"
+
+class GHGraphQLError(Exception):
+    """The GraphQL API could not answer a query."""
+
+def history_query(count: int, first_page: list) -> str:
+    """Build a query for a page of the default branch history of several repositories.
+
+    Args:
+        count (int): The number of repositories in the query.
+        first_page (list): Whether each repository is on its first page, which also asks for the
+            number of commits in its whole history.
+
+    Returns:
+        query (str): The GraphQL query. Its variables are the owner (`o0`), name (`n0`), and
+            cursor (`c0`) of each repository, and the `since` and `until` of the history.
+    """
+    variables = ["$since: GitTimestamp", "$until: GitTimestamp"]
+    fields = ["rateLimit { limit remaining resetAt }"]
+    for index in range(count):
+        variables += ["$o%s: String!" % (index), "$n%s: String!" % (index),
+                      "$c%s: String" % (index)]
+        fields.append(
+            "r%s: repository(owner: $o%s, name: $n%s) { defaultBranchRef { target { ... on Commit {"
+            " %s history(first: 100, after: $c%s, since: $since, until: $until) {"
+            " totalCount pageInfo { hasNextPage endCursor }"
+            " nodes { committedDate committer { name } author { email user { login } } } } } } } }"
+            % (index, index, index, "all: history { totalCount }" if first_page[index] else "",
+               index))
+    return "query(%s) {\n%s\n}" % (", ".join(variables), "\n".join(fields))
+
+def history_columns(nodes: list) -> tuple:
+    """Get the committer names, author aliases, and commit times of a page of history.
+
+    Args:
+        nodes (list): The commit nodes of the page.
+
+    Returns:
+        columns (tuple): An array of committer names, a list of (login, email) tuples of each
+            author, and an int64 array of commit times as Unix timestamps (in UTC).
+    """
+    names = np.array([(x["committer"] or {}).get("name") or "" for x in nodes])
+    authors = [((x["author"] or {}).get("user") or {}, (x["author"] or {}).get("email"))
+               for x in nodes]
+    stamps = np.array([x["committedDate"][:19] for x in nodes], dtype="datetime64[s]")
+    return names, [(x.get("login"), y) for x, y in authors], stamps.astype(np.int64)
+
+def reset_time(value: str) -> float:
+    """Convert the `resetAt` of a GraphQL rate limit to a Unix time."""
+    reset = datetime.datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ")
+    return reset.replace(tzinfo=datetime.timezone.utc).timestamp()
+
+def run_query(url: str, token: str, query: str, variables: dict, timeout: float = 60,
+              measure=None) -> dict:
+    """Send a query to a GraphQL endpoint.
+
+    Args:
+        url (str): The URL of the GraphQL endpoint.
+        token (str): The access token to send the query with, if any.
+        query (str): The GraphQL query.
+        variables (dict): The values of the variables of the query.
+        timeout (float): The number of seconds to wait for an answer. Defaults to 60.
+        measure (callable): A function that is called with the number of bytes of the response
+            body, if any.
+
+    Returns:
+        response (dict): The decoded response, with the `data` of the query and any `errors`.
+    """
+    headers = {"Content-Type": "application/json", "User-Agent": "gh-twilight"}
+    if token:
+        headers["Authorization"] = "bearer " + token
+    request = urllib.request.Request(url,
+                                     data=json.dumps({"query": query,
+                                                      "variables": variables}).encode("utf-8"),
+                                     headers=headers,
+                                     method="POST")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            body = response.read()
+        if measure:
+            measure(len(body))
+        return json.loads(body)
+    except urllib.error.HTTPError as error:
+        raise GHGraphQLError("GraphQL query failed with status %s: %s"
+                             % (error.code, error.read().decode("utf-8", "replace"))) from error
+    except (urllib.error.URLError, OSError, ValueError) as error:
+        raise GHGraphQLError("GraphQL query failed: %s" % (error)) from error
@@ -0,0 +1,189 @@
+#
+# Rate Limiting
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""The ratelimit submodule contains the utilities used to spread GitHub requests across one or more
+    access tokens without running past their rate limits."""
+import datetime
+import logging
+import math
+import threading
+import time
+
+class GHTokenQuota:
+    """The rate limit quota of a single GitHub access token.
+
+    Attributes:
+        token (str): The access token, or an empty string for anonymous access.
+        client (Github): The GitHub client signed in with the token, which requests 100 items per
+            page.
+        remaining (int): The number of requests left in the current window, or None if unknown.
+        limit (int): The number of requests allowed per window, or None if unknown.
+        reset (float): The UNIX time when the current window resets, or None if unknown.
+        used (int): The number of requests this token has been observed to make.
+        reserved (int): The number of requests reserved by fetches the token was handed out to
+            since its rate limit was last observed.
+    """
+
+    def __init__(self, token: str, base_url: str = ""):
+        """Create the quota for an access token.
+
+        Args:
+            token (str): The access token, or an empty string for anonymous access.
+            base_url (str): The URL of the REST API to sign in to, if not GitHub's.
+        """
+        from github import Github #pylint:disable=import-outside-toplevel
+        # Without retries, an exceeded rate limit raises instead of sleeping, so the pool can
+        # switch to another token.
+        options = {"per_page": 100, "retry": None}
+        if base_url:
+            options["base_url"] = base_url
+        self.token = token
+        self.client = Github(token, **options) if token else Github(**options)
+        self.remaining = None
+        self.limit = None
+        self.reset = None
+        self.used = 0
+        self.reserved = 0
+
+    def available(self) -> float:
+        """Get the number of requests left that are not reserved, which is infinite if the rate
+            limit of the token has not been observed yet."""
+        return (math.inf if self.remaining is None else self.remaining) - self.reserved
+
+class GHTokenPool:
+    """A pool of GitHub access tokens that hands out the token with the most requests left.
+
+    Every token handed out reserves requests from its quota until its rate limit is observed
+        again, so concurrent fetches are spread across the tokens instead of all getting the same
+        one. When every token is exhausted, the pool sleeps until the earliest window reset and
+        checks the rate limit of that token again before handing out a token.
+
+    Attributes:
+        quotas (list): The GHTokenQuota of every token in the pool.
+        threshold (int): The number of remaining requests at which a token counts as exhausted.
+    """
+
+    def __init__(self, tokens: list, **kwargs):
+        """Create a token pool.
+
+        Args:
+            tokens (list): The access tokens to use. An empty list uses anonymous access.
+            **kwargs: Arbitrary keyword arguments.
+
+        Kwargs:
+            threshold (int): The number of remaining requests at which a token counts as
+                exhausted. Defaults to 10.
+            sleep (callable): The function used to wait for a window reset. Defaults to
+                `time.sleep`.
+            base_url (str): The URL of the REST API to sign in to, if not GitHub's.
+        """
+        self.quotas = [GHTokenQuota(x, kwargs.get("base_url", "")) for x in (tokens or [""])]
+        self.threshold = kwargs.get("threshold", 10)
+        self._sleep = kwargs.get("sleep", time.sleep)
+        self._lock = threading.Lock()
+
+    def acquire(self, cost: int = 1) -> GHTokenQuota:
+        """Get the token with the most requests left, waiting for a reset if all are exhausted.
+
+        Args:
+            cost (int): The number of requests to reserve from the token. Defaults to 1.
+
+        Returns:
+            quota (GHTokenQuota): The quota of the token to make the next requests with.
+        """
+        while True:
+            with self._lock:
+                quota = max(self.quotas, key=lambda x: (x.available(), -x.reserved))
+                if quota.available() > self.threshold:
+                    quota.reserved += cost
+                    return quota
+                quota = min(self.quotas, key=lambda x: x.reset)
+                reset = quota.reset
+
+            # The lock is released while waiting, so responses on other threads can still report
+            # a reset, and the reset is confirmed with GitHub before the token is handed out.
+            logging.warning("All %s tokens are rate limited. Waiting until %s...",
+                            len(self.quotas),
+                            datetime.datetime.fromtimestamp(reset + 1).strftime("%H:%M:%S"))
+            self._sleep(max(0, reset - time.time()) + 1)
+            self.refresh(quota)
+
+    def refresh(self, quota: GHTokenQuota):
+        """Update a quota from the rate limit endpoint, which does not count against the limit.
+
+        Args:
+            quota (GHTokenQuota): The quota to update.
+        """
+        quota.client.get_rate_limit()
+        self.observe(quota)
+
+    def observe(self, quota: GHTokenQuota):
+        """Update a quota from the rate limit headers of the last response its client received.
+
+        Args:
+            quota (GHTokenQuota): The quota to update.
+        """
+        remaining, limit = quota.client.rate_limiting
+        self.record(quota, remaining, limit, quota.client.rate_limiting_resettime)
+
+    def record(self, quota: GHTokenQuota, remaining: int, limit: int, reset: float):
+        """Update a quota with the rate limit reported by a response.
+
+        Args:
+            quota (GHTokenQuota): The quota to update.
+            remaining (int): The number of requests left in the current window.
+            limit (int): The number of requests allowed per window.
+            reset (float): The UNIX time when the current window resets.
+        """
+        with self._lock:
+            if quota.remaining is not None and quota.reset == reset:
+                quota.used += max(0, quota.remaining - remaining)
+            quota.remaining, quota.limit = remaining, limit
+            quota.reset = reset
+            quota.reserved = 0
+
+    def exhaust(self, quota: GHTokenQuota):
+        """Mark a token as exhausted after GitHub rejected a request for exceeding its limit.
+
+        Args:
+            quota (GHTokenQuota): The quota to mark as exhausted.
+        """
+        self.observe(quota)
+        with self._lock:
+            quota.remaining = 0
+
+    def used(self) -> int:
+        """Get the number of requests the pool has been observed to make.
+
+        Returns:
+            used (int): The number of requests made with all of the tokens in the pool.
+        """
+        return sum(x.used for x in self.quotas)
+
+    def projected_completion(self, requests: int, rate: float) -> datetime.datetime:
+        """Project when a number of requests will have been made.
+
+        Args:
+            requests (int): The number of requests left to make.
+            rate (float): The number of requests made per second so far.
+
+        Returns:
+            completion (datetime.datetime): The projected local time when the requests are done,
+                including the time spent waiting for rate limit windows to reset.
+        """
+        now = time.time()
+        seconds = requests / rate if rate else 0
+        known = [x for x in self.quotas if x.remaining is not None]
+        available = sum(x.remaining for x in known)
+        capacity = sum(x.limit for x in known)
+        if known and capacity and requests > available:
+            windows = math.ceil((requests - available) / capacity)
+            last_reset = max(x.reset for x in known)
+            seconds = max(seconds, last_reset - now + (windows - 1) * 3600)
+        return datetime.datetime.fromtimestamp(now + seconds)
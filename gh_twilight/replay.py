@@ -0,0 +1,389 @@
+#
+# Record and Replay
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""The replay submodule contains the utilities necessary for collecting repository data without
+    network access: a recorder that captures GitHub API responses into fixture files, a generator
+    for synthetic repositories, and a local stub server that serves both.
+
+A fixture is a JSON file with a `responses` list. Every response has the `method`, `path`, and
+    `query` of its request (and the `request` body of GraphQL queries), and the `headers` and
+    `body` GitHub answered with. URLs in the headers and body are recorded relative to
+    `GITHUB_URL`, whichever server they were recorded from, and the stub server rewrites them to
+    its own address.
+"""
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from random import Random
+
+GITHUB_URL = "https://api.github.com"
+
+SYNTHETIC_COMMITTERS = ["Twilight Sparkle", "Rarity", "Applejack", "Fluttershy", "Pinkie Pie",
+                        "Rainbow Dash"]
+
+class GHReplayError(Exception):
+    """Could not read or write a fixture."""
+
+def _api_date(stamp: int) -> str:
+    """Format a Unix timestamp the way the GitHub API formats dates."""
+    return (datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=stamp)) \
+        .strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def synthetic_commits(count: int, seed: int = 0, committers: list = None,
+                      newest: int = 1588000000) -> list:
+    """Create the commits of a synthetic repository in the format of the GitHub API.
+
+    Args:
+        count (int): The number of commits to create.
+        seed (int): The seed for the commit times, committers, and SHAs.
+        committers (list): The names of the committers to pick from. Defaults to
+            `SYNTHETIC_COMMITTERS`.
+        newest (int): The Unix timestamp of the newest commit.
+
+    Returns:
+        commits (list): The commit dictionaries, newest first, with up to two hours between each
+            commit and the one before it.
+    """
+    rng = Random(seed)
+    committers = committers or SYNTHETIC_COMMITTERS
+    stamp = newest
+    commits = []
+    for index in range(count):
+        name = rng.choice(committers)
+        login = name.split(" ")[0].lower()
+        person = {"name": name, "email": login + "@pony.org", "date": _api_date(stamp)}
+        commits.append({"sha": hashlib.sha1(("%s %s" % (seed, index)).encode("utf-8")).hexdigest(),
+                        "author": {"login": login},
+                        "commit": {"author": person,
+                                   "committer": dict(person),
+                                   "message": "Commit %s" % (index)}})
+        stamp -= rng.randrange(1, 7200)
+    return commits
+
+def _query_key(method: str, path: str, query: dict, request=None) -> str:
+    """Get the key a recorded response is matched to its request with."""
+    return json.dumps([method, path, sorted(query.items()), request], sort_keys=True)
+
+def load_fixture(path: str) -> list:
+    """Load the responses of a fixture written by GHResponseRecorder.
+
+    Args:
+        path (str): The path to the fixture file.
+
+    Returns:
+        responses (list): The recorded responses.
+    """
+    try:
+        with open(path) as fixture:
+            return json.load(fixture)["responses"]
+    except (OSError, ValueError, KeyError, TypeError) as error:
+        raise GHReplayError("Could not read fixture %s: %s." % (path, error)) from error
+
+class GHResponseRecorder:
+    """A recorder that captures the GitHub API responses of a collector into a fixture file.
+
+    Attributes:
+        path (str): The path to the fixture file to write.
+        responses (list): The responses recorded so far. A request made more than once keeps its
+            latest response.
+    """
+
+    def __init__(self, path: str):
+        """Create a recorder.
+
+        Args:
+            path (str): The path to the fixture file to write.
+        """
+        self.path = path
+        self.responses = []
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def record(self, method: str, url: str, parameters: dict, headers: dict, body,
+               request: dict = None, base_url: str = GITHUB_URL):
+        """Record the response of a request.
+
+        Args:
+            method (str): The HTTP method of the request.
+            url (str): The URL of the request, which may include a query string.
+            parameters (dict): The query parameters of the request, if any.
+            headers (dict): The response headers.
+            body (Any): The decoded JSON body of the response.
+            request (dict): The decoded JSON body of the request, if any.
+            base_url (str): The URL of the API the response came from. Defaults to `GITHUB_URL`.
+        """
+        base_url = base_url.rstrip("/")
+        if url.startswith(base_url):
+            url = url[len(base_url):]
+        if base_url != GITHUB_URL:
+            headers = {x: str(y).replace(base_url, GITHUB_URL) for x, y in dict(headers).items()}
+            body = json.loads(json.dumps(body).replace(base_url, GITHUB_URL))
+        split = urllib.parse.urlsplit(url)
+        query = dict(urllib.parse.parse_qsl(split.query))
+        query.update({x: str(y) for x, y in (parameters or {}).items()})
+        entry = {"method": method,
+                 "path": split.path,
+                 "query": query,
+                 "headers": {x.lower(): y for x, y in dict(headers).items()},
+                 "body": body}
+        if request is not None:
+            entry["request"] = request
+        key = _query_key(method, split.path, query, request)
+        with self._lock:
+            if key in self._keys:
+                self.responses[self._keys[key]] = entry
+            else:
+                self._keys[key] = len(self.responses)
+                self.responses.append(entry)
+
+    def install(self, client):
+        """Record every response to the requests of a PyGithub client.
+
+        Args:
+            client (Github): The client to record. Every object it creates shares its requester,
+                so their requests are recorded as well.
+        """
+        requester = getattr(client, "requester", None) \
+            or client._Github__requester #pylint:disable=protected-access
+        request = requester.requestJsonAndCheck
+        base_url = getattr(requester, "base_url", None) \
+            or requester._Requester__base_url #pylint:disable=protected-access
+
+        def recorded_request(verb, url, parameters=None, headers=None, input=None, **kwargs):
+            #pylint:disable=redefined-builtin
+            response = request(verb, url, parameters, headers, input, **kwargs)
+            self.record(verb, url, parameters, response[0], response[1], input, base_url)
+            return response
+
+        requester.requestJsonAndCheck = recorded_request
+
+    def save(self):
+        """Write the recorded responses to the fixture file."""
+        with self._lock, open(self.path + ".tmp", "w+") as fixture:
+            json.dump({"responses": self.responses}, fixture, indent=1)
+        os.replace(self.path + ".tmp", self.path)
+
+class GHStubServer(ThreadingHTTPServer):
+    """A local stand-in for the GitHub API that serves fixtures and synthetic repositories.
+
+    Recorded responses are served for the requests they were recorded with. Other requests are
+        answered from the synthetic repositories, which support the repository, commit list (with
+        the `since`, `until`, `author`, `page`, and `per_page` parameters), and punch card
+        endpoints of the REST API, and history queries to the GraphQL API. Anything else is
+        answered with a 404. Successful answers carry an ETag, and requests that send it back in
+        `If-None-Match` are answered with a 304 without a body, as GitHub does.
+
+    Attributes:
+        repositories (dict): The commits of each synthetic repository, by name.
+        page_size (int): The largest page of commits to answer with, regardless of `per_page`.
+        requests (int): The number of requests the server has answered.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple = ("127.0.0.1", 0), responses: list = None,
+                 repositories: dict = None, page_size: int = 100):
+        """Create a stub server.
+
+        Args:
+            address (tuple): The host and port to listen on. Defaults to a free local port.
+            responses (list): The recorded responses to serve, if any.
+            repositories (dict): The commits of each synthetic repository (as made by
+                `synthetic_commits`), by name, if any.
+            page_size (int): The largest page of commits to answer with. Defaults to 100.
+        """
+        super().__init__(address, _GHStubHandler)
+        self.repositories = repositories or {}
+        self.page_size = page_size
+        self.requests = 0
+        self._responses = {_query_key(x["method"], x["path"], x["query"], x.get("request")): x
+                           for x in responses or []}
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        """The URL to use as the base of the REST API."""
+        return "http://%s:%s" % self.server_address[:2]
+
+    @property
+    def graphql_url(self) -> str:
+        """The URL to use as the GraphQL endpoint."""
+        return self.base_url + "/graphql"
+
+    def recorded(self, method: str, path: str, query: dict, request=None):
+        """Get the recorded response of a request, or None if it was not recorded."""
+        return self._responses.get(_query_key(method, path, query, request))
+
+    def start(self):
+        """Serve requests on a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving requests and close the server."""
+        if self._thread:
+            self.shutdown()
+        self.server_close()
+
+def _parse_date(value: str) -> int:
+    """Convert a date in the format of the GitHub API to a Unix timestamp."""
+    date = datetime.datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+    return int((date - datetime.datetime(1970, 1, 1)).total_seconds())
+
+def _filter_commits(commits: list, since: str = None, until: str = None,
+                    author: str = None) -> list:
+    """Get the commits that match the filters of a commit list request."""
+    since = _parse_date(since) if since else None
+    until = _parse_date(until) if until else None
+    matched = []
+    for commit in commits:
+        stamp = _parse_date(commit["commit"]["committer"]["date"])
+        if (since is not None and stamp < since) or (until is not None and stamp > until):
+            continue
+        if author and author not in ((commit.get("author") or {}).get("login"),
+                                     commit["commit"]["author"]["email"]):
+            continue
+        matched.append(commit)
+    return matched
+
+_RATE_LIMIT_HEADERS = {"x-ratelimit-limit": 5000,
+                       "x-ratelimit-remaining": 5000,
+                       "x-ratelimit-reset": 1588003600}
+
+class _GHStubHandler(BaseHTTPRequestHandler):
+    """The request handler for GHStubServer."""
+
+    server: GHStubServer
+    protocol_version = "HTTP/1.1"
+
+    def _respond(self, status: int, body, headers: dict = None):
+        data = json.dumps(body).replace(GITHUB_URL, self.server.base_url).encode("utf-8")
+        # Every answer carries an untouched rate limit, unless a recorded one replaces it.
+        headers = dict(_RATE_LIMIT_HEADERS, **(headers or {}))
+        if status == 200:
+            headers.setdefault("etag", '"%s"' % (hashlib.sha1(data).hexdigest()))
+            if self.headers.get("If-None-Match") == headers["etag"]:
+                status, data = 304, b""
+        self.server.requests += 1
+        self.send_response(status)
+        for name, value in headers.items():
+            if name not in ["content-length", "content-encoding", "transfer-encoding", "connection",
+                            "content-type"]:
+                self.send_header(name, str(value).replace(GITHUB_URL, self.server.base_url))
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):   #pylint:disable=invalid-name
+        """Answer REST API requests."""
+        split = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(split.query))
+        recorded = self.server.recorded("GET", split.path, query)
+        if recorded:
+            self._respond(200, recorded["body"], recorded["headers"])
+            return
+
+        if split.path == "/rate_limit":
+            rate = {"limit": 5000, "remaining": 5000,
+                    "reset": _RATE_LIMIT_HEADERS["x-ratelimit-reset"]}
+            self._respond(200, {"resources": {"core": rate, "search": rate, "graphql": rate},
+                                "rate": rate})
+            return
+
+        parts = split.path.strip("/").split("/")
+        name = "/".join(parts[1:3])
+        if len(parts) < 3 or parts[0] != "repos" or name not in self.server.repositories:
+            self._respond(404, {"message": "Not Found"})
+            return
+        commits = self.server.repositories[name]
+        if len(parts) == 3:
+            self._respond(200, {"id": int(hashlib.sha1(name.encode("utf-8")).hexdigest()[:8], 16),
+                                "name": parts[2],
+                                "full_name": name,
+                                "owner": {"login": parts[1]},
+                                "private": False,
+                                "default_branch": "main",
+                                "url": "%s/repos/%s" % (self.server.base_url, name)})
+        elif parts[3:] == ["commits"]:
+            self._respond_commits(split.path, query, commits)
+        elif parts[3:] == ["stats", "punch_card"]:
+            counts = [[x, y, 0] for x in range(7) for y in range(24)]
+            for commit in commits:
+                stamp = _parse_date(commit["commit"]["committer"]["date"])
+                counts[(stamp // 3600 + 96) % 168][2] += 1
+            self._respond(200, counts)
+        else:
+            self._respond(404, {"message": "Not Found"})
+
+    def _respond_commits(self, path: str, query: dict, commits: list):
+        """Answer a page of a commit list, with the Link header GitHub paginates with."""
+        matched = _filter_commits(commits, query.get("since"), query.get("until"),
+                                  query.get("author"))
+        size = min(int(query.get("per_page", 30)), self.server.page_size)
+        page = int(query.get("page", 1))
+        last = max(1, -(-len(matched) // size))
+        links = []
+        for rel, number in [("next", page + 1), ("last", last)]:
+            if page < last:
+                links.append('<%s%s?%s>; rel="%s"'
+                             % (self.server.base_url, path,
+                                urllib.parse.urlencode(dict(query, page=number)), rel))
+        self._respond(200, matched[(page - 1) * size:page * size],
+                      {"link": ", ".join(links)} if links else {})
+
+    def do_POST(self):  #pylint:disable=invalid-name
+        """Answer GraphQL history queries."""
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        if urllib.parse.urlsplit(self.path).path != "/graphql":
+            self._respond(404, {"message": "Not Found"})
+            return
+        recorded = self.server.recorded("POST", "/graphql", {}, request)
+        if recorded:
+            self._respond(200, recorded["body"], recorded["headers"])
+            return
+
+        variables, data, errors = request.get("variables") or {}, {}, []
+        index = 0
+        while "o%s" % (index) in variables:
+            alias = "r%s" % (index)
+            name = "%s/%s" % (variables["o%s" % (index)], variables["n%s" % (index)])
+            cursor = variables.get("c%s" % (index))
+            index += 1
+            if name not in self.server.repositories:
+                data[alias] = None
+                errors.append({"path": [alias], "type": "NOT_FOUND",
+                               "message": "Could not resolve to a Repository with the name '%s'."
+                                          % (name)})
+                continue
+            commits = self.server.repositories[name]
+            matched = _filter_commits(commits, variables.get("since"), variables.get("until"))
+            start = int(cursor or 0)
+            end = start + self.server.page_size
+            target = {"history": {
+                "totalCount": len(matched),
+                "pageInfo": {"hasNextPage": end < len(matched), "endCursor": str(end)},
+                "nodes": [{"committedDate": x["commit"]["committer"]["date"],
+                           "committer": {"name": x["commit"]["committer"]["name"]},
+                           "author": {"email": x["commit"]["author"]["email"],
+                                      "user": x.get("author")}}
+                          for x in matched[start:end]]}}
+            if cursor is None:
+                target["all"] = {"totalCount": len(commits)}
+            data[alias] = {"defaultBranchRef": {"target": target} if commits else None}
+        data["rateLimit"] = {"limit": 5000, "remaining": 5000, "resetAt": "2020-05-10T12:00:00Z"}
+        self._respond(200, {"data": data, "errors": errors} if errors else {"data": data})
+
+    def log_message(self, format, *args): #pylint:disable=redefined-builtin
+        logging.debug("%s - %s", self.address_string(), format % args)
@@ -20,9 +20,18 @@ class GHRepositoryWeeksum:
         total (int): The total number of commits made by the Git author to the repository.
         abstotal (int): The total nomber of commits to the repository.
         weeksum (GHCommitWeek): The data structure that represents the commit week.
+        exact (bool): Whether the counts cover the whole history of the repository, rather than
+            a sample of it.
+        hours (list): The 168 commit counts of every hour of the week, starting from Sunday at
+            midnight, if they were collected.
+        weeks (dict): The ISO week names (such as `2020-W19`) and the commit counts of every week
+            with commits, if they were collected.
     """
 
-    def __init__(self, name: str, author: str, total: int, abstotal: int, weeksum: list):
+    __slots__ = ("name", "author", "total", "abstotal", "weeksum", "exact", "hours", "weeks")
+
+    def __init__(self, name: str, author: str, total: int, abstotal: int, weeksum: list,
+                 exact: bool = True, hours: list = None, weeks: dict = None):
         """Initialize a GHRepositoryWeeksum data structure.
 
         Args:
@@ -31,12 +40,19 @@ class GHRepositoryWeeksum:
             total (int): The total number of commits made by the Git author to the repository.
             abstotal (int): The total nomber of commits to the repository.
             weeksum (list): The list of integers that represent the commit week.
+            exact (bool): Whether the counts cover the whole history of the repository, rather
+                than a sample of it.
+            hours (list): The 168 commit counts of every hour of the week, if collected.
+            weeks (dict): The ISO week names and commit counts of every week, if collected.
         """
         self.name = name
         self.author = author
         self.total = total
         self.abstotal = abstotal
         self.weeksum = GHCommitWeek(weeksum)
+        self.exact = exact
+        self.hours = hours
+        self.weeks = weeks
 
     def __str__(self):
         return """Name: %s
@@ -62,18 +78,43 @@ Total commits per weekday:
                        self.weeksum.friday(),
                        self.weeksum.saturday())
 
+    @classmethod
+    def from_dict(cls, data: dict):
+        """Create a repository weeksum from a dictionary made with `to_dict`.
+
+        Args:
+            data (dict): The serialized repository data.
+
+        Returns:
+            weeksum (GHRepositoryWeeksum): The repository data.
+        """
+        return cls(data["name"],
+                   data["weeksum"]["author"],
+                   data["total_count"],
+                   data["absolute_total_count"],
+                   data["weeksum"]["week"],
+                   data.get("exact", True),
+                   data["weeksum"].get("hours"),
+                   data["weeksum"].get("weeks"))
+
     def to_dict(self) -> dict:
         """Get a serialized dictionary of the repo data.
 
         Returns:
             data (dict): A dictionary containing the repository data.
         """
-        return {
+        data = {
             "name": self.name,
             "total_count": self.total,
             "absolute_total_count": self.abstotal,
+            "exact": self.exact,
             "weeksum": {
                 "author": self.author,
                 "week": self.weeksum.to_list()
             }
         }
+        if self.hours is not None:
+            data["weeksum"]["hours"] = list(self.hours)
+        if self.weeks is not None:
+            data["weeksum"]["weeks"] = dict(self.weeks)
+        return data
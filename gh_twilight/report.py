@@ -0,0 +1,98 @@
+#
+# Run Reports
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""The report submodule contains the utilities necessary for timing and profiling the stages of a
+    run."""
+from contextlib import contextmanager
+import cProfile
+import datetime
+import json
+import os
+import re
+import time
+
+class TSRunReport:
+    """A machine-readable record of how long each stage of a run took.
+
+    Every stage is recorded as a dictionary with its name, when it started, how many seconds it
+        took, and any details added by the code that ran it. When a profile directory is set, each
+        stage is also profiled with cProfile and its statistics are written to a `.pstats` file
+        that can be read with the `pstats` module.
+
+    Attributes:
+        stages (list): The dictionaries of every stage that has finished, in the order they started.
+        profile_dir (str): The directory to write the profile of each stage to, if any.
+    """
+
+    def __init__(self, profile_dir: str = ""):
+        """Create an empty run report.
+
+        Args:
+            profile_dir (str): The directory to write the profile of each stage to, if any.
+        """
+        self.stages = []
+        self.profile_dir = profile_dir
+        self._started = datetime.datetime.now(datetime.timezone.utc)
+        self._clock = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, **details):
+        """Time a stage of the run.
+
+        The stage is recorded even if it raises an exception. Only the thread that runs the stage
+            is profiled, so work done in other threads or processes shows up as time spent waiting
+            for them.
+
+        Args:
+            name (str): The name of the stage.
+            **details: Details to record with the stage.
+
+        Yields:
+            entry (dict): The dictionary recorded for the stage, which more details can be added to
+                while it runs.
+        """
+        entry = {"name": name, "started": round(time.perf_counter() - self._clock, 6)}
+        entry.update(details)
+        profiler = cProfile.Profile() if self.profile_dir else None
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield entry
+        finally:
+            if profiler:
+                profiler.disable()
+            entry["seconds"] = round(time.perf_counter() - start, 6)
+            self.stages.append(entry)
+            if profiler:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                path = os.path.join(self.profile_dir, "%02d_%s.pstats"
+                                    % (len(self.stages), re.sub(r"\W+", "_", name)))
+                profiler.dump_stats(path)
+                entry["profile"] = path
+
+    def to_dict(self) -> dict:
+        """Get a serialized dictionary of the run report.
+
+        Returns:
+            report (dict): A dictionary with the start time of the run, its total duration in
+                seconds, and every stage.
+        """
+        return {"started": self._started.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "seconds": round(time.perf_counter() - self._clock, 6),
+                "stages": self.stages}
+
+    def save(self, path: str):
+        """Write the run report to a JSON file.
+
+        Args:
+            path (str): The path of the JSON file to write.
+        """
+        with open(path, "w+") as report_file:
+            json.dump(self.to_dict(), report_file, indent=4)
@@ -0,0 +1,219 @@
+#
+# Hyperparameter Search
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""The search submodule contains the utilities necessary for tuning the hyperparameters of the
+    regression models and saving the best ones as a profile."""
+import hashlib
+import itertools
+import json
+import logging
+import math
+import os
+import numpy as np
+import toml
+from gh_twilight.analysis import TSDataModel, create_folds, create_model, dataset_key, score_fold
+
+SEARCH_METHODS = ["grid", "random", "halving"]
+
+class TSSearchError(Exception):
+    """Could not search the hyperparameters of a model."""
+
+def _toml_value(value):
+    """Convert a TOML array to a tuple, since scikit-learn expects tuples for layer sizes."""
+    return tuple(value) if isinstance(value, list) else value
+
+def parameter_candidates(space: dict, method: str = "grid", budget: int = 0, seed: int = 0) -> list:
+    """Get the hyperparameter candidates to evaluate from a search space.
+
+    Args:
+        space (dict): A dictionary of hyperparameter names and the list of values to try for each.
+        method (str): The search method: "grid" tries every combination, while "random" and
+            "halving" try `budget` combinations drawn at random.
+        budget (int): The number of combinations to draw, or 0 to use every combination.
+        seed (int): The seed used to draw the combinations.
+
+    Returns:
+        candidates (list): A list of hyperparameter dictionaries.
+    """
+    if method not in SEARCH_METHODS:
+        raise TSSearchError("Invalid search method: %s." % (method))
+    names = sorted(space)
+    for name in names:
+        if not isinstance(space[name], list) or not space[name]:
+            raise TSSearchError("Hyperparameter %s requires a list of values to try." % (name))
+    candidates = [dict(zip(names, [_toml_value(x) for x in values]))
+                  for values in itertools.product(*[space[x] for x in names])]
+    if method == "grid" or not budget or budget >= len(candidates):
+        return candidates
+    picks = np.random.default_rng(seed).choice(len(candidates), size=budget, replace=False)
+    return [candidates[x] for x in sorted(picks)]
+
+def _score_candidate(X, y, model: TSDataModel, train, test, #pylint:disable=invalid-name
+                     params: dict, path: str) -> float:
+    """Score a candidate on a fold and write its score to the cache file, if any."""
+    r2_score, mse = score_fold(X, y, model, train, test, params)
+    if path:
+        with open(path + ".tmp", "w+") as cache_file:
+            json.dump({"model": model.name.lower(),
+                       "params": params,
+                       "rows": len(y),
+                       "r2": r2_score,
+                       "mse": mse}, cache_file)
+        os.replace(path + ".tmp", path)
+    return r2_score
+
+def _evaluate(dataset: dict, model: TSDataModel, candidates: list, folds: int, n_jobs: int,
+              cache_dir: str) -> np.ndarray:
+    """Get the mean cross-validated R2 score of every candidate.
+
+    Every (candidate, fold) pair is scored as its own joblib task, and the task writes its score to
+        the cache directory as soon as it finishes, so an interrupted search only repeats the tasks
+        that did not finish.
+    """
+    X, y = dataset["data"] #pylint:disable=invalid-name
+    splits = create_folds(len(y), min(folds, len(y)))
+    scores = np.full((len(candidates), len(splits)), np.nan)
+    pending = {}
+    for index, params in enumerate(candidates):
+        key = dataset_key(dataset, model, params)
+        for fold in range(len(splits)):
+            name = hashlib.sha256(("%s %s %s" % (key, len(splits), fold)).encode("utf-8"))
+            path = os.path.join(cache_dir, name.hexdigest() + ".json") if cache_dir else ""
+            if path and os.path.exists(path):
+                with open(path) as cache_file:
+                    scores[index, fold] = json.load(cache_file)["r2"]
+            else:
+                pending[(index, fold)] = path
+
+    logging.info("Scoring %s %s candidates on %s repositories (%s cached folds)...",
+                 len(candidates),
+                 model.name.lower(),
+                 len(y),
+                 scores.size - len(pending))
+    if cache_dir and pending:
+        os.makedirs(cache_dir, exist_ok=True)
+    tasks = [(index, fold, path) for (index, fold), path in pending.items()]
+    if n_jobs == 1:
+        results = [_score_candidate(X, y, model, splits[fold][0], splits[fold][1],
+                                    candidates[index], path)
+                   for index, fold, path in tasks]
+    elif tasks:
+        from joblib import Parallel, delayed #pylint:disable=import-outside-toplevel
+        results = Parallel(n_jobs=min(len(tasks), n_jobs) if n_jobs > 0 else n_jobs)(
+            delayed(_score_candidate)(X, y, model, splits[fold][0], splits[fold][1],
+                                      candidates[index], path)
+            for index, fold, path in tasks)
+    else:
+        results = []
+    for (index, fold, _), result in zip(tasks, results):
+        scores[index, fold] = result
+    return scores.mean(axis=1)
+
+def search_model(dataset: dict, model: TSDataModel, space: dict, **kwargs) -> tuple:
+    """Search for the hyperparameters that give a model the best cross-validated R2 score.
+
+    Args:
+        dataset (dict): A dictionary that represents the repository dataset to search with.
+        model (TSDataModel): The data model type to tune.
+        space (dict): A dictionary of hyperparameter names and the list of values to try for each.
+        **kwargs: Arbitrary keyword arguments.
+
+    Kwargs:
+        method (str): The search method. "grid" and "random" score every candidate on the whole
+            dataset; "halving" scores the candidates on a growing sample of the dataset and keeps
+            the best `1 / factor` of them after every round. Defaults to "grid".
+        budget (int): The number of candidates to draw for "random" and "halving", or 0 to use
+            every combination. Defaults to 0.
+        factor (int): The factor "halving" shrinks the candidates and grows the sample by.
+            Defaults to 3.
+        folds (int): The number of cross-validation folds to score each candidate with. Defaults
+            to 5.
+        n_jobs (int): The number of worker processes to score candidates in, or -1 for one per
+            CPU core. Defaults to 1.
+        cache_dir (str): The directory that caches the score of every candidate, so that an
+            interrupted search resumes where it stopped, if any.
+
+    Returns:
+        result (tuple): The best hyperparameters and their mean cross-validated R2 score.
+    """
+    method = kwargs.get("method", "grid")
+    factor = kwargs.get("factor", 3)
+    folds = kwargs.get("folds", 5)
+    options = {"folds": folds,
+               "n_jobs": kwargs.get("n_jobs", 1),
+               "cache_dir": kwargs.get("cache_dir", "")}
+    candidates = parameter_candidates(space, method, kwargs.get("budget", 0))
+    for params in candidates:
+        create_model(model, params)
+    X, y = dataset["data"] #pylint:disable=invalid-name
+
+    if method != "halving" or len(candidates) < 2:
+        scores = _evaluate(dataset, model, candidates, **options)
+    else:
+        if factor < 2:
+            raise TSSearchError("Invalid halving factor: %s." % (factor))
+        order = np.random.default_rng(0).permutation(len(y))
+        rounds = math.ceil(math.log(len(candidates), factor))
+        rows = min(len(y), max(folds * 2, len(y) // factor ** (rounds - 1)))
+        while True:
+            sample = np.sort(order[:rows])
+            scores = _evaluate({"data": (X[sample], y[sample]),
+                                "targets": [dataset["targets"][x] for x in sample]},
+                               model,
+                               candidates,
+                               **options)
+            if len(candidates) == 1:
+                break
+            keep = np.argsort(-scores, kind="stable")[:math.ceil(len(candidates) / factor)]
+            candidates, scores = [candidates[x] for x in keep], scores[keep]
+            if len(candidates) == 1:
+                break
+            rows = min(len(y), rows * factor)
+
+    best = int(np.argmax(scores))
+    logging.info("Best %s hyperparameters are %s with a mean R2 score of %s.",
+                 model.name.lower(),
+                 candidates[best],
+                 round(float(scores[best]), 4))
+    return candidates[best], float(scores[best])
+
+def load_profile(path: str) -> dict:
+    """Load a hyperparameter profile written by `save_profile`.
+
+    Args:
+        path (str): The path to the profile file.
+
+    Returns:
+        profile (dict): The hyperparameters of each TSDataModel type in the profile.
+    """
+    try:
+        profile = toml.load(path)
+    except (OSError, toml.TomlDecodeError) as error:
+        raise TSSearchError("Could not read hyperparameter profile %s: %s." % (path, error)) \
+            from error
+    models = {x.name.lower(): x for x in TSDataModel}
+    if any(x not in models for x in profile):
+        raise TSSearchError("Invalid model in hyperparameter profile: %s."
+                            % ([x for x in profile if x not in models][0]))
+    return {models[name]: {key: _toml_value(value) for key, value in params.items()}
+            for name, params in profile.items()}
+
+def save_profile(path: str, profile: dict):
+    """Write a hyperparameter profile that can be loaded by `load_profile`.
+
+    Args:
+        path (str): The path to the profile file.
+        profile (dict): The hyperparameters of each TSDataModel type.
+    """
+    contents = {model.name.lower(): {key: list(value) if isinstance(value, tuple) else value
+                                     for key, value in params.items()}
+                for model, params in sorted(profile.items())}
+    with open(path + ".tmp", "w+") as profile_file:
+        toml.dump(contents, profile_file)
+    os.replace(path + ".tmp", path)
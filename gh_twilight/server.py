@@ -0,0 +1,285 @@
+#
+# Prediction Server
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""The server submodule contains a long-running HTTP server that answers predictions with models
+    loaded from saved artifacts."""
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from gh_twilight.analysis import load_latest_result, select_result, TSDataAnalysisError
+from gh_twilight.features import feature_names, input_features, TSFeatureError
+
+class TSModelRegistry:
+    """The saved models that predictions are made with, reloaded when new artifacts appear.
+
+    Attributes:
+        artifacts (str): The directory that stores model artifacts.
+        models (list): The TSDataModel types to load.
+        method (str): The prediction method used to select a model.
+    """
+
+    def __init__(self, artifacts: str, models: list, method: str):
+        """Create a model registry and load the latest saved models.
+
+        Args:
+            artifacts (str): The directory that stores model artifacts.
+            models (list): The TSDataModel types to load.
+            method (str): The prediction method used to select a model.
+        """
+        self.artifacts = artifacts
+        self.models = models
+        self.method = method
+        self._current = None
+        self._signature = None
+        self.refresh()
+
+    def _artifact_signature(self) -> tuple:
+        paths = glob.glob(os.path.join(self.artifacts, "sparkle_*.joblib"))
+        return tuple(sorted((x, os.path.getmtime(x)) for x in paths))
+
+    def current(self):
+        """Get the analysis result that predictions are made with.
+
+        Returns:
+            result (TSDataAnalysisResult): The selected analysis result.
+        """
+        return self._current
+
+    def refresh(self) -> bool:
+        """Reload the models if the artifact directory has changed.
+
+        The new models are loaded before they replace the current ones, so predictions in flight
+            always use a complete set of models. If the new artifacts fail to load, the current
+            models stay in place.
+
+        Returns:
+            reloaded (bool): Whether new models were loaded.
+        """
+        signature = self._artifact_signature()
+        if signature == self._signature:
+            return False
+        try:
+            result = select_result([load_latest_result(self.artifacts, x) for x in self.models],
+                                   self.method)
+        except (TSDataAnalysisError, OSError, EOFError) as err:
+            if self._current is None:
+                raise
+            logging.error("Failed to reload models: %s", err)
+            return False
+        self._current, self._signature = result, signature
+        logging.info("Loaded %s model from %s.", result.model_type.name.lower(), self.artifacts)
+        return True
+
+    def watch(self, interval: float, stop: threading.Event):
+        """Reload the models whenever the artifact directory changes until stopped.
+
+        Args:
+            interval (float): The number of seconds between checks.
+            stop (threading.Event): The event that stops watching when set.
+        """
+        while not stop.wait(interval):
+            self.refresh()
+
+class TSMicroBatcher:
+    """A queue that groups concurrent prediction requests into a single call to the model.
+
+    Attributes:
+        registry (TSModelRegistry): The registry of the model that makes the predictions.
+        max_batch (int): The largest number of rows to predict in a single call.
+        max_delay (float): The number of seconds to wait for more requests to join a batch.
+    """
+
+    def __init__(self, registry: TSModelRegistry, max_batch: int = 1024, max_delay: float = 0.002):
+        """Create a micro-batcher.
+
+        Args:
+            registry (TSModelRegistry): The registry of the model that makes the predictions.
+            max_batch (int): The largest number of rows to predict in a single call.
+            max_delay (float): The number of seconds to wait for more requests to join a batch.
+        """
+        self.registry = registry
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+
+    def submit(self, commits: np.ndarray) -> Future:
+        """Queue rows of features for prediction.
+
+        Args:
+            commits (ndarray): An array of shape (n, m) with the values of the m features of
+                every row.
+
+        Returns:
+            future (Future): The future that resolves to a tuple of the name of the model that
+                made the predictions and the array of predictions.
+        """
+        future = Future()
+        self._queue.put((commits, future))
+        return future
+
+    def run(self, stop: threading.Event):
+        """Answer queued predictions in batches until stopped.
+
+        Args:
+            stop (threading.Event): The event that stops the batcher when set.
+        """
+        while not stop.is_set():
+            try:
+                pending = [self._queue.get(timeout=0.1)]
+            except queue.Empty:
+                continue
+            rows = pending[0][0].shape[0]
+            deadline = time.monotonic() + self.max_delay
+            while rows < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                pending.append(item)
+                rows += item[0].shape[0]
+
+            try:
+                # The model is read once, so a reload cannot change it between predicting and
+                # naming it in the answers.
+                result = self.registry.current()
+                model = result.model_type.name.lower()
+                predictions = result.predict_many(np.vstack([x[0] for x in pending]))
+            except Exception as err:    #pylint:disable=broad-except
+                for _, future in pending:
+                    future.set_exception(err)
+                continue
+            start = 0
+            for commits, future in pending:
+                future.set_result((model, predictions[start:start + commits.shape[0]]))
+                start += commits.shape[0]
+
+class TSPredictionServer(ThreadingHTTPServer):
+    """An HTTP server that answers predictions with a micro-batcher.
+
+    `POST /predict` accepts one input in the format of the configuration inputs (such as
+        `{"commits": [...]}`) or `{"inputs": [[...], ...]}` with the feature values of many, and
+        answers `{"model": ..., "predictions": [...]}`. `GET /health` answers the name of the model
+        in use.
+
+    Attributes:
+        registry (TSModelRegistry): The registry of the model that makes the predictions.
+        batcher (TSMicroBatcher): The micro-batcher that groups concurrent requests.
+        features (str): The feature set the models were trained with.
+        weeks (int): The number of latest ISO weeks added after the feature set.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: tuple, registry: TSModelRegistry, **kwargs):
+        """Create a prediction server and start its background threads.
+
+        Args:
+            address (tuple): The host and port to listen on.
+            registry (TSModelRegistry): The registry of the model that makes the predictions.
+            **kwargs: Arbitrary keyword arguments.
+
+        Kwargs:
+            max_batch (int): The largest number of rows to predict in a single call.
+            max_delay (float): The number of seconds to wait for more requests to join a batch.
+            reload_interval (float): The number of seconds between checks for new artifacts.
+            features (str): The feature set the models were trained with. Defaults to "weekday".
+            weeks (int): The number of latest ISO weeks added after the feature set. Defaults to
+                0.
+        """
+        super().__init__(address, _TSPredictionHandler)
+        self.registry = registry
+        self.features = kwargs.get("features", "weekday")
+        self.weeks = kwargs.get("weeks", 0)
+        self.width = len(feature_names(self.features, self.weeks))
+        self.batcher = TSMicroBatcher(registry,
+                                      kwargs.get("max_batch", 1024),
+                                      kwargs.get("max_delay", 0.002))
+        self._stop = threading.Event()
+        self._workers = [
+            threading.Thread(target=self.batcher.run, args=(self._stop,), daemon=True),
+            threading.Thread(target=registry.watch,
+                             args=(kwargs.get("reload_interval", 5), self._stop),
+                             daemon=True)
+        ]
+        for thread in self._workers:
+            thread.start()
+
+    def server_close(self):
+        self._stop.set()
+        super().server_close()
+
+class _TSPredictionHandler(BaseHTTPRequestHandler):
+    """The request handler for TSPredictionServer."""
+
+    server: TSPredictionServer
+
+    def _respond(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):   #pylint:disable=invalid-name
+        """Answer health checks."""
+        if self.path != "/health":
+            self._respond(404, {"error": "Not found."})
+            return
+        self._respond(200, {"model": self.server.registry.current().model_type.name.lower()})
+
+    def do_POST(self):  #pylint:disable=invalid-name
+        """Answer prediction requests."""
+        if self.path != "/predict":
+            self._respond(404, {"error": "Not found."})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            rows = body["inputs"] if "inputs" in body \
+                else [input_features(body, self.server.features, self.server.weeks)]
+            commits = np.array(rows, dtype=np.int64)
+            if commits.ndim != 2 or commits.shape[1] != self.server.width:
+                raise ValueError("Every input requires %s values." % (self.server.width))
+        except (ValueError, KeyError, TypeError, AttributeError, TSFeatureError) as err:
+            self._respond(400, {"error": str(err)})
+            return
+        try:
+            model, predictions = self.server.batcher.submit(commits).result()
+        except Exception as err:    #pylint:disable=broad-except
+            self._respond(500, {"error": str(err)})
+            return
+        self._respond(200, {"model": model, "predictions": predictions.tolist()})
+
+    def log_message(self, format, *args): #pylint:disable=redefined-builtin
+        logging.debug("%s - %s", self.address_string(), format % args)
+
+def serve(registry: TSModelRegistry, host: str = "127.0.0.1", port: int = 8642, **kwargs):
+    """Answer predictions over HTTP until interrupted.
+
+    Args:
+        registry (TSModelRegistry): The registry of the model that makes the predictions.
+        host (str): The host to listen on.
+        port (int): The port to listen on.
+        **kwargs: Arbitrary keyword arguments passed to TSPredictionServer.
+    """
+    server = TSPredictionServer((host, port), registry, **kwargs)
+    print("🚀 Serving predictions on http://%s:%s/predict..." % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Prediction server stopped by user.")
+    finally:
+        server.server_close()
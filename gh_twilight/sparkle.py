@@ -9,9 +9,15 @@
 #
 """The sparkle submodule contains the utilities necessary for handling Sparkle configurations
     for use with the main program."""
+import datetime
 import logging
+import os
 import toml
 from gh_twilight.analysis import TSDataModel
+from gh_twilight.data import GHCollectorBackend
+from gh_twilight.features import FEATURE_SETS
+from gh_twilight.graphql import GRAPHQL_URL
+from gh_twilight.search import SEARCH_METHODS, TSSearchError, load_profile
 
 class TSConfigurationError(Exception):
     """Could not load, parse, or read the configuration requested."""
@@ -26,18 +32,74 @@ class TSConfiguration:
     Attributes:
         study_repos (list): The list of repos to use as modeling data.
         git_name (str): The name of the Git author to filter for, if any.
+        git_aliases (list): The GitHub logins and email addresses of the Git author, if any.
+        workers (int): The number of repositories to collect at the same time.
+        cache_dir (str): The directory used to cache repository data between runs, if any.
+        http_cache (str): The SQLite file used to cache and revalidate GitHub responses, if any.
+        http_cache_size (int): The number of megabytes of responses to keep in the HTTP cache.
+        backend (GHCollectorBackend): The source to build repository data from.
+        mirror_root (str): The directory that contains local clones for the local backend.
+        graphql_url (str): The URL of the GraphQL endpoint for the GraphQL backend.
+        batch_size (int): The number of repositories to ask for in every GraphQL query.
+        n_jobs (int): The number of worker processes to fit models in, or -1 for one per CPU core.
+        profile_path (str): The path to the hyperparameter profile of the models, if any.
+        profile (dict): The hyperparameters of each TSDataModel type that replace its defaults.
+        page_budget (int): The maximum number of pages of commits to read per repository, or 0
+            to read every page.
+        features (str): The feature set to train the models with, which is one of `FEATURE_SETS`.
+        weeks (int): The number of latest ISO weeks of commits to add to the feature set.
+        since (datetime.datetime): Only count commits made at or after this time (in UTC), if set.
+        until (datetime.datetime): Only count commits made at or before this time (in UTC), if set.
         prediction_method (str): The method for making predictions.
         inputs (list): The list of inputs to predict values for.
+        artifacts (str): The directory that stores fitted model artifacts, if any.
+        folds (int): The number of cross-validation folds to score the models with, or 0 to score
+            them on a single split.
+        repeats (int): The number of times to draw the cross-validation folds.
+        search_method (str): The hyperparameter search method, or an empty string if the
+            configuration has no search section.
+        search_budget (int): The number of candidates to draw for random and halving searches, or
+            0 to use every combination.
+        search_factor (int): The factor a halving search shrinks the candidates by every round.
+        search_cache_dir (str): The directory that caches the score of every search candidate.
+        search_spaces (dict): The hyperparameter values to search for each TSDataModel type.
     """
 
     study_repos = []
     models = []
+    workers = 1
+    cache_dir = ""
+    http_cache = ""
+    http_cache_size = 256
+    backend = GHCollectorBackend.COMMITS
+    mirror_root = "."
+    graphql_url = GRAPHQL_URL
+    batch_size = 25
+    n_jobs = 1
+    profile_path = ""
+    profile = {}
+    page_budget = 0
+    features = "weekday"
+    weeks = 0
+    since = None
+    until = None
 
     prediction_method = ""
     inputs = []
+    artifacts = ""
+    folds = 0
+    repeats = 1
+
+    search_method = ""
+    search_budget = 0
+    search_factor = 3
+    search_cache_dir = "sparkle_search"
+    search_spaces = {}
 
     git_name = ""
+    git_aliases = []
     __api_token = ""
+    __api_tokens = []
 
     def __init__(self, path: str):
         """Create a configuration from the given TOML file path.
@@ -56,12 +118,45 @@ class TSConfiguration:
             if "account" not in s_dict:
                 raise TSConfigurationError("Account data is missing from config.")
             self.__api_token = s_dict["account"]["token"]
+            self.__api_tokens = s_dict["account"].get("tokens", [])
             self.git_name = s_dict["account"]["git_name"]
+            self.git_aliases = s_dict["account"].get("aliases", [])
 
             if "activities" not in s_dict:
                 raise TSConfigurationError("Activity data missing from config.")
             self.study_repos = s_dict["activities"]["repos"]
 
+            self.workers = s_dict["activities"].get("workers", 1)
+            if not isinstance(self.workers, int) or self.workers < 1:
+                raise TSConfigurationError("Invalid worker count: %s." % (self.workers))
+            self.cache_dir = s_dict["activities"].get("cache_dir", "")
+            self.http_cache = s_dict["activities"].get("http_cache", "")
+            self.http_cache_size = s_dict["activities"].get("http_cache_size", 256)
+            if not isinstance(self.http_cache_size, int) or self.http_cache_size < 1:
+                raise TSConfigurationError("Invalid HTTP cache size: %s." % (self.http_cache_size))
+
+            backend = s_dict["activities"].get("backend", "commits")
+            if backend.upper() not in GHCollectorBackend.__members__:
+                raise TSConfigurationError("Invalid backend configuration: %s." % (backend))
+            self.backend = GHCollectorBackend[backend.upper()]
+            self.mirror_root = s_dict["activities"].get("mirror_root", ".")
+            self.graphql_url = s_dict["activities"].get("graphql_url", GRAPHQL_URL)
+            self.batch_size = s_dict["activities"].get("batch_size", 25)
+            if not isinstance(self.batch_size, int) or self.batch_size < 1:
+                raise TSConfigurationError("Invalid batch size: %s." % (self.batch_size))
+
+            self.page_budget = s_dict["activities"].get("page_budget", 0)
+            if not isinstance(self.page_budget, int) or self.page_budget < 0:
+                raise TSConfigurationError("Invalid page budget: %s." % (self.page_budget))
+            self.features = s_dict["activities"].get("features", "weekday")
+            if self.features not in FEATURE_SETS:
+                raise TSConfigurationError("Invalid feature set: %s." % (self.features))
+            self.weeks = s_dict["activities"].get("weeks", 0)
+            if not isinstance(self.weeks, int) or self.weeks < 0:
+                raise TSConfigurationError("Invalid week count: %s." % (self.weeks))
+            self.since = _config_datetime(s_dict["activities"].get("since"))
+            self.until = _config_datetime(s_dict["activities"].get("until"))
+
             self.models = []
             for model in s_dict["activities"]["models"]:
                 if model == "neural" and TSDataModel.NEURAL not in self.models:
@@ -73,12 +168,44 @@ class TSConfiguration:
                 else:
                     raise TSConfigurationError("Invalid model configuration: %s." % (model))
 
+            self.n_jobs = s_dict["activities"].get("n_jobs", 1)
+            if not isinstance(self.n_jobs, int) or self.n_jobs == 0 or self.n_jobs < -1:
+                raise TSConfigurationError("Invalid job count: %s." % (self.n_jobs))
+
+            self.profile_path = s_dict["activities"].get("profile", "")
+            self.profile = {}
+            if self.profile_path and os.path.exists(self.profile_path):
+                try:
+                    self.profile = load_profile(self.profile_path)
+                except TSSearchError as error:
+                    raise TSConfigurationError(str(error)) from error
 
             if "predictions" not in s_dict:
                 raise TSConfigurationError("Prediction data missing from config.")
 
             self.prediction_method = s_dict["predictions"]["method"]
             self.inputs = s_dict["predictions"]["inputs"]
+            self.artifacts = s_dict["predictions"].get("artifacts", "")
+
+            self.folds = s_dict["predictions"].get("folds", 0)
+            if not isinstance(self.folds, int) or self.folds == 1 or self.folds < 0:
+                raise TSConfigurationError("Invalid fold count: %s." % (self.folds))
+            self.repeats = s_dict["predictions"].get("repeats", 1)
+            if not isinstance(self.repeats, int) or self.repeats < 1:
+                raise TSConfigurationError("Invalid repeat count: %s." % (self.repeats))
+
+            if "search" in s_dict:
+                self.search_method = s_dict["search"].get("method", "grid")
+                if self.search_method not in SEARCH_METHODS:
+                    raise TSConfigurationError("Invalid search method: %s." % (self.search_method))
+                self.search_budget = s_dict["search"].get("budget", 0)
+                self.search_factor = s_dict["search"].get("factor", 3)
+                self.search_cache_dir = s_dict["search"].get("cache_dir", "sparkle_search")
+                self.search_spaces = {}
+                for model in TSDataModel:
+                    space = s_dict["search"].get(model.name.lower())
+                    if space is not None and model in self.models:
+                        self.search_spaces[model] = space
 
             logging.info("Loaded Sparkle configuration from %s.", path)
 
@@ -90,6 +217,31 @@ class TSConfiguration:
         """
         return self.__api_token
 
+    def get_tokens(self) -> list:
+        """Grab every personal access token from the configuration.
+
+        Returns:
+            api_tokens (list): The personal access tokens to spread requests across, starting with
+                the primary token.
+        """
+        tokens = []
+        for token in [self.__api_token] + self.__api_tokens:
+            if token and token not in tokens:
+                tokens.append(token)
+        return tokens
+
+def _config_datetime(value):
+    """Convert a TOML date or date-time to a naive datetime in UTC."""
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value
+    if isinstance(value, datetime.date):
+        return datetime.datetime(value.year, value.month, value.day)
+    raise TSConfigurationError("Invalid date configuration: %s." % (value))
+
 def create_sparkle_data():
     """Interactively create sparkle.toml."""
     sparkle = {
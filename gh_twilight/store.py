@@ -0,0 +1,449 @@
+#
+# Weeksum Store
+# GitHub Machine Learning Project
+# (C) 2020 Marquis Kurt
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at https://mozilla.org/MPL/2.0/.
+#
+"""The store submodule contains a compact, column-oriented container for repository data.
+
+Stores can be saved to and loaded from NumPy (`.npz`) files, and from Parquet (`.parquet`) or Arrow
+    (`.arrow`, `.feather`) files when pyarrow is installed. These files hold every column as a
+    contiguous array, so loading them does not build a GHRepositoryWeeksum object per row. Stores
+    can also be loaded from the CSV, JSON, and JSON Lines exports, which are parsed one row at a
+    time.
+"""
+import csv
+import json
+import os
+import re
+import sys
+import numpy as np
+from gh_twilight.repo import GHRepositoryWeeksum
+
+STORE_VERSION = 1
+"""The version of the NumPy store format written by `GHWeeksumStore.save`."""
+
+_DAY_COLUMNS = ["sunday", "monday", "tuesday", "wednesday", "thursday", "friday", "saturday"]
+
+_JSON_SEPARATORS = re.compile(r"[\s,]*")
+
+class GHWeeksumStoreError(Exception):
+    """Could not save or load the weeksum store."""
+
+class GHWeeksumStore:
+    """A column-oriented store of repository weeksums.
+
+    Instead of keeping a GHRepositoryWeeksum object per repository, the store keeps every field in
+        its own column: the names and authors as lists of interned strings, the totals as int64
+        arrays, whether each row is exact as a bool array, and the weekday commit numbers as a
+        single (n, 7) int32 block. Rows are handed out as GHRepositoryWeeksum objects only when
+        they are accessed.
+
+    The hour of week counts are kept in an (n, 168) int32 block and the ISO week counts in a list,
+        once a row that has them is added. Rows without hour counts are marked in a bool mask (and
+        hold zeros in the block), and rows without week counts hold None in the list.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """Create an empty store.
+
+        Args:
+            capacity (int): The number of rows to allocate space for up front.
+        """
+        capacity = max(1, capacity)
+        self._names = []
+        self._authors = []
+        self._totals = np.empty(capacity, dtype=np.int64)
+        self._abstotals = np.empty(capacity, dtype=np.int64)
+        self._exact = np.empty(capacity, dtype=np.bool_)
+        self._days = np.empty((capacity, 7), dtype=np.int32)
+        self._hours = None
+        self._has_hours = None
+        self._weeks = None
+        self._size = 0
+
+    @classmethod
+    def from_weeksums(cls, raw_dataset: list):
+        """Create a store from a list of GHRepositoryWeeksum objects.
+
+        Args:
+            raw_dataset (list): The list of GHRepositoryWeeksum objects to store.
+
+        Returns:
+            store (GHWeeksumStore): The store containing every repository in the list.
+        """
+        store = cls(len(raw_dataset))
+        for repository in raw_dataset:
+            store.append(repository)
+        return store
+
+    @classmethod
+    def from_columns(cls, names: list, authors: list, totals, abstotals, days, exact=None,
+                     hours=None, weeks: list = None, has_hours=None):
+        """Create a store from whole columns of repository data.
+
+        Args:
+            names (list): The names of the repositories.
+            authors (list): The Git authors each repository's commits were filtered by.
+            totals (Iterable): The number of commits made by the author to each repository.
+            abstotals (Iterable): The total number of commits to each repository.
+            days (Iterable): An (n, 7) array of the weekday commit numbers of each repository.
+            exact (Iterable): Whether each row covers the whole history of its repository. Every
+                row is exact if this is not set.
+            hours (Iterable): An (n, 168) array of the hour of week commit numbers of each
+                repository, if any. Rows without hour counts can be None.
+            weeks (list): The ISO week commit numbers of each repository, if any.
+            has_hours (Iterable): Whether each row of `hours` holds real counts. Every row that is
+                not None does if this is not set.
+
+        Returns:
+            store (GHWeeksumStore): The store containing every row of the columns.
+        """
+        store = cls(0)
+        store._names = list(names)
+        store._authors = list(authors)
+        store._totals = np.ascontiguousarray(totals, dtype=np.int64)
+        store._abstotals = np.ascontiguousarray(abstotals, dtype=np.int64)
+        store._days = np.ascontiguousarray(days, dtype=np.int32).reshape(-1, 7)
+        store._size = len(store._names)
+        store._exact = np.ones(store._size, dtype=np.bool_) if exact is None \
+            else np.ascontiguousarray(exact, dtype=np.bool_)
+        columns = [store._authors, store._totals, store._abstotals, store._days, store._exact]
+        if hours is not None:
+            if has_hours is None and not isinstance(hours, np.ndarray):
+                hours = list(hours)
+                has_hours = [x is not None for x in hours]
+                hours = [x if x is not None else [0] * 168 for x in hours]
+            store._hours = np.ascontiguousarray(hours, dtype=np.int32).reshape(-1, 168)
+            store._has_hours = np.ones(store._hours.shape[0], dtype=np.bool_) if has_hours is None \
+                else np.ascontiguousarray(has_hours, dtype=np.bool_)
+            columns += [store._hours, store._has_hours]
+        if weeks is not None:
+            store._weeks = list(weeks)
+            columns.append(store._weeks)
+        if any(len(x) != store._size for x in columns):
+            raise GHWeeksumStoreError("Every column of the store requires %s rows." % (store._size))
+        return store
+
+    @classmethod
+    def load(cls, path: str):
+        """Load a store from a file written by `save` or exported by the command line tool.
+
+        CSV, JSON, and JSON Lines files are parsed one repository at a time and added to the store
+            as they are read, so the parsed rows never need to be held in memory all at once.
+
+        Args:
+            path (str): The path to a `.npz`, `.parquet`, `.arrow`, `.feather`, `.csv`, `.json`,
+                `.jsonl`, or `.ndjson` file.
+
+        Returns:
+            store (GHWeeksumStore): The store containing every repository in the file.
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension in [".csv", ".json", ".jsonl", ".ndjson"]:
+            store = cls()
+            rows = {".csv": _csv_rows, ".json": _json_rows}.get(extension, _jsonl_rows)(path)
+            for row in rows:
+                store.append_row(*row)
+            return store
+        if extension == ".npz":
+            with np.load(path, allow_pickle=False) as arrays:
+                if "version" not in arrays or int(arrays["version"]) != STORE_VERSION:
+                    raise GHWeeksumStoreError("Unsupported weeksum store file: %s." % (path))
+                authors = [sys.intern(x) for x in arrays["authors"].tolist()]
+                return cls.from_columns(arrays["names"].tolist(),
+                                        [authors[x] for x in arrays["author_codes"].tolist()],
+                                        arrays["totals"],
+                                        arrays["abstotals"],
+                                        arrays["days"],
+                                        arrays["exact"],
+                                        arrays["hours"] if "hours" in arrays else None,
+                                        [json.loads(x) for x in arrays["weeks"].tolist()]
+                                        if "weeks" in arrays else None,
+                                        arrays["has_hours"] if "has_hours" in arrays else None)
+        table = _arrow_module(extension).read_table(path)
+        return cls.from_columns(table.column("name").to_pylist(),
+                                table.column("author").to_pylist(),
+                                table.column("total").to_numpy(),
+                                table.column("abstotal").to_numpy(),
+                                np.column_stack([table.column(x).to_numpy() for x in _DAY_COLUMNS]),
+                                table.column("exact").to_numpy(),
+                                table.column("hours").to_pylist()
+                                if "hours" in table.column_names else None,
+                                [json.loads(x) for x in table.column("weeks").to_pylist()]
+                                if "weeks" in table.column_names else None)
+
+    def save(self, path: str):
+        """Save the store to a columnar file.
+
+        The file type is chosen by the extension of the path. NumPy files keep each distinct
+            author once, with an index into them for every row. The file is written to a temporary
+            file first and then moved into place.
+
+        Args:
+            path (str): The path to a `.npz`, `.parquet`, `.arrow`, or `.feather` file.
+        """
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".npz":
+            authors, author_codes = np.unique(np.array(self._authors, dtype=str),
+                                              return_inverse=True)
+            series = {}
+            if self._hours is not None:
+                series["hours"] = self.hours
+                series["has_hours"] = self.has_hours
+            if self._weeks is not None:
+                series["weeks"] = np.array([json.dumps(x) for x in self._weeks], dtype=str)
+            with open(path + ".tmp", "wb") as store_file:
+                np.savez(store_file,
+                         version=np.array(STORE_VERSION),
+                         names=np.array(self._names, dtype=str),
+                         authors=authors,
+                         author_codes=author_codes.astype(np.int32),
+                         totals=self.totals,
+                         abstotals=self.abstotals,
+                         exact=self.exact,
+                         days=self.days,
+                         **series)
+        else:
+            module = _arrow_module(extension)
+            import pyarrow #pylint:disable=import-outside-toplevel
+            columns = {"name": pyarrow.array(self._names, type=pyarrow.string()),
+                       "author": pyarrow.array(self._authors, type=pyarrow.string()),
+                       "total": self.totals,
+                       "abstotal": self.abstotals,
+                       "exact": self.exact}
+            columns.update(zip(_DAY_COLUMNS, np.ascontiguousarray(self.days.T)))
+            if self._hours is not None:
+                columns["hours"] = pyarrow.array([x if y else None for x, y
+                                                  in zip(self.hours.tolist(), self.has_hours)],
+                                                 type=pyarrow.list_(pyarrow.int32()))
+            if self._weeks is not None:
+                columns["weeks"] = pyarrow.array([json.dumps(x) for x in self._weeks],
+                                                 type=pyarrow.string())
+            table = pyarrow.table(columns)
+            if extension == ".parquet":
+                module.write_table(table, path + ".tmp")
+            else:
+                module.write_feather(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def append(self, repository: GHRepositoryWeeksum):
+        """Add a repository to the end of the store.
+
+        Args:
+            repository (GHRepositoryWeeksum): The repository to add.
+        """
+        self.append_row(repository.name,
+                        repository.author,
+                        repository.total,
+                        repository.abstotal,
+                        repository.weeksum.to_list(),
+                        repository.exact,
+                        repository.hours,
+                        repository.weeks)
+
+    def append_row(self, name: str, author: str, total: int, abstotal: int, days: list,
+                   exact: bool = True, hours: list = None, weeks: dict = None):
+        """Add a repository to the end of the store from its fields.
+
+        Args:
+            name (str): The name of the repository.
+            author (str): The Git author that made the commits in days.
+            total (int): The total number of commits made by the Git author to the repository.
+            abstotal (int): The total number of commits to the repository.
+            days (list): The seven integers that represent the commit week, starting from Sunday.
+            exact (bool): Whether the counts cover the whole history of the repository.
+            hours (list): The 168 hour of week commit numbers, starting from Sunday at midnight, if
+                any.
+            weeks (dict): The ISO week names and commit numbers of every week, if any.
+        """
+        if self._size == self._totals.shape[0]:
+            self._reserve(max(1, self._size * 2))
+        index = self._size
+        self._names.append(sys.intern(name))
+        self._authors.append(sys.intern(author))
+        self._totals[index] = total
+        self._abstotals[index] = abstotal
+        self._exact[index] = exact
+        self._days[index] = days
+        if hours is not None and self._hours is None:
+            self._hours = np.zeros((self._totals.shape[0], 168), dtype=np.int32)
+            self._has_hours = np.zeros(self._totals.shape[0], dtype=np.bool_)
+        if self._hours is not None:
+            self._hours[index] = hours if hours is not None else 0
+            self._has_hours[index] = hours is not None
+        if weeks is not None and self._weeks is None:
+            self._weeks = [None] * index
+        if self._weeks is not None:
+            self._weeks.append(weeks)
+        self._size += 1
+
+    def _reserve(self, capacity: int):
+        self._totals = np.resize(self._totals, capacity)
+        self._abstotals = np.resize(self._abstotals, capacity)
+        self._exact = np.resize(self._exact, capacity)
+        self._days = np.resize(self._days, (capacity, 7))
+        if self._hours is not None:
+            self._hours = np.resize(self._hours, (capacity, 168))
+            self._has_hours = np.resize(self._has_hours, capacity)
+
+    @property
+    def names(self) -> list:
+        """The names of the repositories in the store."""
+        return self._names
+
+    @property
+    def authors(self) -> list:
+        """The Git authors each repository's commits were filtered by."""
+        return self._authors
+
+    @property
+    def totals(self) -> np.ndarray:
+        """An int64 view of the number of commits made by the author to each repository."""
+        return self._totals[:self._size]
+
+    @property
+    def abstotals(self) -> np.ndarray:
+        """An int64 view of the total number of commits to each repository."""
+        return self._abstotals[:self._size]
+
+    @property
+    def exact(self) -> np.ndarray:
+        """A bool view of whether each row covers the whole history of its repository."""
+        return self._exact[:self._size]
+
+    @property
+    def days(self) -> np.ndarray:
+        """An int32 (n, 7) view of the weekday commit numbers of each repository."""
+        return self._days[:self._size]
+
+    @property
+    def hours(self) -> np.ndarray:
+        """An int32 (n, 168) view of the hour of week commit numbers of each repository, or None
+            if no row has them."""
+        return self._hours[:self._size] if self._hours is not None else None
+
+    @property
+    def has_hours(self) -> np.ndarray:
+        """A bool view of whether each row of `hours` holds real counts, or None if no row has
+            them."""
+        return self._has_hours[:self._size] if self._has_hours is not None else None
+
+    @property
+    def weeks(self) -> list:
+        """The ISO week commit numbers of each repository, or None if no row has them."""
+        return self._weeks
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> GHRepositoryWeeksum:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("Store index out of range: %s." % (index))
+        return GHRepositoryWeeksum(self._names[index],
+                                   self._authors[index],
+                                   int(self._totals[index]),
+                                   int(self._abstotals[index]),
+                                   self._days[index].tolist(),
+                                   bool(self._exact[index]),
+                                   self._hours[index].tolist()
+                                   if self._hours is not None and self._has_hours[index] else None,
+                                   self._weeks[index] if self._weeks is not None else None)
+
+    def __iter__(self):
+        for index in range(self._size):
+            yield self[index]
+
+def _arrow_module(extension: str):
+    """Import the pyarrow module that reads and writes files with an extension."""
+    #pylint:disable=import-outside-toplevel
+    if extension not in [".parquet", ".arrow", ".feather"]:
+        raise GHWeeksumStoreError("Unsupported weeksum store file type: %s." % (extension))
+    try:
+        if extension == ".parquet":
+            import pyarrow.parquet as module
+        else:
+            import pyarrow.feather as module
+    except ImportError as error:
+        raise GHWeeksumStoreError("Saving or loading %s files requires pyarrow." % (extension)) \
+            from error
+    return module
+
+def _dict_row(item: dict) -> tuple:
+    """Get the store row of a repository exported with `GHRepositoryWeeksum.to_dict`."""
+    try:
+        return (item["name"],
+                item["weeksum"]["author"],
+                item["total_count"],
+                item["absolute_total_count"],
+                item["weeksum"]["week"],
+                item.get("exact", True),
+                item["weeksum"].get("hours"),
+                item["weeksum"].get("weeks"))
+    except (KeyError, TypeError) as error:
+        raise GHWeeksumStoreError("Invalid repository in dataset: %s." % (item)) from error
+
+def _csv_rows(path: str):
+    """Read store rows from a CSV file exported with `--csv`."""
+    with open(path, "r", newline="") as csv_file:
+        reader = csv.reader(csv_file, delimiter=",", quotechar="|")
+        header = next(reader, [])
+        try:
+            columns = [header.index(x) for x in ["Repository",
+                                                 "Git Commit Author",
+                                                 "Total Commits by Author",
+                                                 "Total Commits"]]
+            days = [header.index(x.capitalize()) for x in _DAY_COLUMNS]
+        except ValueError as error:
+            raise GHWeeksumStoreError("Missing dataset column in %s: %s." % (path, error)) \
+                from error
+        for row in reader:
+            if row:
+                yield (row[columns[0]],
+                       row[columns[1]],
+                       int(row[columns[2]]),
+                       int(row[columns[3]]),
+                       [int(row[x]) for x in days])
+
+def _jsonl_rows(path: str):
+    """Read store rows from a JSON Lines file with one exported repository per line."""
+    with open(path, "r") as jsonl_file:
+        for line in jsonl_file:
+            if line.strip():
+                yield _dict_row(json.loads(line))
+
+def _json_rows(path: str, chunk_size: int = 65536):
+    """Read store rows from a JSON file exported with `--json`.
+
+    The file is read in chunks, and every repository in the top-level array is decoded as soon as
+        the chunks read so far contain all of it.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r") as json_file:
+        buffer = json_file.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise GHWeeksumStoreError("The JSON dataset %s is not an array." % (path))
+        position = 1
+        while True:
+            position = _JSON_SEPARATORS.match(buffer, position).end()
+            end = -1
+            if position < len(buffer):
+                if buffer[position] == "]":
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    pass
+            if end < 0:
+                chunk = json_file.read(chunk_size)
+                if not chunk:
+                    raise GHWeeksumStoreError("The JSON dataset %s is incomplete." % (path))
+                buffer, position = buffer[position:] + chunk, 0
+                continue
+            position = end
+            yield _dict_row(item)
@@ -1,14 +1,113 @@
 """The tests module contains all of the tests that are used to ensure Project Twilight works as
     intended."""
+import calendar
+import csv
+import datetime
+import json
+import os
+import pstats
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from types import SimpleNamespace
 import numpy
-from gh_twilight.analysis import create_dataset
+import pytest
+from gh_twilight.analysis import create_dataset, create_raw_matrix, analyze_models, \
+    load_latest_result, select_result, cross_validate_models, create_folds, update_models, \
+    analyze_dataset, dataset_key, TSDataModel, TSDatasetGenerateError
+from gh_twilight.batch import predict_file, TSBatchInputError
+from gh_twilight.cli import main, generate_csv, generate_json
+from gh_twilight.cache import GHResponseCache, GHWeeksumCache
+from gh_twilight.data import GithubMLDataCollector, GHCollectorBackend, _commit_columns
+from gh_twilight.features import bin_timestamps, week_window
+from gh_twilight.ratelimit import GHTokenPool
+from gh_twilight.replay import GHStubServer, GHResponseRecorder, load_fixture, synthetic_commits
+from gh_twilight.search import search_model, load_profile, save_profile
+from gh_twilight.sparkle import TSConfiguration
+from gh_twilight.server import TSMicroBatcher, TSModelRegistry, TSPredictionServer
+from gh_twilight.store import GHWeeksumStore, _json_rows
 from gh_twilight.repo import GHRepositoryWeeksum
 from gh_twilight import __version__
 
+class FakeCommitList(list):
+    """A stand-in for a paginated list of PyGithub commits."""
+
+    @property
+    def totalCount(self): #pylint:disable=invalid-name
+        """Get the number of commits in the list."""
+        return len(self)
+
+class FakeRepository:
+    """A stand-in for a PyGithub repository that serves a fixed list of commits."""
+
+    url = "https://api.github.com/repos/example/example"
+
+    def __init__(self, commits, punch_cards=None):
+        self.commits = commits
+        self.punch_cards = punch_cards or []
+        self.requested = []
+        self._requester = self
+
+    def requestJsonAndCheck(self, verb, url, parameters=None): #pylint:disable=invalid-name
+        """Get a page of two commits as the JSON the GitHub API would respond with."""
+        assert (verb, url) == ("GET", self.url + "/commits")
+        since = parameters.get("since")
+        since = datetime.datetime.strptime(since, "%Y-%m-%dT%H:%M:%SZ") if since else None
+        page = parameters["page"] - 1
+        return {}, [raw_commit(x) for x in self.get_commits(since, parameters.get("author"))
+                    [page * 2:(page + 1) * 2]]
+
+    def get_commits(self, since=None, author=None, **kwargs):
+        """Get the commits newer than or as new as `since`, newest first."""
+        self.requested.append(since)
+        return FakeCommitList(x for x in self.commits
+                              if (since is None or x.commit.committer.date >= since)
+                              and (author is None or author in (x.author.login,
+                                                                x.commit.author.email)))
+
+    def get_stats_punch_card(self):
+        """Get the next punch card response, where None means the statistics are computing."""
+        return self.punch_cards.pop(0)
+
+def fake_commit(sha: str, author: str, date: datetime.datetime):
+    """Create a stand-in for a PyGithub commit."""
+    login = author.split(" ")[0].lower()
+    return SimpleNamespace(sha=sha,
+                           author=SimpleNamespace(login=login),
+                           commit=SimpleNamespace(author=SimpleNamespace(email=login + "@pony.org"),
+                                                  committer=SimpleNamespace(name=author,
+                                                                            date=date)))
+
+def raw_commit(commit) -> dict:
+    """Convert a stand-in commit to the JSON the GitHub API would respond with."""
+    return {"sha": commit.sha,
+            "author": {"login": commit.author.login},
+            "commit": {"author": {"email": commit.commit.author.email},
+                       "committer": {"name": commit.commit.committer.name,
+                                     "date": commit.commit.committer.date.strftime(
+                                         "%Y-%m-%dT%H:%M:%SZ")}}}
+
+def fake_collector(repository: FakeRepository, **kwargs) -> GithubMLDataCollector:
+    """Create a data collector that reads from a fake repository."""
+    collector = GithubMLDataCollector("", **kwargs)
+    collector.pool.quotas[0].client = SimpleNamespace(get_repo=lambda name: repository,
+                                                      rate_limiting=(5000, 5000),
+                                                      rate_limiting_resettime=0)
+    return collector
+
 def test_version():
     """Test that the version string matches."""
     assert __version__ == '0.1.0'
 
+def test_lazy_startup_imports():
+    """Test that starting the command line tool does not import the heavy dependencies."""
+    check = "import sys, gh_twilight.cli; print(sorted(x for x in sys.modules " \
+        + "if x.split('.')[0] in ['sklearn', 'matplotlib', 'github']))"
+    output = subprocess.run([sys.executable, "-c", check], stdout=subprocess.PIPE, check=True)
+    assert output.stdout.decode("utf-8").strip() == "[]"
+
 def test_dataset_create():
     """Test that the dataset created is a proper numpy array."""
     example_repo = GHRepositoryWeeksum("example/example",
@@ -18,4 +117,628 @@ def test_dataset_create():
                                        [12, 12, 31, 100, 200, 15, 120])
     data = create_dataset([example_repo])
     assert isinstance(data["data"][0], numpy.ndarray) \
-        and isinstance(data["data"][1], numpy.ndarray)
\ No newline at end of file
+        and isinstance(data["data"][1], numpy.ndarray)
+
+def test_raw_matrix_shape():
+    """Test that the raw matrix is a contiguous int32 array, even for an empty dataset."""
+    assert create_raw_matrix([]).shape == (0, 7)
+    example_repo = GHRepositoryWeeksum("example/example", "all", 7, 7, [1, 1, 1, 1, 1, 1, 1])
+    matr = create_raw_matrix([example_repo, example_repo])
+    assert matr.shape == (2, 7) and matr.dtype == numpy.int32 and matr.flags["C_CONTIGUOUS"]
+
+def test_weeksum_store():
+    """Test that the weeksum store round-trips rows and feeds the dataset without copying."""
+    raw = [GHRepositoryWeeksum("example/%s" % (x), "all", x, x * 2, [x] * 7) for x in range(3000)]
+    store = GHWeeksumStore.from_weeksums(raw)
+    assert len(store) == 3000 and store[-1].to_dict() == raw[-1].to_dict()
+    assert [x.name for x in store] == [x.name for x in raw]
+
+    data = create_dataset(store)
+    assert numpy.shares_memory(data["data"][0], store.days)
+    assert numpy.array_equal(data["data"][0], create_dataset(raw)["data"][0])
+    assert not hasattr(raw[0], "__dict__")
+
+def test_columnar_export(tmp_path, monkeypatch):
+    """Test that stores round-trip through .npz files and that JSON exports are streamed."""
+    raw = [GHRepositoryWeeksum("example/%s" % (x), ["all", "rarity"][x % 2], x, x * 2, [x] * 7,
+                               exact=x % 3 > 0)
+           for x in range(50)]
+    store = GHWeeksumStore.from_weeksums(raw)
+    store.save(str(tmp_path / "dataset.npz"))
+    loaded = GHWeeksumStore.load(str(tmp_path / "dataset.npz"))
+    assert [x.to_dict() for x in loaded] == [x.to_dict() for x in raw]
+    assert numpy.array_equal(create_dataset(loaded)["data"][0], create_dataset(raw)["data"][0])
+    GHWeeksumStore().save(str(tmp_path / "empty.npz"))
+    assert not len(GHWeeksumStore.load(str(tmp_path / "empty.npz")))
+
+    monkeypatch.chdir(tmp_path)
+    generate_json(store)
+    with open("dataset.json") as json_file:
+        assert json_file.read() == json.dumps([x.to_dict() for x in raw], indent=4)
+
+def test_temporal_features(tmp_path):
+    """Test that commit times are binned by hour of week and ISO week for the finer feature sets."""
+    stamps = [datetime.datetime(2020, 5, 10, 23, 15), datetime.datetime(2020, 5, 11, 0, 30),
+              datetime.datetime(2020, 5, 11, 0, 45), datetime.datetime(2020, 5, 23, 9, 0)]
+    days, hours, weeks = bin_timestamps([int(x.replace(tzinfo=datetime.timezone.utc).timestamp())
+                                         for x in stamps])
+    assert days.tolist() == [1, 2, 0, 0, 0, 0, 1]
+    assert hours[23] == 1 and hours[24] == 2 and hours[6 * 24 + 9] == 1 and hours.sum() == 4
+    assert weeks == {"2020-W19": 1, "2020-W20": 2, "2020-W21": 1}
+    assert week_window(weeks, 4).tolist() == [0, 1, 2, 1]
+
+    raw = [GHRepositoryWeeksum("example/%s" % (x), "all", x * 4, x * 8, (days * x).tolist(),
+                               hours=(hours * x).tolist(),
+                               weeks={k: v * x for k, v in weeks.items()})
+           for x in range(1, 6)]
+    store = GHWeeksumStore.from_weeksums(raw)
+    store.save(str(tmp_path / "dataset.npz"))
+    loaded = GHWeeksumStore.load(str(tmp_path / "dataset.npz"))
+    assert [x.to_dict() for x in loaded] == [x.to_dict() for x in raw]
+    dataset = create_dataset(loaded, "hour_of_week", 2)
+    assert dataset["data"][0].shape == (5, 170)
+    assert numpy.array_equal(dataset["data"][0], create_dataset(raw, "hour_of_week", 2)["data"][0])
+    assert dataset["features"][24] == "Monday 00:00"
+    assert dataset["data"][0][2, -2:].tolist() == [6, 3]
+    mixed = raw + [GHRepositoryWeeksum("example/old", "all", 1, 1, [1] * 7)]
+    store = GHWeeksumStore.from_weeksums(mixed)
+    store.save(str(tmp_path / "mixed.npz"))
+    for data in [mixed, store, GHWeeksumStore.load(str(tmp_path / "mixed.npz"))]:
+        assert data[-1].hours is None
+        with pytest.raises(TSDatasetGenerateError):
+            create_dataset(data, "hour_of_week")
+
+def test_train_from_dataset(tmp_path, monkeypatch, capsys):
+    """Test that exported datasets are parsed incrementally and used for training."""
+    raw = [GHRepositoryWeeksum("example/%s" % (x), "all", x, x * 7, [x] * 7, exact=x % 2 > 0)
+           for x in range(20)]
+    monkeypatch.chdir(tmp_path)
+    generate_json(raw)
+    generate_csv(raw)
+    with open("dataset.jsonl", "w+") as jsonl_file:
+        jsonl_file.writelines(json.dumps(x.to_dict()) + "\n" for x in raw)
+    assert len(list(_json_rows("dataset.json", chunk_size=16))) == 20
+    for path in ["dataset.json", "dataset.csv", "dataset.jsonl"]:
+        loaded = GHWeeksumStore.load(path)
+        assert numpy.array_equal(loaded.days, create_raw_matrix(raw))
+        assert loaded.names == [x.name for x in raw]
+    assert GHWeeksumStore.load("dataset.json").exact.tolist() == [x.exact for x in raw]
+
+    with open("sparkle.toml", "w+") as config:
+        config.write("""[config.account]
+git_name = ""
+token = ""
+
+[config.activities]
+models = ["linear"]
+repos = ["example/unreachable"]
+
+[config.predictions]
+method = "linear"
+folds = 0
+inputs = [{ name = "example/journal", commits = [3, 3, 3, 3, 3, 3, 3] }]
+""")
+    main(args=["--config", "sparkle.toml", "--from-dataset", "dataset.json", "--predict"])
+    output = capsys.readouterr().out
+    assert "Read data for 20 repositories" in output
+    assert "example/journal will have 21 commits" in output
+
+def test_parallel_training_order():
+    """Test that models fitted in parallel come back in the configured order."""
+    raw = [GHRepositoryWeeksum("example/%s" % (x), "all", x, x * 7, [x] * 7) for x in range(20)]
+    models = [TSDataModel.FOREST, TSDataModel.LINEAR]
+    results = analyze_models(create_dataset(raw), models, n_jobs=2)
+    assert [x.model_type for x in results] == models
+
+def test_model_artifacts(tmp_path, capsys):
+    """Test that fitted models are saved, reused for the same dataset, and used by predict-only."""
+    raw = [GHRepositoryWeeksum("example/%s" % (x), "all", x, x * 7, [x] * 7) for x in range(20)]
+    artifacts = str(tmp_path / "models")
+    first = analyze_models(create_dataset(raw), [TSDataModel.LINEAR], artifacts=artifacts)[0]
+    second = analyze_models(create_dataset(raw), [TSDataModel.LINEAR], artifacts=artifacts)[0]
+    assert len(os.listdir(artifacts)) == 1
+    assert numpy.array_equal(first.model.coef_, second.model.coef_)
+    assert dataset_key(create_dataset(raw[::-1]), TSDataModel.LINEAR) \
+        == dataset_key(create_dataset(raw), TSDataModel.LINEAR)
+    assert load_latest_result(artifacts, TSDataModel.LINEAR).predict([2] * 7) == 14
+
+    config = tmp_path / "sparkle.toml"
+    config.write_text("""[config.account]
+git_name = ""
+token = ""
+
+[config.activities]
+models = ["linear"]
+repos = []
+
+[config.predictions]
+method = "linear"
+artifacts = "%s"
+inputs = [{ name = "example/journal", commits = [3, 3, 3, 3, 3, 3, 3] }]
+""" % (artifacts))
+    assert TSConfiguration(str(config)).folds == 0
+    main(args=["--config", str(config), "--predict-only"])
+    assert "example/journal will have 21 commits" in capsys.readouterr().out
+
+def test_cross_validated_selection(tmp_path):
+    """Test that models share fold indices, score in parallel, and that best uses the CV mean."""
+    raw = [GHRepositoryWeeksum("example/%s" % (x), "all", x, x * 7, [x] * 7) for x in range(20)]
+    dataset = create_dataset(raw)
+    splits = create_folds(20, folds=4, repeats=2)
+    assert len(splits) == 8
+    assert sorted(numpy.concatenate([test for _, test in splits[:4]]).tolist()) == list(range(20))
+
+    serial = cross_validate_models(dataset, [TSDataModel.LINEAR, TSDataModel.FOREST], folds=4)
+    parallel = cross_validate_models(dataset,
+                                     [TSDataModel.LINEAR, TSDataModel.FOREST],
+                                     folds=4,
+                                     n_jobs=2)
+    assert numpy.allclose(serial[0].r2_scores, parallel[0].r2_scores)
+    assert serial[0].r2_mean > 0.99 and serial[0].r2_variance < 1e-6
+
+    artifacts = str(tmp_path / "models")
+    results = analyze_models(dataset,
+                             [TSDataModel.LINEAR, TSDataModel.FOREST],
+                             artifacts=artifacts,
+                             folds=4)
+    assert select_result(results, "best").model_type == TSDataModel.LINEAR
+    saved = load_latest_result(artifacts, TSDataModel.FOREST).cross_validation
+    assert saved.folds == 4
+    assert numpy.array_equal(saved.r2_scores, results[1].cross_validation.r2_scores)
+
+def test_hyperparameter_search(tmp_path, monkeypatch):
+    """Test that searches run in parallel, resume from their cache, and save a profile."""
+    raw = [GHRepositoryWeeksum("example/%s" % (x), "all", x, x * 7 + x % 3, [x] * 7)
+           for x in range(30)]
+    dataset = create_dataset(raw)
+    cache_dir = str(tmp_path / "search")
+    space = {"fit_intercept": [False, True], "copy_X": [False, True]}
+    params, score = search_model(dataset,
+                                 TSDataModel.LINEAR,
+                                 space,
+                                 method="halving",
+                                 factor=2,
+                                 folds=3,
+                                 n_jobs=2,
+                                 cache_dir=cache_dir)
+    assert params["fit_intercept"] and score > 0.9
+
+    def interrupted(*args):
+        raise AssertionError("Cached candidates should not be fitted again: %s" % (args,))
+    monkeypatch.setattr("gh_twilight.search.score_fold", interrupted)
+    assert search_model(dataset,
+                        TSDataModel.LINEAR,
+                        space,
+                        method="halving",
+                        factor=2,
+                        folds=3,
+                        cache_dir=cache_dir) == (params, score)
+
+    forest = {"n_estimators": 10, "max_features": 1.0}
+    save_profile(str(tmp_path / "profile.toml"), {TSDataModel.LINEAR: params,
+                                                   TSDataModel.FOREST: forest})
+    profile = load_profile(str(tmp_path / "profile.toml"))
+    assert profile[TSDataModel.FOREST] == forest
+    result = analyze_models(dataset, [TSDataModel.FOREST], profile=profile)[0]
+    assert result.model.n_estimators == 10
+
+def test_incremental_update(tmp_path):
+    """Test that saved models are updated with only the repositories they have not seen."""
+    raw = [GHRepositoryWeeksum("example/%s" % (x), "all", x, x * 7 + x % 3, [x, x % 4] + [0] * 5)
+           for x in range(30)]
+    artifacts = str(tmp_path / "models")
+    results = analyze_models(create_dataset(raw[:20]),
+                             [TSDataModel.LINEAR, TSDataModel.FOREST],
+                             artifacts=artifacts)
+    trees = len(results[1].model.estimators_)
+    assert update_models(create_dataset(raw), results, artifacts) == 2
+    assert update_models(create_dataset(raw), results, artifacts) == 0
+
+    linear = load_latest_result(artifacts, TSDataModel.LINEAR)
+    assert sorted(linear.labels) == sorted(x.name for x in raw)
+    from sklearn.linear_model import LinearRegression #pylint:disable=import-outside-toplevel
+    refit = LinearRegression().fit(linear.x_train, linear.y_train)
+    assert numpy.allclose(linear.model.coef_, refit.coef_)
+    assert numpy.isclose(linear.model.intercept_, refit.intercept_)
+    assert len(load_latest_result(artifacts, TSDataModel.FOREST).model.estimators_) > trees
+
+def test_incremental_neural_update():
+    """Test that updating a neural network keeps what it learned from its original data."""
+    raw = [GHRepositoryWeeksum("example/%s" % (x), "all", x, x * 7, [x] * 7) for x in range(40)]
+    new = [GHRepositoryWeeksum("new/%s" % (x), "all", x, 2000, [x * 7] + [0] * 6)
+           for x in range(100, 120)]
+    result = analyze_dataset(create_dataset(raw), TSDataModel.NEURAL, {"random_state": 0})
+    x_test, y_test = result.x_test, result.y_test
+    assert result.model.score(x_test, y_test) > 0.99
+    result.update(create_dataset(new))
+    assert len(result.y_train) + len(result.y_test) == 60
+    assert result.model.score(x_test, y_test) > 0.9
+
+def test_batch_prediction_files(tmp_path, monkeypatch):
+    """Test that batch predictions match single predictions for every input file format."""
+    raw = [GHRepositoryWeeksum("example/%s" % (x), "all", x, x * 7, [x] * 7) for x in range(20)]
+    result = analyze_models(create_dataset(raw), [TSDataModel.LINEAR])[0]
+    expected = [result.predict(x.weeksum.to_list()) for x in raw]
+    assert result.predict_many(create_raw_matrix(raw)).tolist() == expected
+
+    monkeypatch.chdir(tmp_path)
+    generate_csv(raw)
+    numpy.save("dataset.npy", create_raw_matrix(raw))
+    with open("dataset.jsonl", "w+") as jsonl_file:
+        jsonl_file.writelines(json.dumps(x.to_dict()) + "\n" for x in raw)
+    for path in ["dataset.csv", "dataset.npy", "dataset.jsonl"]:
+        assert predict_file(result, path, "predictions.csv", chunk_size=6) == 20
+        with open("predictions.csv") as predictions:
+            rows = list(csv.reader(predictions))[1:]
+        assert [int(x[1]) for x in rows] == expected
+
+    hourly = [GHRepositoryWeeksum("example/%s" % (x), "all", x, x * 170, [x * 24] * 7, True,
+                                  [x] * 168, {"2020-W18": x, "2020-W19": 1}) for x in range(20)]
+    dataset = create_dataset(hourly, "hour_of_week", 2)
+    result = analyze_models(dataset, [TSDataModel.LINEAR])[0]
+    expected = result.predict_many(dataset["data"][0]).tolist()
+    numpy.save("hourly.npy", dataset["data"][0])
+    with open("hourly.jsonl", "w+") as jsonl_file:
+        jsonl_file.writelines(json.dumps(x.to_dict()) + "\n" for x in hourly)
+    for path in ["hourly.npy", "hourly.jsonl"]:
+        assert predict_file(result, path, "predictions.csv", features="hour_of_week",
+                            weeks=2) == 20
+        with open("predictions.csv") as predictions:
+            assert [int(x[1]) for x in list(csv.reader(predictions))[1:]] == expected
+    with pytest.raises(TSBatchInputError):
+        predict_file(result, "dataset.jsonl", "predictions.csv", features="hour_of_week")
+
+def test_prediction_server(tmp_path):
+    """Test that the prediction server batches concurrent requests and reloads new models."""
+    raw = [GHRepositoryWeeksum("example/%s" % (x), "all", x, x * 7, [x] * 7) for x in range(20)]
+    artifacts = str(tmp_path / "models")
+    analyze_models(create_dataset(raw), [TSDataModel.LINEAR], artifacts=artifacts)
+    registry = TSModelRegistry(artifacts, [TSDataModel.LINEAR], "linear")
+    server = TSPredictionServer(("127.0.0.1", 0), registry, max_delay=0.05, reload_interval=60)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = "http://127.0.0.1:%s/predict" % (server.server_address[1])
+
+    def post(body: dict) -> dict:
+        request = urllib.request.Request(url, json.dumps(body).encode("utf-8"))
+        with urllib.request.urlopen(request) as response:
+            return json.loads(response.read())
+
+    try:
+        answers = [None] * 8
+        threads = [threading.Thread(target=lambda i=x: answers.__setitem__(
+            i, post({"commits": [i] * 7}))) for x in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert [x["predictions"] for x in answers] == [[x * 7] for x in range(8)]
+        assert all(x["model"] == "linear" for x in answers)
+
+        doubled = [GHRepositoryWeeksum(x.name, "all", x.total, x.abstotal * 2,
+                                       x.weeksum.to_list()) for x in raw]
+        time.sleep(0.01)
+        analyze_models(create_dataset(doubled), [TSDataModel.LINEAR], artifacts=artifacts)
+        assert registry.refresh()
+        assert post({"inputs": [[1] * 7, [2] * 7]})["predictions"] == [14, 28]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # A reload that lands while a batch is predicted does not change the model it is answered as.
+    def reload_during(commits):
+        swapping.current = lambda: SimpleNamespace(model_type=TSDataModel.FOREST)
+        return registry.current().predict_many(commits)
+    swapping = SimpleNamespace(current=lambda: SimpleNamespace(model_type=TSDataModel.LINEAR,
+                                                               predict_many=reload_during))
+    batcher, stop = TSMicroBatcher(swapping), threading.Event()
+    threading.Thread(target=batcher.run, args=(stop,), daemon=True).start()
+    try:
+        model, predictions = batcher.submit(numpy.array([[1] * 7])).result(timeout=5)
+    finally:
+        stop.set()
+    assert model == "linear" and predictions.tolist() == [14]
+
+def test_concurrent_collection_order():
+    """Test that concurrent collection keeps the repository order and skips failed repos."""
+    class SlowCollector(GithubMLDataCollector):
+        """A collector that returns fake data after a delay."""
+        def iter_weeksum(self, of_repository, **kwargs):
+            if of_repository == "example/broken":
+                raise ValueError("Repository not found.")
+            time.sleep(0.05 if of_repository == "example/0" else 0)
+            yield GHRepositoryWeeksum(of_repository, "all", 7, 7, [1, 1, 1, 1, 1, 1, 1])
+
+    repos = ["example/%s" % (x) for x in range(8)] + ["example/broken"]
+    collector = SlowCollector("")
+    data = collector.get_weeksums(repos, workers=4)
+    assert [x.name for x in data] == repos[:-1]
+
+def test_cache_incremental_refresh(tmp_path):
+    """Test that cached weeksums are refreshed with only the newer commits."""
+    repository = FakeRepository([
+        fake_commit("b", "Twilight Sparkle", datetime.datetime(2020, 5, 5, 10)),
+        fake_commit("a", "Rarity", datetime.datetime(2020, 5, 4, 10))
+    ])
+    collector = fake_collector(repository, cache=GHWeeksumCache(str(tmp_path)))
+    first = collector.get_weeksum("example/example", by_author="Twilight Sparkle")
+    assert (first.total, first.abstotal) == (1, 2)
+
+    repository.commits.insert(0, fake_commit("c", "Twilight Sparkle",
+                                             datetime.datetime(2020, 5, 6, 10)))
+    second = collector.get_weeksum("example/example", by_author="Twilight Sparkle")
+    assert repository.requested[-1] == datetime.datetime(2020, 5, 5, 10)
+    assert (second.total, second.abstotal) == (2, 3)
+    assert sum(second.weeksum.to_list()) == 2
+
+class FakeRequester:
+    """A stand-in for the PyGithub requester of a server that answers conditional requests."""
+
+    def __init__(self):
+        self.bodies = {}
+        self.statuses = []
+
+    def requestJson(self, verb, url, parameters=None, headers=None, input=None, cnx=None):
+        #pylint:disable=invalid-name,redefined-builtin,unused-argument,too-many-arguments
+        """Answer with a 304 when the ETag of the body matches `If-None-Match`, and with an empty
+            202 when the body is None."""
+        if self.bodies[url] is None:
+            self.statuses.append(202)
+            return 202, {}, ""
+        etag = '"%s"' % (len(json.dumps(self.bodies[url])))
+        if (headers or {}).get("If-None-Match") == etag:
+            self.statuses.append(304)
+            return 304, {"etag": etag}, ""
+        self.statuses.append(200)
+        return 200, {"etag": etag}, json.dumps(self.bodies[url])
+
+    def requestJsonAndCheck(self, verb, url, parameters=None, headers=None, input=None):
+        #pylint:disable=invalid-name,redefined-builtin
+        """Answer a request without its status, like the PyGithub requester."""
+        _, headers, body = self.requestJson(verb, url, parameters, headers, input)
+        return headers, json.loads(body) if body else None
+
+def test_response_cache(tmp_path):
+    """Test that cached responses are revalidated, served after a 304, and evicted by age."""
+    requester = FakeRequester()
+    requester.bodies = {"/repos/a": {"name": "a"}, "/repos/b": [1, 2], "/repos/c": ["x" * 32]}
+    cache = GHResponseCache(str(tmp_path / "responses.db"))
+    cache.install(SimpleNamespace(requester=requester))
+    assert requester.requestJsonAndCheck("GET", "/repos/a")[1] == {"name": "a"}
+    cache.close()
+
+    bodies, requester = requester.bodies, FakeRequester()
+    requester.bodies = bodies
+    cache = GHResponseCache(str(tmp_path / "responses.db"), max_size=40)
+    cache.install(SimpleNamespace(requester=requester))
+    assert requester.requestJsonAndCheck("GET", "/repos/a")[1] == {"name": "a"}
+    requester.bodies["/repos/a"] = {"name": "aa"}
+    assert requester.requestJsonAndCheck("GET", "/repos/a")[1] == {"name": "aa"}
+    assert requester.statuses == [304, 200]
+    assert (cache.hits, cache.misses) == (1, 1)
+    requester.bodies["/repos/a"] = None
+    assert requester.requestJsonAndCheck("GET", "/repos/a")[1] is None
+    assert cache.hits == 1
+
+    requester.requestJsonAndCheck("GET", "/repos/b")
+    assert cache.get("/repos/a") and cache.get("/repos/b")
+    requester.requestJsonAndCheck("GET", "/repos/c")
+    assert cache.get("/repos/c") and not cache.get("/repos/a") and not cache.get("/repos/b")
+    assert cache.size() <= 40
+
+def test_stats_backend():
+    """Test that the statistics backend retries computing statistics and matches the commits."""
+    commits = [fake_commit("b", "Rarity", datetime.datetime(2020, 5, 3, 10)),
+               fake_commit("a", "Rarity", datetime.datetime(2020, 5, 4, 10))]
+    punch_card = SimpleNamespace(get=lambda day, hour: int(day in (0, 1) and hour == 10))
+    repository = FakeRepository(commits, punch_cards=[None, punch_card])
+    stats = fake_collector(repository, backend=GHCollectorBackend.STATS, stats_delay=0)
+    data = stats.get_weeksum("example/example")
+    assert data.weeksum.to_list() == [1, 1, 0, 0, 0, 0, 0] and data.abstotal == 2
+    assert fake_collector(repository).get_weeksum("example/example").to_dict() == data.to_dict()
+
+def test_local_backend(tmp_path):
+    """Test that the local backend reads a bare clone like the commits backend reads GitHub."""
+    work = str(tmp_path / "work")
+    subprocess.run(["git", "init", "-q", work], check=True)
+    commits = []
+    for sha, author, date in [("a", "Rarity", datetime.datetime(2020, 5, 4, 10)),
+                              ("b", "Twilight Sparkle", datetime.datetime(2020, 5, 9, 23))]:
+        env = dict(os.environ,
+                   GIT_AUTHOR_NAME=author, GIT_AUTHOR_EMAIL="pony@example.com",
+                   GIT_COMMITTER_NAME=author, GIT_COMMITTER_EMAIL="pony@example.com",
+                   GIT_AUTHOR_DATE=date.isoformat() + "+00:00",
+                   GIT_COMMITTER_DATE=date.isoformat() + "+00:00")
+        subprocess.run(["git", "-C", work, "commit", "-q", "--allow-empty", "-m", sha],
+                       check=True, env=env)
+        commits.insert(0, fake_commit(sha, author, date))
+    subprocess.run(["git", "clone", "-q", "--bare", work,
+                    str(tmp_path / "mirror" / "example" / "example.git")], check=True)
+
+    local = GithubMLDataCollector("", backend=GHCollectorBackend.LOCAL,
+                                  mirror_root=str(tmp_path / "mirror"))
+    remote = fake_collector(FakeRepository(commits))
+    for author in ["Twilight Sparkle", None]:
+        assert local.get_weeksum("example/example", by_author=author).to_dict() \
+            == remote.get_weeksum("example/example", by_author=author).to_dict()
+
+def test_token_pool_scheduling():
+    """Test that the token pool prefers fresh tokens and waits for a reset when all are spent."""
+    waits = []
+
+    def sleep(wait):
+        waits.append(wait)
+        if len(waits) == 1:
+            pool.record(pool.quotas[1], 5000, 5000, reset + 3600)
+    pool = GHTokenPool(["first", "second"], sleep=sleep)
+    assert [pool.acquire().token for _ in range(4)] == ["first", "second", "first", "second"]
+    reset = time.time() + 60
+    for quota, remaining in zip(pool.quotas, [4000, 100]):
+        quota.client = SimpleNamespace(rate_limiting=(remaining, 5000),
+                                       rate_limiting_resettime=reset)
+        pool.observe(quota)
+    assert pool.acquire(3950).token == "first"
+    assert pool.acquire().token == "second"
+
+    # A reset reported by another request while the pool waits is picked up after the wait.
+    for quota in pool.quotas:
+        quota.client = SimpleNamespace(rate_limiting=(0, 5000), rate_limiting_resettime=reset,
+                                       get_rate_limit=lambda: None)
+        pool.exhaust(quota)
+    assert pool.acquire().token == "second"
+    assert len(waits) == 1 and 0 < waits[0] <= 61 and pool.quotas[0].remaining == 0
+
+    first = pool.quotas[0]
+    first.client.get_rate_limit = lambda: setattr(first.client, "rate_limiting", (5000, 5000))
+    pool.exhaust(pool.quotas[1])
+    assert pool.acquire().token == "first" and first.remaining == 5000 and len(waits) == 2
+    assert pool.projected_completion(6000, 10).timestamp() >= reset
+
+def test_streaming_page_budget():
+    """Test that streamed snapshots grow page by page and that a page budget samples the repo."""
+    commits = [fake_commit(str(x), "Rarity", datetime.datetime(2020, 5, 10 - x, 10))
+               for x in range(5)]
+    collector = fake_collector(FakeRepository(commits))
+    snapshots = list(collector.iter_weeksum("example/example"))
+    assert [x.abstotal for x in snapshots] == [2, 4, 5, 5]
+    assert [x.exact for x in snapshots] == [False, False, False, True]
+
+    sampled = collector.get_weeksum("example/example", page_budget=1)
+    assert not sampled.exact and sampled.abstotal == 5 and sum(sampled.weeksum.to_list()) == 2
+
+def test_run_report(tmp_path, monkeypatch):
+    """Test that fetches count their requests and that runs write a report and stage profiles."""
+    commits = [fake_commit(str(x), "Rarity", datetime.datetime(2020, 5, 10 - x, 10))
+               for x in range(5)]
+    collector = fake_collector(FakeRepository(commits))
+    collector.get_weeksums(["example/example"])
+    collector.get_weeksums(["example/example"], page_budget=1)
+    assert [x["requests"] for x in collector.fetches] == [5, 3]
+    assert all(x["ok"] for x in collector.fetches)
+
+    stub = GHStubServer(repositories={"pony/a": synthetic_commits(150, 1)})
+    stub.start()
+    try:
+        collector = GithubMLDataCollector("", base_url=stub.base_url,
+                                          http_cache=GHResponseCache(str(tmp_path / "http.db")))
+        collector.get_weeksums(["pony/a"])
+        collector.get_weeksums(["pony/a"])
+    finally:
+        stub.stop()
+    assert collector.fetches[0]["bytes"] > 0 and collector.fetches[0]["not_modified"] == 0
+    assert collector.fetches[1]["bytes"] == 0 and collector.fetches[1]["not_modified"] == 4
+
+    raw = [GHRepositoryWeeksum("example/%s" % (x), "all", x, x * 7, [x] * 7) for x in range(20)]
+    monkeypatch.chdir(tmp_path)
+    GHWeeksumStore.from_weeksums(raw).save("dataset.npz")
+    with open("sparkle.toml", "w+") as config:
+        config.write("""[config.account]
+git_name = ""
+token = ""
+
+[config.activities]
+models = ["linear", "forest"]
+repos = []
+
+[config.predictions]
+method = "best"
+folds = 0
+inputs = []
+""")
+    main(args=["--config", "sparkle.toml", "--from-dataset", "dataset.npz", "--predict",
+               "--report", "report.json", "--profile", "profiles"])
+    with open("report.json") as report_file:
+        report = json.load(report_file)
+    names = [x["name"] for x in report["stages"]]
+    assert names == ["config", "read_dataset", "export", "dataset", "analyze", "predict"]
+    analyze = report["stages"][names.index("analyze")]
+    assert [x["model"] for x in analyze["models"]] == ["linear", "forest"]
+    assert all(x["fit"] >= 0 and x["predict"] >= 0 for x in analyze["models"])
+    assert pstats.Stats(analyze["profile"]).total_calls > 0
+
+def test_raw_commit_columns():
+    """Test that pages of raw commit JSON are read into the same columns PyGithub would give."""
+    commits = [fake_commit(str(x), ["Rarity", "Applejack"][x % 2],
+                           datetime.datetime(2020, 5, 10 - x, x)) for x in range(5)]
+    shas, names, stamps = _commit_columns([raw_commit(x) for x in commits])
+    assert shas == [x.sha for x in commits]
+    assert names.tolist() == [x.commit.committer.name for x in commits]
+    assert stamps.tolist() == [calendar.timegm(x.commit.committer.date.timetuple())
+                               for x in commits]
+    weeksum = fake_collector(FakeRepository(commits)).get_weeksum("example/example",
+                                                                 by_author="Applejack")
+    assert weeksum.weeksum.to_list() == [0, 0, 0, 0, 1, 0, 1]
+
+def test_graphql_backend():
+    """Test that the GraphQL backend batches repositories and matches the commits backend."""
+    repositories = {"example/%s" % (x): [fake_commit("%s%s" % (x, y),
+                                                     ["Rarity", "Twilight Sparkle"][y % 3 == 0],
+                                                     datetime.datetime(2020, 5, 10 - y, y))
+                                         for y in range(count)]
+                    for x, count in zip("abc", [5, 3, 0])}
+    stub = GHStubServer(repositories={x: [raw_commit(y) for y in commits]
+                                      for x, commits in repositories.items()},
+                        page_size=2)
+    stub.start()
+    try:
+        collector = GithubMLDataCollector("", backend=GHCollectorBackend.GRAPHQL, batch_size=2,
+                                          graphql_url=stub.graphql_url)
+        collected = collector.get_weeksums(["example/a", "example/b", "example/c",
+                                            "example/missing"], by_author="Twilight Sparkle")
+        by_alias = collector.get_weeksum("example/a", by_author="Twilight Sparkle",
+                                         aliases=["twilight"])
+    finally:
+        stub.stop()
+
+    expected = [fake_collector(FakeRepository(repositories[x])).get_weeksum(
+        x, by_author="Twilight Sparkle") for x in ["example/a", "example/b", "example/c"]]
+    assert [x.to_dict() for x in collected] == [x.to_dict() for x in expected]
+    assert by_alias.to_dict() == expected[0].to_dict()
+    assert stub.requests == 7 and round(sum(x["requests"] for x in collector.fetches)) == 4
+    assert [x["ok"] for x in collector.fetches] == [True, True, True, False]
+    assert all(x["bytes"] > 0 for x in collector.fetches)
+    assert collector.pool.quotas[0].remaining == 5000
+
+def test_server_side_author_filter():
+    """Test that aliases filter commits on the server and match the client-side filter."""
+    commits = [fake_commit(str(x), ["Rarity", "Twilight Sparkle"][x % 3 == 0],
+                           datetime.datetime(2020, 5, 10 - x, 10)) for x in range(7)]
+    repository = FakeRepository(commits)
+    collector = fake_collector(repository)
+    by_name = collector.get_weeksum("example/example", by_author="Twilight Sparkle")
+    by_alias = collector.get_weeksum("example/example", by_author="Twilight Sparkle",
+                                     aliases=["twilight", "twilight@pony.org"])
+    assert by_alias.to_dict() == by_name.to_dict()
+    assert (by_alias.total, by_alias.abstotal) == (3, 7)
+
+def test_record_replay(tmp_path):
+    """Test that recorded responses replay to the same weeksums without the original server."""
+    repositories = {"pony/a": synthetic_commits(250, 1), "pony/b": synthetic_commits(40, 2)}
+    names = ["pony/a", "pony/b", "pony/missing"]
+    recorder = GHResponseRecorder(str(tmp_path / "fixture.json"))
+    stub = GHStubServer(repositories=repositories)
+    stub.start()
+    try:
+        collected = {}
+        for backend in [GHCollectorBackend.COMMITS, GHCollectorBackend.STATS,
+                        GHCollectorBackend.GRAPHQL]:
+            collector = GithubMLDataCollector("", backend=backend, base_url=stub.base_url,
+                                              graphql_url=stub.graphql_url, recorder=recorder)
+            collected[backend] = [x.to_dict() for x in collector.get_weeksums(
+                names, by_author="Rarity")]
+    finally:
+        stub.stop()
+    recorder.save()
+    assert collected[GHCollectorBackend.STATS] == collected[GHCollectorBackend.COMMITS]
+    assert collected[GHCollectorBackend.GRAPHQL] == collected[GHCollectorBackend.COMMITS]
+    assert [x["name"] for x in collected[GHCollectorBackend.COMMITS]] == ["pony/a", "pony/b"]
+
+    replay = GHStubServer(responses=load_fixture(str(tmp_path / "fixture.json")))
+    replay.start()
+    try:
+        for backend in collected:
+            collector = GithubMLDataCollector("", backend=backend, base_url=replay.base_url,
+                                              graphql_url=replay.graphql_url)
+            assert [x.to_dict() for x in collector.get_weeksums(
+                names, by_author="Rarity")] == collected[backend]
+    finally:
+        replay.stop()